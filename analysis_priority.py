@@ -0,0 +1,156 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from loguru import logger
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+import config
+from models import AnalysisTask, DailyHot
+
+# 流式读取待分析数据时每次拉取的行数
+PRIORITIZE_BATCH_SIZE = 1000
+
+
+def next_digest_time(now: Optional[datetime] = None) -> datetime:
+    """
+    下一次发送邮件摘要的时间
+
+    :param now: 当前时间
+    :return: 下一次摘要发送时间
+    """
+    now = now or datetime.now()
+    digest = now.replace(hour=config.DIGEST_HOUR, minute=config.DIGEST_MINUTE, second=0, microsecond=0)
+    if digest <= now:
+        digest += timedelta(days=1)
+    return digest
+
+
+def items_per_category(category_count: int) -> int:
+    """
+    订阅 category_count 个分类的用户，每个分类最多入选的条数（与 get_user_hot_items 一致）
+    """
+    return max(3, config.MAX_ITEMS_PER_EMAIL // max(category_count, 1))
+
+
+def subscription_weights(subscriptions: Dict[str, List[str]]) -> Dict[str, Dict[str, int]]:
+    """
+    统计每个分类的订阅人数及入选上限
+
+    :param subscriptions: {邮箱: [分类1, 分类2, ...]}
+    :return: {分类: {"subscribers": 订阅人数, "top_k": 各订阅者中该分类最多入选的条数}}
+    """
+    weights: Dict[str, Dict[str, int]] = {}
+    for categories in subscriptions.values():
+        k = items_per_category(len(categories))
+        for category in set(categories):
+            entry = weights.setdefault(category, {"subscribers": 0, "top_k": 0})
+            entry["subscribers"] += 1
+            entry["top_k"] = max(entry["top_k"], k)
+    return weights
+
+
+def prioritize_pending(session: Session, subscriptions: Optional[Dict[str, List[str]]] = None,
+                       top_k_only: Optional[bool] = None, now: Optional[datetime] = None,
+                       limit: Optional[int] = None, collected_since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    按"对下一份摘要的预期价值"对待分析的热点数据排序
+
+    价值 = 分类订阅人数 × 1/分类内热度排名 × 临近度
+    - 排名为入库时计算的分类内排名（见 daily_hot_collector.rank_board），
+      只对最近一次收集当天的数据有效（下一份摘要会从这批数据中选取），其它数据的价值为 0
+    - 临近度 = 1 + 1/(1 + 距下一份摘要的小时数)，摘要越近越优先处理
+    - 价值相同时按 collected_at 倒序，与原有顺序一致
+    - 已隔离的任务不再参与排序；top_k_only 时只在数据库中读取可能入选的数据
+    - 流式读取并只保留价值最高的 limit 条，内存占用不随积压的数据增长
+
+    :param session: 数据库会话
+    :param subscriptions: 收件人订阅配置，默认读取 recipients.json
+    :param top_k_only: 为 True 时丢弃不在任何订阅者 Top-K（含 ANALYZE_TOP_K_MARGIN 余量）内的数据
+    :param now: 当前时间
+    :param limit: 最多返回的条数，默认 ANALYZE_PENDING_LIMIT
+    :param collected_since: 只考虑该时间之后收集（或重新收集）的数据，用于自适应采集后增量生成任务
+    :return: 按优先级从高到低排列的待分析数据
+    """
+    from analysis_queue import QUARANTINED
+
+    if subscriptions is None:
+        from daily_hot_reminder import parse_recipient_subscriptions
+        subscriptions = parse_recipient_subscriptions()
+    if top_k_only is None:
+        top_k_only = config.ANALYZE_TOP_K_ONLY
+    now = now or datetime.now()
+    limit = config.ANALYZE_PENDING_LIMIT if limit is None else limit
+
+    weights = subscription_weights(subscriptions)
+    digest_at = next_digest_time(now)
+    hours_left = (digest_at - now).total_seconds() / 3600
+    urgency = 1 + 1 / (1 + hours_left)
+
+    # 以最近一次收集的日期判断排名是否有效：摘要发送后再分析时，下一份摘要的日期是明天，
+    # 但明天的数据尚未收集，当天的排名仍是最好的估计
+    latest = session.query(func.max(DailyHot.collected_at)).scalar()
+    if latest is None:
+        return []
+    rank_day = datetime.combine(latest.date(), datetime.min.time())
+
+    # 分类内排名在入库时已计算好，不再在查询中用窗口函数计算
+    query = (
+        session.query(
+            DailyHot.id, DailyHot.category, DailyHot.title, DailyHot.url, DailyHot.extra,
+            DailyHot.collected_at, DailyHot.category_rank,
+        )
+        .outerjoin(AnalysisTask, AnalysisTask.hot_id == DailyHot.id)
+        .filter(
+            DailyHot.last_summarized_at.is_(None),
+            DailyHot.url.isnot(None),
+            DailyHot.url != "",
+            or_(AnalysisTask.state.is_(None), AnalysisTask.state != QUARANTINED),
+        )
+    )
+    if collected_since is not None:
+        query = query.filter(DailyHot.collected_at >= collected_since)
+    if top_k_only:
+        if not weights:
+            return []
+        max_rank = max(w["top_k"] for w in weights.values()) + config.ANALYZE_TOP_K_MARGIN
+        query = query.filter(
+            DailyHot.collected_at >= rank_day,
+            DailyHot.category.in_(list(weights)),
+            DailyHot.category_rank.isnot(None),
+            DailyHot.category_rank <= max_rank,
+        )
+
+    counts = {"dropped": 0, "scanned": 0}
+
+    def _candidates():
+        for row in query.yield_per(PRIORITIZE_BATCH_SIZE):
+            weight = weights.get(row.category)
+            rank = row.category_rank if row.collected_at and row.collected_at >= rank_day else None
+            in_top_k = bool(weight and rank and rank <= weight["top_k"] + config.ANALYZE_TOP_K_MARGIN)
+            if top_k_only and not in_top_k:
+                counts["dropped"] += 1
+                continue
+            counts["scanned"] += 1
+            priority = weight["subscribers"] / rank * urgency if (weight and rank) else 0.0
+            yield priority, row.collected_at or datetime.min, row
+
+    best = heapq.nlargest(limit, _candidates(), key=lambda x: (x[0], x[1]))
+    items = [
+        {
+            "id": row.id,
+            "category": row.category,
+            "title": row.title,
+            "url": row.url,
+            "extra": dict(row.extra) if isinstance(row.extra, dict) else {},
+            "collected_at": row.collected_at,
+            "priority": priority,
+        }
+        for priority, _, row in best
+    ]
+    if counts["dropped"]:
+        logger.info(f"跳过 {counts['dropped']} 条不在任何订阅者 Top-K 内的待分析数据")
+    if counts["scanned"] > len(items):
+        logger.info(f"待分析数据 {counts['scanned']} 条，本次只排入价值最高的 {len(items)} 条")
+    return items
@@ -0,0 +1,300 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+import config
+from models import AnalysisTask, DailyHot
+from tag_index import clean_tags
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+QUARANTINED = "quarantined"
+
+# 每条 INSERT 语句最多写入的任务数
+ENQUEUE_CHUNK_SIZE = 1000
+
+
+def worker_id() -> str:
+    """
+    当前进程的领取者标识
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """
+    第 attempts 次失败后的退避时间：base × 2^(attempts-1)，不超过上限
+
+    :param attempts: 已尝试次数（>=1）
+    :return: 距下次尝试的间隔
+    """
+    seconds = config.ANALYSIS_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, config.ANALYSIS_RETRY_MAX_SECONDS))
+
+
+def enqueue_tasks(session: Session, pending: List[Dict[str, Any]], now: Optional[datetime] = None,
+                  reset_dropped: bool = True) -> int:
+    """
+    为待分析的热点数据创建或刷新分析任务
+
+    - 新任务：attempts 沿用旧版 extra.analysis_fail_count；extra.skip 为 True 的直接隔离
+    - 已存在且仍为 pending 的任务：刷新优先级；其它状态的任务保持不变
+    - reset_dropped 为 True 时（每日全量生成），本次未出现在 pending 中的 pending 任务优先级清零（例如已跌出 Top-K）；
+      增量生成（只包含新收集的数据）时应为 False
+
+    :param session: 数据库会话
+    :param pending: prioritize_pending 返回的待分析数据
+    :param now: 当前时间
+    :return: 写入（新增或刷新）的任务数
+    """
+    now = now or datetime.now()
+    dropped = []
+    # 只清零跌出本次列表的任务：优先级大于 0 的 pending 任务只有上次入选的那一批（走 ix_analysis_task_ready），
+    # 本次仍在列表中的由下面的写入刷新
+    if reset_dropped:
+        fresh = {item["id"] for item in pending}
+        dropped = [
+            task_id for task_id, hot_id in session.query(AnalysisTask.id, AnalysisTask.hot_id).filter(
+                AnalysisTask.state == PENDING, AnalysisTask.priority > 0)
+            if hot_id not in fresh
+        ]
+    for start in range(0, len(dropped), ENQUEUE_CHUNK_SIZE):
+        session.query(AnalysisTask).filter(
+            AnalysisTask.id.in_(dropped[start:start + ENQUEUE_CHUNK_SIZE]), AnalysisTask.state == PENDING,
+        ).update({AnalysisTask.priority: 0.0, AnalysisTask.updated_at: now}, synchronize_session=False)
+
+    written = 0
+    for start in range(0, len(pending), ENQUEUE_CHUNK_SIZE):
+        rows = []
+        for item in pending[start:start + ENQUEUE_CHUNK_SIZE]:
+            extra = item.get("extra") or {}
+            skipped = extra.get("skip") is True
+            rows.append({
+                "hot_id": item["id"],
+                "state": QUARANTINED if skipped else PENDING,
+                "priority": item.get("priority", 0.0),
+                "attempts": int(extra.get("analysis_fail_count", 0) or 0),
+                "next_attempt_at": now,
+                "last_error": "skip" if skipped else extra.get("last_error"),
+                "created_at": now,
+                "updated_at": now,
+            })
+        if not rows:
+            continue
+
+        stmt = insert(AnalysisTask).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalysisTask.hot_id],
+            set_={"priority": stmt.excluded.priority, "updated_at": now},
+            where=AnalysisTask.state == PENDING,
+        )
+        session.execute(stmt)
+        written += len(rows)
+    return written
+
+
+def reclaim_expired_leases(session: Session, max_attempts: int, now: Optional[datetime] = None) -> int:
+    """
+    回收租约已过期的任务：未达尝试上限的放回 pending，否则隔离
+
+    :return: 回收的任务数
+    """
+    now = now or datetime.now()
+    expired = (
+        session.query(AnalysisTask)
+        .filter(AnalysisTask.state == LEASED, AnalysisTask.lease_expires_at < now)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for task in expired:
+        task.state = QUARANTINED if task.attempts >= max_attempts else PENDING
+        task.next_attempt_at = now
+        task.lease_expires_at = None
+        task.lease_owner = None
+        task.last_error = "lease_expired"
+        task.updated_at = now
+    if expired:
+        logger.warning(f"回收 {len(expired)} 个租约过期的分析任务")
+    return len(expired)
+
+
+def lease_tasks(session: Session, limit: int, lease_seconds: Optional[int] = None,
+                min_priority: Optional[float] = None, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    领取一批可执行的任务（优先级从高到低），多个进程可同时领取而不会重复
+
+    :param session: 数据库会话
+    :param limit: 最多领取的任务数
+    :param lease_seconds: 租约时长，超过后任务会被回收
+    :param min_priority: 只领取优先级大于该值的任务
+    :param now: 当前时间
+    :return: 领取到的任务及对应热点数据
+    """
+    now = now or datetime.now()
+    lease_seconds = lease_seconds or config.ANALYSIS_LEASE_SECONDS
+
+    query = session.query(AnalysisTask).filter(
+        AnalysisTask.state == PENDING,
+        AnalysisTask.next_attempt_at <= now,
+    )
+    if min_priority is not None:
+        query = query.filter(AnalysisTask.priority > min_priority)
+    tasks = (
+        query.order_by(AnalysisTask.priority.desc(), AnalysisTask.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not tasks:
+        return []
+
+    owner = worker_id()
+    for task in tasks:
+        task.state = LEASED
+        task.attempts += 1
+        task.lease_expires_at = now + timedelta(seconds=lease_seconds)
+        task.lease_owner = owner
+        task.updated_at = now
+
+    hot_rows = {
+        row.id: row
+        for row in session.query(DailyHot.id, DailyHot.category, DailyHot.title, DailyHot.url)
+        .filter(DailyHot.id.in_([task.hot_id for task in tasks]))
+    }
+
+    leased = []
+    for task in tasks:
+        row = hot_rows.get(task.hot_id)
+        leased.append({
+            "task_id": task.id,
+            "id": task.hot_id,
+            "category": row.category if row else None,
+            "title": row.title if row else None,
+            "url": row.url if row else None,
+            "attempts": task.attempts,
+        })
+    return leased
+
+
+def release_tasks(session: Session, task_ids: List[int], now: Optional[datetime] = None) -> None:
+    """
+    归还已领取但尚未处理的任务（例如进程停止时），不计入尝试次数
+    """
+    if not task_ids:
+        return
+    now = now or datetime.now()
+    session.query(AnalysisTask).filter(AnalysisTask.id.in_(task_ids), AnalysisTask.state == LEASED).update(
+        {
+            AnalysisTask.state: PENDING,
+            AnalysisTask.attempts: AnalysisTask.attempts - 1,
+            AnalysisTask.lease_expires_at: None,
+            AnalysisTask.lease_owner: None,
+            AnalysisTask.updated_at: now,
+        },
+        synchronize_session=False,
+    )
+
+
+def release_owner_leases(session: Session, owner: str, now: Optional[datetime] = None) -> int:
+    """
+    归还某个已退出的执行者领取的全部任务（进程重启后领取者标识不变时使用），不计入尝试次数，
+    无需等待租约过期
+
+    :return: 归还的任务数
+    """
+    now = now or datetime.now()
+    return session.query(AnalysisTask).filter(AnalysisTask.state == LEASED, AnalysisTask.lease_owner == owner).update(
+        {
+            AnalysisTask.state: PENDING,
+            AnalysisTask.attempts: AnalysisTask.attempts - 1,
+            AnalysisTask.lease_expires_at: None,
+            AnalysisTask.lease_owner: None,
+            AnalysisTask.updated_at: now,
+        },
+        synchronize_session=False,
+    )
+
+
+def complete_task(session: Session, task_id: int, hot_id: int, result: Dict[str, Any],
+                  now: Optional[datetime] = None) -> None:
+    """
+    写入分析结果并将任务标记为完成
+    """
+    now = now or datetime.now()
+    item = session.get(DailyHot, hot_id)
+    if item is not None:
+        item.ai_summary = result["summary"]
+        item.ai_tags = clean_tags(result["tags"])
+        item.last_summarized_at = now
+
+        # 清理旧版写在 extra 里的失败痕迹（重新赋值，确保 JSON 列的变更被识别）
+        if isinstance(item.extra, dict) and ("analysis_fail_count" in item.extra or "last_error" in item.extra):
+            extra = dict(item.extra)
+            extra.pop("analysis_fail_count", None)
+            extra.pop("last_error", None)
+            item.extra = extra or None
+
+    task = session.get(AnalysisTask, task_id)
+    if task is not None:
+        task.state = DONE
+        task.lease_expires_at = None
+        task.lease_owner = None
+        task.last_error = None
+        task.updated_at = now
+
+
+def fail_task(session: Session, task_id: int, error: str, max_attempts: Optional[int] = None,
+              now: Optional[datetime] = None) -> str:
+    """
+    记录一次失败：未达尝试上限则按指数退避重新排队，否则隔离
+
+    :return: 任务的新状态
+    """
+    now = now or datetime.now()
+    max_attempts = max_attempts or config.ANALYSIS_MAX_ATTEMPTS
+    task = session.get(AnalysisTask, task_id)
+    if task is None:
+        return QUARANTINED
+
+    if task.attempts >= max_attempts:
+        task.state = QUARANTINED
+    else:
+        task.state = PENDING
+        task.next_attempt_at = now + retry_delay(task.attempts)
+    task.lease_expires_at = None
+    task.lease_owner = None
+    task.last_error = error[:2000] if error else error
+    task.updated_at = now
+    return task.state
+
+
+def prune_done_tasks(session: Session, retention_days: Optional[int] = None,
+                     now: Optional[datetime] = None) -> int:
+    """
+    删除完成超过 retention_days 天的任务（走 ix_analysis_task_done），任务表只保留未完成及近期完成的任务
+
+    :return: 删除的任务数
+    """
+    now = now or datetime.now()
+    retention_days = config.ANALYSIS_DONE_RETENTION_DAYS if retention_days is None else retention_days
+    return session.query(AnalysisTask).filter(
+        AnalysisTask.state == DONE,
+        AnalysisTask.updated_at < now - timedelta(days=retention_days),
+    ).delete(synchronize_session=False)
+
+
+def queue_stats(session: Session) -> Dict[str, int]:
+    """
+    未完成任务各状态的数量（每个状态各走一个部分索引，不统计已完成任务）
+    """
+    return {
+        state: session.query(func.count(AnalysisTask.id)).filter(AnalysisTask.state == state).scalar()
+        for state in (PENDING, LEASED, QUARANTINED)
+    }
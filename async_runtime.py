@@ -0,0 +1,291 @@
+import asyncio
+import signal
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from loguru import logger
+
+import config
+from profiling import profiled
+
+
+class SharedResources:
+    """
+    各阶段共享的客户端：HTTP（requests 连接池）、数据库（SQLAlchemy 连接池）、SMTP，以及可选的摘要接口
+    """
+
+    def __init__(self):
+        from daily_hot_client import DailyHotClient
+        from daily_hot_reminder import SmtpClient
+
+        self.http = DailyHotClient()
+        self.smtp = SmtpClient()
+        self.stop_event = threading.Event()
+        self.digest = None
+        self.digest_server = None
+
+    def start_digest_api(self) -> None:
+        from digest_api import DigestCache, start_server
+
+        self.digest = DigestCache()
+        self.digest_server = start_server(self.digest)
+
+    def close(self) -> None:
+        from cover_images import shutdown_resize_pool
+        from database import dispose_engine
+
+        if self.digest_server is not None:
+            self.digest_server.shutdown()
+        self.http.close()
+        self.smtp.close()
+        shutdown_resize_pool()
+        dispose_engine()
+
+
+class AsyncRuntime:
+    """
+    基于 asyncio 的调度运行时
+
+    - 收集、分析、发送作为同一事件循环上的协作任务运行，可以相互重叠；
+      阻塞的数据库/HTTP/SMTP 调用放到共享线程池中执行，并共用同一组客户端
+    - 同一阶段不会重入（上一次未结束时跳过本次触发）
+    - 收到 SIGTERM/SIGINT 后停止触发新任务，通知进行中的阶段在当前条目完成后退出，
+      最多等待 drain_timeout 秒，之后取消剩余任务并释放连接
+    - 两次运行之间事件循环处于空闲等待，不占用 CPU
+    """
+
+    def __init__(self, tz, drain_timeout: Optional[int] = None, max_workers: Optional[int] = None):
+        """
+        :param tz: 调度时区
+        :param drain_timeout: 停止时等待进行中任务结束的最长秒数
+        :param max_workers: 执行阻塞调用的线程数
+        """
+        self.tz = tz
+        self.drain_timeout = drain_timeout or config.SCHEDULER_DRAIN_TIMEOUT
+        self.scheduler = AsyncIOScheduler(
+            timezone=tz,
+            job_defaults={
+                "coalesce": True,  # 堆积时只跑一次
+                "max_instances": 1,  # 防止并发重入
+                "misfire_grace_time": 300,  # 错过触发点5分钟内仍执行
+            },
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.SCHEDULER_WORKERS,
+            thread_name_prefix="stage",
+        )
+        self.resources = SharedResources()
+        self._running: Dict[str, asyncio.Task] = {}
+        # 线程池中仍在执行的阶段函数；取消协程并不会中止对应线程
+        self._inflight: Set[Future] = set()
+        self._stopped: Optional[asyncio.Event] = None
+        self._shutting_down = False
+
+    async def run_stage(self, name: str, fn: Callable, *args, **kwargs):
+        """
+        在线程池中执行一个阶段，同名阶段正在运行时跳过
+
+        :param name: 阶段名称
+        :param fn: 阶段函数（阻塞）
+        :return: 阶段函数的返回值，跳过或出错时为 None
+        """
+        if self.resources.stop_event.is_set():
+            return None
+        if name in self._running:
+            logger.warning(f"【{name}】上一次仍在运行，跳过本次触发")
+            return None
+
+        self._running[name] = asyncio.current_task()
+        try:
+            logger.info(f"开始执行【{name}】")
+            future = self.executor.submit(profiled, name, fn, *args, **kwargs)
+            self._inflight.add(future)
+            future.add_done_callback(self._inflight.discard)
+            result = await asyncio.wrap_future(future)
+            logger.info(f"完成【{name}】")
+            return result
+        except asyncio.CancelledError:
+            logger.warning(f"【{name}】已取消")
+            raise
+        except Exception as e:
+            logger.exception(f"【{name}】出错: {e}")
+            return None
+        finally:
+            self._running.pop(name, None)
+
+    async def collect(self) -> None:
+        from daily_hot_collector import collect_daily_hot_data
+
+        await self.run_stage("数据收集", collect_daily_hot_data,
+                             client=self.resources.http, stop_event=self.resources.stop_event)
+
+    async def adaptive_collect(self) -> None:
+        from daily_hot_collector import collect_due_routes
+
+        await self.run_stage("自适应收集", collect_due_routes,
+                             client=self.resources.http, stop_event=self.resources.stop_event)
+
+    async def analyze(self) -> None:
+        from daily_hot_collector import analyze_daily_hot_data
+
+        await self.run_stage("数据分析", analyze_daily_hot_data,
+                             client=self.resources.http, stop_event=self.resources.stop_event)
+        await self.refresh_digest()
+
+    async def analysis_retry(self) -> None:
+        from daily_hot_collector import analyze_daily_hot_data
+
+        # 只处理已到退避时间的任务，不重新生成任务；没有到期任务时只做一次索引查询
+        analyzed = await self.run_stage("分析重试", analyze_daily_hot_data, enqueue=False,
+                                        client=self.resources.http, stop_event=self.resources.stop_event)
+        if analyzed:
+            await self.refresh_digest()
+
+    async def refresh_digest(self) -> None:
+        """
+        分析结束后刷新摘要接口的内存快照（未开启 DIGEST_API_ENABLED 时不做任何事）
+        """
+        if self.resources.digest is None:
+            return
+        await self.run_stage("摘要缓存刷新", self.resources.digest.refresh)
+
+    async def email(self, checkpoint: bool = True) -> None:
+        from daily_hot_reminder import send_personalized_emails
+
+        def _send():
+            try:
+                # 多条并发 SMTP 连接时由投递渠道自行创建连接
+                smtp = self.resources.smtp if config.DELIVERY_SMTP_CONCURRENCY <= 1 else None
+                # 时间预算不足时可直接复用摘要接口的内存快照
+                snapshot = self.resources.digest.snapshot if self.resources.digest is not None else None
+                send_personalized_emails(smtp=smtp, stop_event=self.resources.stop_event, snapshot=snapshot,
+                                         checkpoint=checkpoint)
+            finally:
+                # 两次发送间隔一天，发送结束即断开 SMTP 连接
+                self.resources.smtp.close()
+
+        await self.run_stage("邮件发送", _send)
+
+    async def run_once(self) -> None:
+        """
+        依次执行一次 收集/分析/发送（用于验证）
+
+        摘要时间之前的这次发送不记录断点，不影响当天定时发送的摘要
+        """
+        from daily_hot_reminder import digest_time_reached
+
+        await self.collect()
+        await self.analyze()
+        await self.email(checkpoint=digest_time_reached())
+
+    def add_jobs(self) -> None:
+        if config.ADAPTIVE_COLLECT_ENABLED:
+            # 自适应模式：按各路由自己的间隔采集，取代每日一次的全量收集
+            self.scheduler.add_job(
+                self.adaptive_collect,
+                IntervalTrigger(seconds=config.ADAPTIVE_TICK_SECONDS),
+                id="daily_hot_adaptive_collector",
+                name="自适应热点收集",
+                replace_existing=True,
+            )
+        else:
+            self.scheduler.add_job(
+                self.collect,
+                CronTrigger(hour=1, minute=0, timezone=self.tz),
+                id="daily_hot_collector",
+                name="每日热点收集",
+                replace_existing=True,
+            )
+        self.scheduler.add_job(
+            self.analyze,
+            CronTrigger(hour=1, minute=5, timezone=self.tz),
+            id="daily_hot_analyzer",
+            name="每日热点分析",
+            replace_existing=True,
+        )
+        self.scheduler.add_job(
+            self.analysis_retry,
+            IntervalTrigger(seconds=config.ANALYSIS_POLL_SECONDS),
+            id="daily_hot_analysis_retry",
+            name="分析失败重试",
+            replace_existing=True,
+        )
+        self.scheduler.add_job(
+            self.email,
+            CronTrigger(hour=config.DIGEST_HOUR, minute=config.DIGEST_MINUTE, timezone=self.tz),
+            id="daily_hot_reminder",
+            name="每日热点提醒",
+            replace_existing=True,
+        )
+
+    async def shutdown(self, signum: int) -> None:
+        """
+        优雅退出：停止调度，等待进行中的阶段完成当前条目，然后释放共享资源
+
+        等待总计不超过 drain_timeout 秒；仍有阶段线程在使用共享连接时不释放，留给进程退出时回收
+        """
+        if self._shutting_down:
+            return
+        self._shutting_down = True
+        logger.warning(f"收到信号 {signum}，准备停止调度器...")
+
+        self.resources.stop_event.set()
+        self.scheduler.shutdown(wait=False)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        running = dict(self._running)
+        if running:
+            logger.info(f"等待进行中的任务结束: {', '.join(running)}（最多 {self.drain_timeout} 秒）")
+            _, pending = await asyncio.wait(running.values(), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"{len(pending)} 个任务未能在限定时间内结束，已取消")
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        busy = [future for future in list(self._inflight) if not future.done()]
+        if busy:
+            _, busy = await asyncio.wait([asyncio.wrap_future(future) for future in busy],
+                                         timeout=max(deadline - loop.time(), 0))
+        if busy:
+            logger.warning(f"{len(busy)} 个阶段线程仍在运行，跳过释放共享连接")
+        else:
+            self.resources.close()
+        logger.info("调度器已停止")
+        self._stopped.set()
+
+    async def serve(self, run_on_start: bool = False, on_started: Optional[Callable] = None) -> None:
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda s=sig: asyncio.ensure_future(self.shutdown(s)))
+
+        self.add_jobs()
+        self.scheduler.start()
+        if config.DIGEST_API_ENABLED:
+            self.resources.start_digest_api()
+            asyncio.ensure_future(self.refresh_digest())
+        if on_started is not None:
+            on_started(self.scheduler)
+
+        if run_on_start:
+            logger.info("RUN_ON_START=true：立即执行一次 收集/分析/发送 用于验证")
+            asyncio.ensure_future(self.run_once())
+
+        await self._stopped.wait()
+
+    def run(self, run_on_start: bool = False, on_started: Optional[Callable] = None) -> None:
+        """
+        启动事件循环并阻塞到收到停止信号
+
+        :param run_on_start: 启动后是否立即执行一次 收集/分析/发送
+        :param on_started: 调度器启动后的回调，参数为调度器
+        """
+        logger.info(f"以定时任务模式启动（当前时间 {datetime.now(self.tz):%Y-%m-%d %H:%M:%S %Z}）")
+        asyncio.run(self.serve(run_on_start=run_on_start, on_started=on_started))
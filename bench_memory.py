@@ -0,0 +1,126 @@
+"""
+内存占用基准测试
+
+对比：
+1. 每行一个 12 键字典（旧实现）与 HotItem（__slots__，时间延迟格式化）的峰值内存
+2. 先全部加载再截取前 N 条（旧实现）与流式 Top-N 选取的峰值内存
+3. 一次性获取全部类目数据（get_all_hot_lists）与逐类目流式处理（iter_hot_lists）的峰值内存
+
+用法：python bench_memory.py
+"""
+import heapq
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from daily_hot_client import DailyHotClient
+from models import HotItem
+
+ROW_COUNTS = (1_000, 10_000, 100_000)
+CATEGORY_COUNTS = (10, 50, 200)
+ITEMS_PER_CATEGORY = 50
+
+
+def _fake_rows(n: int):
+    now = datetime.now()
+    for i in range(n):
+        yield (
+            i, f"cat{i % 20}", f"热点标题 {i}", f"热点描述 {i}" * 3, f"https://img.example.com/{i}.jpg",
+            100000 - i, f"https://example.com/{i}", f"https://m.example.com/{i}",
+            f"AI 摘要 {i}" * 5, ["科技", "AI"], now - timedelta(minutes=i), now,
+        )
+
+
+def _as_dict(row) -> Dict[str, Any]:
+    (id_, category, title, description, cover, hot_score, url, mobile_url,
+     ai_summary, ai_tags, publish_time, collected_at) = row
+    return {
+        'id': id_,
+        'category': category,
+        'title': title,
+        'description': description,
+        'cover': cover,
+        'hot_score': hot_score,
+        'url': url,
+        'mobile_url': mobile_url,
+        'publish_time': publish_time.strftime('%Y-%m-%d %H:%M:%S') if publish_time else None,
+        'ai_summary': ai_summary,
+        'ai_tags': ai_tags,
+        'collected_at': collected_at.strftime('%Y-%m-%d %H:%M:%S') if collected_at else None,
+    }
+
+
+def _peak(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+class _FakeClient(DailyHotClient):
+    """
+    不访问网络，按类目生成固定大小的热点数据
+    """
+
+    def __init__(self, category_count: int):
+        super().__init__()
+        self.category_count = category_count
+
+    def get_all_categories(self):
+        return [{"name": f"cat{i}", "path": f"/cat{i}"} for i in range(self.category_count)]
+
+    def get_hot_list(self, path: str, force_refresh: bool = False) -> Optional[Dict[str, Any]]:
+        return {
+            "code": 200,
+            "data": [
+                {"title": f"{path} 热点 {i}", "desc": "描述" * 20, "hot": i, "url": f"https://example.com{path}/{i}",
+                 "timestamp": 1700000000000}
+                for i in range(ITEMS_PER_CATEGORY)
+            ],
+        }
+
+
+def bench_rows():
+    print("== 行表示（已加载的全部行） ==")
+    for n in ROW_COUNTS:
+        dict_peak = _peak(lambda: [_as_dict(row) for row in _fake_rows(n)])
+        slot_peak = _peak(lambda: [HotItem.from_row(row) for row in _fake_rows(n)])
+        print(f"  rows={n:>7}  dict={dict_peak:8.2f} MB  HotItem={slot_peak:8.2f} MB")
+
+
+def bench_select():
+    print("== 选取前 N 条 ==")
+    top_n = 12
+    for n in ROW_COUNTS:
+        eager_peak = _peak(lambda: sorted((_as_dict(row) for row in _fake_rows(n)),
+                                          key=lambda x: x['hot_score'], reverse=True)[:top_n])
+        stream_peak = _peak(lambda: heapq.nlargest(top_n, (HotItem.from_row(row) for row in _fake_rows(n)),
+                                                   key=lambda x: x.hot_score))
+        print(f"  rows={n:>7}  全量加载={eager_peak:8.2f} MB  流式={stream_peak:8.2f} MB")
+
+
+def bench_collect():
+    print("== 收集（逐条消费全部类目） ==")
+
+    def consume(hot_lists):
+        total = 0
+        for _, payload in hot_lists:
+            total += len(payload.entries)
+        return total
+
+    for count in CATEGORY_COUNTS:
+        client = _FakeClient(count)
+        eager_peak = _peak(lambda: consume(client.get_all_hot_lists().items()))
+        stream_peak = _peak(lambda: consume(client.iter_hot_lists()))
+        print(f"  categories={count:>4}  get_all_hot_lists={eager_peak:8.2f} MB  iter_hot_lists={stream_peak:8.2f} MB")
+
+
+def main():
+    bench_rows()
+    bench_select()
+    bench_collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,4 +22,96 @@ SENDER_PASSWORD = os.getenv('SENDER_PASSWORD', '')
 MAX_ITEMS_PER_EMAIL = int(os.getenv('MAX_ITEMS_PER_EMAIL', '12'))
 
 # 定时任务配置
-RUN_AS_SCHEDULER = os.getenv('RUN_AS_SCHEDULER', '').lower() == 'true'
\ No newline at end of file
+RUN_AS_SCHEDULER = os.getenv('RUN_AS_SCHEDULER', '').lower() == 'true'
+
+# 原始响应采集配置
+RAW_CAPTURE_ENABLED = os.getenv('RAW_CAPTURE_ENABLED', '').lower() == 'true'
+RAW_CAPTURE_DIR = os.getenv('RAW_CAPTURE_DIR', './raw_capture')
+RAW_CAPTURE_SEGMENT_MB = int(os.getenv('RAW_CAPTURE_SEGMENT_MB', '64'))
+RAW_CAPTURE_CODEC = os.getenv('RAW_CAPTURE_CODEC', '')  # zstd / gzip，留空则自动选择
+
+# 数据库连接池配置
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '5'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))  # 借出连接的最长等待秒数
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # 连接最长复用秒数
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+# 自适应采集配置（按路由变化频率调整采集间隔）
+ADAPTIVE_COLLECT_ENABLED = os.getenv('ADAPTIVE_COLLECT_ENABLED', '').lower() == 'true'
+ADAPTIVE_MIN_INTERVAL = int(os.getenv('ADAPTIVE_MIN_INTERVAL', '300'))  # 秒
+ADAPTIVE_MAX_INTERVAL = int(os.getenv('ADAPTIVE_MAX_INTERVAL', '86400'))  # 秒
+ADAPTIVE_INITIAL_INTERVAL = int(os.getenv('ADAPTIVE_INITIAL_INTERVAL', '3600'))  # 秒
+ADAPTIVE_REQUEST_BUDGET = int(os.getenv('ADAPTIVE_REQUEST_BUDGET', '600'))  # 每小时最多请求次数
+ADAPTIVE_TICK_SECONDS = int(os.getenv('ADAPTIVE_TICK_SECONDS', '60'))  # 检查到期路由的间隔
+ADAPTIVE_STATE_PATH = os.getenv('ADAPTIVE_STATE_PATH', './logs/route_frequency.json')
+
+# 摘要发送时间（同时用于分析优先级计算）
+DIGEST_HOUR = int(os.getenv('DIGEST_HOUR', '10'))
+DIGEST_MINUTE = int(os.getenv('DIGEST_MINUTE', '0'))
+
+# 分析优先级配置
+ANALYZE_TOP_K_ONLY = os.getenv('ANALYZE_TOP_K_ONLY', '').lower() == 'true'  # 只分析可能进入摘要的数据
+ANALYZE_TOP_K_MARGIN = int(os.getenv('ANALYZE_TOP_K_MARGIN', '2'))  # Top-K 之外额外保留的条数，弥补分析失败
+ANALYZE_PENDING_LIMIT = int(os.getenv('ANALYZE_PENDING_LIMIT', '5000'))  # 每次最多排入队列的待分析数据条数
+
+# 分析任务队列配置
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_MAX_ATTEMPTS', '5'))  # 达到后隔离，不再重试
+ANALYSIS_RETRY_BASE_SECONDS = int(os.getenv('ANALYSIS_RETRY_BASE_SECONDS', '60'))  # 首次重试间隔，之后指数增长
+ANALYSIS_RETRY_MAX_SECONDS = int(os.getenv('ANALYSIS_RETRY_MAX_SECONDS', '3600'))
+ANALYSIS_LEASE_SECONDS = int(os.getenv('ANALYSIS_LEASE_SECONDS', '600'))  # 任务租约时长
+ANALYSIS_POLL_SECONDS = int(os.getenv('ANALYSIS_POLL_SECONDS', '120'))  # 轮询重试任务的间隔
+ANALYSIS_LEASE_BATCH = int(os.getenv('ANALYSIS_LEASE_BATCH', '5'))  # 每次领取的任务数
+ANALYSIS_DONE_RETENTION_DAYS = int(os.getenv('ANALYSIS_DONE_RETENTION_DAYS', '7'))  # 已完成任务的保留天数
+
+# 调度运行时配置
+SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', '4'))  # 执行阻塞调用的线程数
+SCHEDULER_DRAIN_TIMEOUT = int(os.getenv('SCHEDULER_DRAIN_TIMEOUT', '60'))  # 停止时等待进行中任务的秒数
+
+# 热点接口本地缓存配置
+HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE_ENABLED', '').lower() == 'true'  # 用于开发调试、重复运行及 RUN_ON_START
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH', './cache/http_cache.sqlite3')
+HTTP_CACHE_TTL = int(os.getenv('HTTP_CACHE_TTL', '600'))  # 默认有效期（秒）
+HTTP_CACHE_ROUTE_TTLS = os.getenv('HTTP_CACHE_ROUTE_TTLS', '/all=3600')  # 按路由覆盖，如 "/all=3600,/weibo=120"
+HTTP_CACHE_STALE_SECONDS = int(os.getenv('HTTP_CACHE_STALE_SECONDS', '600'))  # 过期后仍可先返回旧数据的窗口
+HTTP_CACHE_MAX_MB = int(os.getenv('HTTP_CACHE_MAX_MB', '64'))
+
+# 性能剖析配置（sample: 采样调用栈；cprofile: 额外输出 cProfile 数据；留空关闭）
+PROFILE_JOBS = os.getenv('PROFILE_JOBS', '')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.getenv('LOG_DIR', './logs'), 'profiles'))
+PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+
+# Web 摘要 / JSON 接口配置
+DIGEST_API_ENABLED = os.getenv('DIGEST_API_ENABLED', '').lower() == 'true'  # 定时任务模式下是否同时提供接口
+DIGEST_API_HOST = os.getenv('DIGEST_API_HOST', '0.0.0.0')
+DIGEST_API_PORT = int(os.getenv('DIGEST_API_PORT', '8080'))
+DIGEST_API_TOP_N = int(os.getenv('DIGEST_API_TOP_N', '50'))  # 每个分类在内存中保留的条数
+DIGEST_API_REFRESH_SECONDS = int(os.getenv('DIGEST_API_REFRESH_SECONDS', '300'))  # 独立运行时的刷新间隔
+
+# 封面图片配置（缩放需要安装 Pillow，未安装时只缓存本身足够小的原图）
+COVER_ENABLED = os.getenv('COVER_ENABLED', '').lower() == 'true'
+COVER_CACHE_DIR = os.getenv('COVER_CACHE_DIR', './cache/covers')
+COVER_CACHE_MAX_MB = int(os.getenv('COVER_CACHE_MAX_MB', '200'))
+COVER_BYTE_BUDGET_MB = int(os.getenv('COVER_BYTE_BUDGET_MB', '32'))  # 每次预取最多下载的字节数
+COVER_MAX_IMAGE_KB = int(os.getenv('COVER_MAX_IMAGE_KB', '4096'))  # 单张原图上限
+COVER_MAX_THUMB_KB = int(os.getenv('COVER_MAX_THUMB_KB', '64'))  # 单张缩略图上限
+COVER_THUMB_SIZE = int(os.getenv('COVER_THUMB_SIZE', '240'))
+COVER_THUMB_QUALITY = int(os.getenv('COVER_THUMB_QUALITY', '70'))
+COVER_WORKERS = int(os.getenv('COVER_WORKERS', '8'))
+COVER_RESIZE_WORKERS = int(os.getenv('COVER_RESIZE_WORKERS', '2'))
+COVER_TIMEOUT = int(os.getenv('COVER_TIMEOUT', '10'))
+
+# 摘要投递配置
+DELIVERY_CHANNELS = os.getenv('DELIVERY_CHANNELS', 'smtp')  # 默认渠道，逗号分隔：smtp,webhook,file
+DELIVERY_SMTP_CONCURRENCY = int(os.getenv('DELIVERY_SMTP_CONCURRENCY', '1'))  # 并发 SMTP 连接数
+DELIVERY_WEBHOOK_URL = os.getenv('DELIVERY_WEBHOOK_URL', '')
+DELIVERY_WEBHOOK_BATCH = int(os.getenv('DELIVERY_WEBHOOK_BATCH', '50'))  # 每次 POST 的摘要数
+DELIVERY_WEBHOOK_CONCURRENCY = int(os.getenv('DELIVERY_WEBHOOK_CONCURRENCY', '4'))
+DELIVERY_MBOX_PATH = os.getenv('DELIVERY_MBOX_PATH', './logs/digests.mbox')
+DELIVERY_MAX_ATTEMPTS = int(os.getenv('DELIVERY_MAX_ATTEMPTS', '3'))
+DELIVERY_RETRY_SECONDS = int(os.getenv('DELIVERY_RETRY_SECONDS', '30'))
+# 从开始生成到投递完成的时间预算（秒），临近期限时逐级降级，0 表示不限时
+DIGEST_TIME_BUDGET_SECONDS = int(os.getenv('DIGEST_TIME_BUDGET_SECONDS', '900'))
+
+# 运行断点配置（每天各阶段的进度写入 pipeline_run 表，重启后从断点继续、跳过当天已完成的阶段）
+PIPELINE_CHECKPOINT_ENABLED = os.getenv('PIPELINE_CHECKPOINT_ENABLED', 'true').lower() == 'true'
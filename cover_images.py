@@ -0,0 +1,366 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from loguru import logger
+
+import config
+
+# 文件头 -> 扩展名，用于识别未经缩放的原图
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+# 下载或处理失败的封面在该时间内不再重试（秒）
+FAILED_RETRY_SECONDS = 24 * 3600
+
+MIME_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+
+
+def _image_ext(data: bytes) -> Optional[str]:
+    for signature, ext in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def make_thumbnail(data: bytes, size: int, quality: int) -> Optional[bytes]:
+    """
+    把图片缩放为不超过 size×size 的 JPEG 缩略图（在进程池中执行，需要 Pillow）
+
+    :param data: 原图
+    :param size: 最长边像素
+    :param quality: JPEG 质量
+    :return: 缩略图，无法解码时返回 None
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("RGB", (size, size))  # JPEG 解码时直接按比例缩小，省去大图的完整解码
+            image = image.convert("RGB")
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            return out.getvalue()
+    except Exception:
+        return None
+
+
+class CoverStore:
+    """
+    封面缩略图的本地缓存
+
+    - 文件按内容哈希命名（{key[:2]}/{key}），相同图片只保存一份；另有 url -> key 的索引
+    - 记录下载/处理失败的 url，FAILED_RETRY_SECONDS 内不再重复下载
+    - 读取时更新文件的修改时间，总大小超过 max_bytes 时按最久未使用淘汰
+    """
+
+    def __init__(self, base_dir: str, max_bytes: int):
+        """
+        :param base_dir: 缓存目录
+        :param max_bytes: 缓存总大小上限
+        """
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(base_dir, "index.json")
+        self._index: Dict[str, str] = {}
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        os.makedirs(base_dir, exist_ok=True)
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._index = data.get("covers", {})
+                self._failed = data.get("failed", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取封面缓存索引失败，将重新下载: {e}")
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.base_dir, key[:2], key)
+
+    def lookup(self, url: str) -> Optional[str]:
+        """
+        url 对应的缓存 key，文件已被淘汰时返回 None
+        """
+        key = self._index.get(url)
+        if key and os.path.exists(self.path_for(key)):
+            return key
+        return None
+
+    def recently_failed(self, url: str, now: Optional[float] = None) -> bool:
+        failed_at = self._failed.get(url)
+        return failed_at is not None and (now or time.time()) - failed_at < FAILED_RETRY_SECONDS
+
+    def mark_failed(self, url: str, now: Optional[float] = None) -> None:
+        with self._lock:
+            self._failed[url] = now or time.time()
+
+    def read(self, key: str) -> Optional[bytes]:
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def put(self, url: str, data: bytes, ext: str) -> str:
+        """
+        写入缩略图并记录 url 索引
+
+        :return: 缓存 key（内容哈希 + 扩展名）
+        """
+        key = f"{hashlib.blake2b(data, digest_size=16).hexdigest()}.{ext}"
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._index[url] = key
+            self._failed.pop(url, None)
+        return key
+
+    def evict(self) -> int:
+        """
+        超出大小上限时删除最久未使用的文件，并清理失效的索引
+
+        :return: 删除的文件数
+        """
+        files = []
+        for root, _, names in os.walk(self.base_dir):
+            for name in names:
+                if name == "index.json" or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        if removed:
+            with self._lock:
+                self._index = {url: key for url, key in self._index.items() if os.path.exists(self.path_for(key))}
+            logger.info(f"封面缓存超出上限，淘汰 {removed} 个文件")
+        return removed
+
+    def save(self) -> None:
+        now = time.time()
+        with self._lock:
+            data = {
+                "covers": dict(self._index),
+                "failed": {url: t for url, t in self._failed.items() if now - t < FAILED_RETRY_SECONDS},
+            }
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.index_path)
+
+
+class _ByteBudget:
+    """
+    多个下载线程共享的字节预算
+    """
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self._lock = threading.Lock()
+
+    def take(self, n: int) -> bool:
+        with self._lock:
+            if n > self.remaining:
+                self.remaining = 0
+                return False
+            self.remaining -= n
+            return True
+
+
+def _download(session: requests.Session, url: str, budget: _ByteBudget, max_bytes: int) -> Optional[bytes]:
+    """
+    流式下载单张图片，超过单图上限或总预算时放弃
+    """
+    try:
+        with session.get(url, stream=True, timeout=config.COVER_TIMEOUT) as response:
+            response.raise_for_status()
+            if not response.headers.get("Content-Type", "image/").startswith("image/"):
+                return None
+            length = int(response.headers.get("Content-Length") or 0)
+            if length > max_bytes:
+                return None
+            chunks, size = [], 0
+            for chunk in response.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > max_bytes or not budget.take(len(chunk)):
+                    return None
+                chunks.append(chunk)
+            return b"".join(chunks)
+    except (requests.RequestException, ValueError) as e:
+        logger.debug(f"下载封面失败: {url}, 错误: {e}")
+        return None
+
+
+def prefetch_covers(items: Iterable, store: Optional["CoverStore"] = None) -> int:
+    """
+    为入选摘要的热点预取封面：并发下载（受总字节预算限制）、在进程池中缩放压缩、写入本地缓存，
+    并把缓存 key 写到 item.cover_key
+
+    没有安装 Pillow 时只缓存本身足够小（COVER_MAX_THUMB_KB 以内）的原图
+
+    :param items: 热点数据（HotItem）
+    :param store: 封面缓存，默认 get_cover_store()
+    :return: 新下载的封面数
+    """
+    store = store or get_cover_store()
+    if store is None:
+        return 0
+
+    by_url: Dict[str, List] = {}
+    for item in items:
+        if item.cover:
+            by_url.setdefault(item.cover, []).append(item)
+
+    missing = []
+    for url, url_items in by_url.items():
+        key = store.lookup(url)
+        if key:
+            for item in url_items:
+                item.cover_key = key
+        elif not store.recently_failed(url):
+            missing.append(url)
+    if not missing:
+        return 0
+
+    budget = _ByteBudget(config.COVER_BYTE_BUDGET_MB * 1024 * 1024)
+    max_image_bytes = config.COVER_MAX_IMAGE_KB * 1024
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=config.COVER_WORKERS) as pool:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=config.COVER_WORKERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        downloaded = dict(zip(missing, pool.map(lambda u: _download(session, u, budget, max_image_bytes), missing)))
+    downloaded = {url: data for url, data in downloaded.items() if data}
+
+    max_thumb_bytes = config.COVER_MAX_THUMB_KB * 1024
+    if pillow_available():
+        urls = list(downloaded)
+        thumbs = get_resize_pool().map(make_thumbnail, [downloaded[u] for u in urls],
+                                       [config.COVER_THUMB_SIZE] * len(urls), [config.COVER_THUMB_QUALITY] * len(urls))
+        results = {url: (thumb, "jpg") for url, thumb in zip(urls, thumbs) if thumb}
+    else:
+        results = {url: (data, _image_ext(data)) for url, data in downloaded.items()}
+    results = {url: value for url, value in results.items() if value[1] and len(value[0]) <= max_thumb_bytes}
+
+    # 预算用尽时无法区分是图片本身的问题还是被预算截断，不记录失败，下次再试
+    if budget.remaining > 0:
+        for url in missing:
+            if url not in results:
+                store.mark_failed(url)
+    for url, (data, ext) in results.items():
+        key = store.put(url, data, ext)
+        for item in by_url[url]:
+            item.cover_key = key
+    store.evict()
+    store.save()
+
+    logger.info(f"封面预取：需要 {len(missing)} 张，下载 {len(downloaded)} 张，缓存 {len(results)} 张"
+                f"（剩余预算 {budget.remaining // 1024} KB）")
+    return len(results)
+
+
+def cover_images(items: Iterable, store: Optional["CoverStore"] = None) -> Dict[str, bytes]:
+    """
+    读取一组热点已缓存的封面，用于以 CID 方式内嵌到邮件中
+
+    :return: {cover_key: 图片内容}
+    """
+    store = store or get_cover_store()
+    images = {}
+    if store is None:
+        return images
+    for item in items:
+        key = getattr(item, "cover_key", None)
+        if key and key not in images:
+            data = store.read(key)
+            if data:
+                images[key] = data
+    return images
+
+
+_default_store: Optional[CoverStore] = None
+_resize_pool: Optional[ProcessPoolExecutor] = None
+_resize_pool_lock = threading.Lock()
+
+
+def get_resize_pool() -> ProcessPoolExecutor:
+    """
+    获取进程内共享的缩略图进程池，首次使用时创建，之后各次预取复用
+
+    调度进程里有多个线程（线程池、投递线程、采样线程），fork 可能复制其它线程持有的锁导致子进程死锁，
+    因此用 spawn 启动工作进程
+    """
+    global _resize_pool
+    with _resize_pool_lock:
+        if _resize_pool is None:
+            _resize_pool = ProcessPoolExecutor(max_workers=config.COVER_RESIZE_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+        return _resize_pool
+
+
+def shutdown_resize_pool() -> None:
+    """
+    关闭共享的缩略图进程池（进程退出前调用）
+    """
+    global _resize_pool
+    with _resize_pool_lock:
+        pool, _resize_pool = _resize_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_cover_store() -> Optional[CoverStore]:
+    """
+    获取全局封面缓存，未开启 COVER_ENABLED 时返回 None
+    """
+    global _default_store
+    if not config.COVER_ENABLED:
+        return None
+    if _default_store is None:
+        _default_store = CoverStore(config.COVER_CACHE_DIR, config.COVER_CACHE_MAX_MB * 1024 * 1024)
+    return _default_store
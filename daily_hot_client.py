@@ -1,9 +1,15 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import threading
 
 import requests
 from loguru import logger
 
 import config
+from http_cache import ResponseCache, get_response_cache
+from payload_schema import PayloadError, RoutePayload, loads, parse_categories, parse_route_payload
+from profiling import span
+from raw_capture import RawCaptureStore, get_capture_store
 
 
 class DailyHotClient:
@@ -11,32 +17,111 @@ class DailyHotClient:
     热点数据客户端，用于获取各类平台的热点榜单数据
     """
 
-    def __init__(self, base_url: str = "https://dailyhot.yueyong.fun"):
+    def __init__(self, base_url: str = "https://dailyhot.yueyong.fun",
+                 capture: Optional[RawCaptureStore] = None, cache: Optional[ResponseCache] = None):
         """
         初始化客户端
         
         :param base_url: 热点服务的基础URL
+        :param capture: 原始响应采集存储，默认根据 RAW_CAPTURE_ENABLED 决定是否开启
+        :param cache: 响应缓存，默认根据 HTTP_CACHE_ENABLED 决定是否开启
         """
         self.base_url = base_url.rstrip('/')
+        self.capture = capture if capture is not None else get_capture_store()
+        self.cache = cache if cache is not None else get_response_cache()
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
         self.session = requests.Session()
         self.session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         })
+        # 收集与分析可能在不同线程中共用同一客户端，放大连接池以复用连接
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _capture_response(self, route: str, response: requests.Response) -> None:
+        """
+        将原始响应写入采集存储，采集失败不影响正常流程
+        
+        :param route: 路由路径
+        :param response: 原始响应
+        """
+        if self.capture is None:
+            return
+        try:
+            self.capture.append(route, response.content, status=response.status_code)
+        except Exception as e:
+            logger.warning(f"原始响应采集失败，路径: {route}, 错误: {e}")
+
+    def _download(self, route: str) -> Dict[str, Any]:
+        """
+        从上游请求接口数据，成功时写入缓存
+        
+        :param route: 路由路径
+        :return: 解析后的响应数据
+        """
+        with span("fetch", category=route):
+            response = self.session.get(f"{self.base_url}{route}")
+        self._capture_response(route, response)
+        response.raise_for_status()
+        with span("parse", category=route):
+            data = loads(response.content)
+        if self.cache is not None and data.get("code") == 200:
+            self.cache.put(route, response.content)
+        return data
 
-    def get_all_categories(self) -> List[Dict[str, str]]:
+    def _revalidate_in_background(self, route: str) -> None:
+        """
+        后台刷新已过期的缓存，同一路由同时只有一个刷新
+        """
+        with self._revalidate_lock:
+            if route in self._revalidating:
+                return
+            self._revalidating.add(route)
+
+        def _run():
+            try:
+                self._download(route)
+            except Exception as e:
+                logger.warning(f"后台刷新缓存失败，路径: {route}, 错误: {e}")
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(route)
+
+        threading.Thread(target=_run, name=f"revalidate{route}", daemon=True).start()
+
+    def _fetch_json(self, route: str, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        读穿缓存获取接口数据：未过期直接返回缓存；过期但在旧数据窗口内先返回旧数据并后台刷新
+        
+        :param route: 路由路径
+        :param force_refresh: 是否跳过缓存直接请求上游
+        :return: 解析后的响应数据
+        """
+        if self.cache is not None and not force_refresh:
+            cached = self.cache.get(route)
+            if cached is not None:
+                body, freshness = cached
+                if freshness == ResponseCache.STALE:
+                    self._revalidate_in_background(route)
+                with span("parse", category=route):
+                    return loads(body)
+        return self._download(route)
+
+    def get_all_categories(self, force_refresh: bool = False) -> List[Dict[str, str]]:
         """
         获取所有可用的热点类目
         
+        :param force_refresh: 是否跳过缓存直接请求上游
         :return: 包含类目名称和路径的列表
         """
         try:
-            response = self.session.get(f"{self.base_url}/all")
-            response.raise_for_status()
-            data = response.json()
+            data = self._fetch_json("/all", force_refresh)
 
             if data.get("code") == 200:
-                return data.get("routes", [])
+                return parse_categories(data)
             else:
                 logger.error(f"获取类目列表失败，错误码: {data.get('code')}")
                 return []
@@ -44,11 +129,12 @@ class DailyHotClient:
             logger.error(f"获取类目列表时发生错误: {e}")
             return []
 
-    def get_hot_list(self, path: str) -> Optional[Dict[str, Any]]:
+    def get_hot_list(self, path: str, force_refresh: bool = False) -> Optional[Dict[str, Any]]:
         """
         根据路径获取当前类目下的热点列表
         
         :param path: 类目的路径（例如: "/36kr"）
+        :param force_refresh: 是否跳过缓存直接请求上游
         :return: 热点列表数据
         """
         try:
@@ -56,9 +142,7 @@ class DailyHotClient:
             if not path.startswith('/'):
                 path = '/' + path
 
-            response = self.session.get(f"{self.base_url}{path}")
-            response.raise_for_status()
-            data = response.json()
+            data = self._fetch_json(path, force_refresh)
 
             if data.get("code") == 200:
                 return data
@@ -69,28 +153,59 @@ class DailyHotClient:
             logger.error(f"获取热点列表时发生错误，路径: {path}, 错误: {e}")
             return None
 
-    def get_all_hot_lists(self) -> Dict[str, Any]:
+    def get_route_payload(self, path: str, force_refresh: bool = False) -> Optional[RoutePayload]:
         """
-        获取所有类目的热点列表
+        获取并校验一个类目的热点列表
         
-        :return: 所有类目的热点数据
+        :param path: 类目的路径（例如: "/36kr"）
+        :param force_refresh: 是否跳过缓存直接请求上游
+        :return: 校验后的榜单数据，获取失败或结构不正确时为 None
         """
-        categories = self.get_all_categories()
-        all_hot_data = {}
+        data = self.get_hot_list(path, force_refresh)
+        if data is None:
+            return None
+        try:
+            with span("parse", category=path):
+                return parse_route_payload(data, path if path.startswith('/') else '/' + path)
+        except PayloadError as e:
+            logger.error(f"热点列表格式不正确: {e}")
+            return None
+
+    def iter_hot_lists(self, categories: Optional[List[Dict[str, str]]] = None) -> Iterator[Tuple[str, RoutePayload]]:
+        """
+        逐个类目获取热点列表，每次只在内存中保留一个类目的数据
+        
+        :param categories: 类目列表，为 None 时从 /all 获取
+        :return: (类目名称, 校验后的榜单数据) 迭代器
+        """
+        if categories is None:
+            categories = self.get_all_categories()
 
         for category in categories:
             path = category.get('path')
             name = category.get('name')
 
             logger.info(f"正在获取 {name} 的热点数据...")
-            hot_data = self.get_hot_list(path)
+            payload = self.get_route_payload(path)
 
-            if hot_data:
-                all_hot_data[name] = hot_data
+            if payload is not None:
+                yield name, payload
             else:
                 logger.warning(f"未能获取到 {name} 的热点数据")
 
-        return all_hot_data
+    def get_all_hot_lists(self) -> Dict[str, Any]:
+        """
+        获取所有类目的热点列表
+        
+        :return: 所有类目的热点数据
+        """
+        return dict(self.iter_hot_lists())
+
+    def close(self) -> None:
+        """
+        关闭底层 HTTP 连接池
+        """
+        self.session.close()
 
     def analyze_hot_item(self, url: str) -> Optional[Dict[str, Any]]:
         """
@@ -109,7 +224,7 @@ class DailyHotClient:
             payload = {"url": url}
             headers = {"Content-Type": "application/json"}
 
-            response = requests.post(api_url, json=payload, headers=headers, timeout=60)
+            response = self.session.post(api_url, json=payload, headers=headers, timeout=60)
             response.raise_for_status()
 
             # 解析API响应
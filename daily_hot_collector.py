@@ -1,262 +1,431 @@
+import threading
+from datetime import datetime
 from time import sleep
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from loguru import logger
+
+import config
+from analysis_priority import prioritize_pending
+from analysis_queue import enqueue_tasks, lease_tasks, complete_task, fail_task, reclaim_expired_leases, \
+    prune_done_tasks, queue_stats, release_tasks, release_owner_leases, worker_id, QUARANTINED
+from daily_hot_client import DailyHotClient
+from database import session_scope, get_pool_stats, ensure_schema_once
+from models import DailyHot
+from payload_schema import HotEntry, RoutePayload, parse_entries
+from pipeline_runs import begin_stage
+from profiling import span
+from route_frequency import RouteFrequencyTracker, get_tracker
+from tag_index import get_tag_index
+
 
+def rank_board(entries: List[HotEntry]) -> List[Tuple[Optional[int], Optional[float]]]:
+    """
+    计算榜单中每条数据的分类内排名与归一化热度
+
+    只有 hot_score 与 publish_time 都存在的数据（即可能进入摘要的数据）参与排名；
+    同热度并列同名次，归一化热度 = (n - 排名 + 1) / n，排名第一为 1。
 
-# 修改后的 save_hot_item_to_db 函数
-def save_hot_item_to_db(category: str, item: Dict[str, Any]) -> bool:
+    :param entries: 一个分类的当前榜单
+    :return: 与 entries 一一对应的 (排名, 归一化热度)，不参与排名的为 (None, None)
+    """
+    ranked = [i for i, e in enumerate(entries) if e.hot_score is not None and e.publish_time is not None]
+    ranked.sort(key=lambda i: entries[i].hot_score, reverse=True)
+    n = len(ranked)
+    result: List[Tuple[Optional[int], Optional[float]]] = [(None, None)] * len(entries)
+    rank = 0
+    for position, i in enumerate(ranked):
+        if position == 0 or entries[i].hot_score != entries[ranked[position - 1]].hot_score:
+            rank = position + 1
+        result[i] = (rank, (n - rank + 1) / n)
+    return result
+
+
+def save_hot_item_to_db(category: str, entry: Union[HotEntry, Dict[str, Any]],
+                        rank: Optional[int] = None, percentile: Optional[float] = None) -> bool:
     """
     将单个热点数据保存到数据库
 
     :param category: 热点分类
-    :param item: 热点数据项
+    :param entry: 校验后的热点数据项（原始 dict 会先经过 parse_entries 校验）
+    :param rank: 分类内排名，见 rank_board
+    :param percentile: 分类内归一化热度
     :return: 是否保存成功
     """
-    session: Session = SessionLocal()
+    if isinstance(entry, dict):
+        entries, _ = parse_entries([entry])
+        if not entries:
+            logger.warning(f"热点数据不符合格式，已忽略: {category} - {entry.get('title')}")
+            return False
+        entry = entries[0]
+
     try:
-        # 检查是否已存在
-        existing_item = session.query(DailyHot).filter(
-            DailyHot.category == category,
-            DailyHot.title == item.get('title')
-        ).first()
-
-        # 处理时间戳
-        publish_time = None
-        if 'timestamp' in item and item['timestamp']:
-            try:
-                # 处理毫秒时间戳
-                timestamp = int(item['timestamp'])
-                # 检查时间戳是否合理 (1970-01-01 到 2100-12-31)
-                if 0 <= timestamp <= 4102444800000:  # 2100年底的毫秒时间戳
-                    if timestamp > 1000000000000:  # 毫秒时间戳
-                        publish_time = datetime.fromtimestamp(timestamp / 1000)
-                    else:  # 秒时间戳
-                        publish_time = datetime.fromtimestamp(timestamp)
-                else:
-                    logger.warning(f"时间戳超出合理范围，将忽略: {timestamp}")
-            except (ValueError, OSError, OverflowError) as e:
-                logger.warning(f"时间戳转换失败，将忽略时间信息: {item.get('timestamp')}, 错误: {e}")
-
-        if existing_item:
-            # 更新现有记录
-            existing_item.description = item.get('desc')
-            existing_item.cover = item.get('cover')
-            existing_item.hot_score = item.get('hot')
-            existing_item.url = item.get('url')
-            existing_item.mobile_url = item.get('mobileUrl')
-            existing_item.publish_time = publish_time
-            existing_item.collected_at = datetime.now()
-        else:
-            # 创建新记录
-            hot_item = DailyHot(
-                category=category,
-                title=item.get('title'),
-                description=item.get('desc'),
-                cover=item.get('cover'),
-                hot_score=item.get('hot'),
-                url=item.get('url'),
-                mobile_url=item.get('mobileUrl'),
-                publish_time=publish_time,
-                collected_at=datetime.now()
-            )
-            session.add(hot_item)
-
-        session.commit()
-        logger.info(f"热点数据已保存到数据库: {category} - {item.get('title')}")
+        with span("upsert", category=category, item_id=entry.source_id), session_scope() as session:
+            # 检查是否已存在
+            existing_item = session.query(DailyHot).filter(
+                DailyHot.category == category,
+                DailyHot.title == entry.title
+            ).first()
+
+            if existing_item:
+                # 更新现有记录
+                existing_item.description = entry.description
+                existing_item.cover = entry.cover
+                existing_item.hot_score = entry.hot_score
+                existing_item.url = entry.url
+                existing_item.mobile_url = entry.mobile_url
+                existing_item.publish_time = entry.publish_time
+                existing_item.category_rank = rank
+                existing_item.hot_percentile = percentile
+                existing_item.collected_at = datetime.now()
+            else:
+                # 创建新记录
+                hot_item = DailyHot(
+                    category=category,
+                    title=entry.title,
+                    description=entry.description,
+                    cover=entry.cover,
+                    hot_score=entry.hot_score,
+                    url=entry.url,
+                    mobile_url=entry.mobile_url,
+                    publish_time=entry.publish_time,
+                    category_rank=rank,
+                    hot_percentile=percentile,
+                    collected_at=datetime.now()
+                )
+                session.add(hot_item)
+
+        logger.info(f"热点数据已保存到数据库: {category} - {entry.title}")
         return True
     except Exception as e:
-        session.rollback()
-        logger.error(f"保存热点数据到数据库时出错: {category} - {item.get('title')}, 错误: {e}")
+        logger.error(f"保存热点数据到数据库时出错: {category} - {entry.title}, 错误: {e}")
         return False
-    finally:
-        session.close()
 
 
-def collect_daily_hot_data():
+def _should_stop(stop_event: Optional[threading.Event]) -> bool:
+    return stop_event is not None and stop_event.is_set()
+
+
+def _pause(seconds: float, stop_event: Optional[threading.Event]) -> None:
+    """
+    等待指定秒数，收到停止信号时立即返回
+    """
+    if stop_event is None:
+        sleep(seconds)
+    else:
+        stop_event.wait(seconds)
+
+
+def collect_daily_hot_data(client: Optional[DailyHotClient] = None,
+                           stop_event: Optional[threading.Event] = None, force: bool = False):
     """
     收集所有热点数据并保存到数据库
+
+    每完成一个类目记录一次断点，进程重启后只收集剩余类目；全部类目都已收集才标记当天完成，
+    当天已完成时直接跳过。
+
+    :param client: 复用的热点客户端，为 None 时新建
+    :param stop_event: 停止信号，设置后在当前类目处理完成后停止
+    :param force: 当天已完成时是否重新收集
     """
-    client = DailyHotClient()
+    run = begin_stage("collect", force=force)
+    if run is None:
+        return
+    client = client or DailyHotClient()
 
     # 获取所有类目
     categories = client.get_all_categories()
-    logger.info(f"获取到 {len(categories)} 个热点类目")
+    done = set(run.cursor.get("done", []))
+    remaining = [category for category in categories if category.get('path') not in done]
+    logger.info(f"获取到 {len(categories)} 个热点类目" + (f"，断点处已完成 {len(done)} 个" if done else ""))
+
+    # 逐个类目获取并处理热点数据，处理完即释放，内存占用不随类目数增长
+    for category_name, payload in client.iter_hot_lists(remaining):
+        save_hot_list_to_db(category_name, payload)
+        done.add(payload.route)
+        run.cursor["done"] = sorted(done)
+        run.add(categories=1, items=len(payload.entries), rejected=payload.rejected)
+        run.save()
+        if _should_stop(stop_event):
+            logger.warning("收到停止信号，停止收集剩余类目")
+            break
+
+    # 获取类目失败或有类目未能获取时不标记完成，重启或下次触发时重试剩余类目
+    missing = [category.get('path') for category in categories if category.get('path') not in done]
+    if categories and not missing:
+        run.finish()
+    else:
+        if not categories:
+            logger.warning("未获取到热点类目，数据收集未完成")
+        elif not _should_stop(stop_event):
+            logger.warning(f"数据收集未完成，{len(missing)} 个类目待重试")
+        run.save()
+
+    logger.info(f"数据收集阶段连接池状态: {get_pool_stats()}")
+
+
+def save_hot_list_to_db(category_name: str, payload: RoutePayload) -> None:
+    """
+    保存一个类目的热点列表
+
+    :param category_name: 类目名称
+    :param payload: get_route_payload 返回的数据
+    """
+    logger.info(f"正在处理 {category_name} 的热点数据...")
+    logger.info(f"{category_name} 共有 {len(payload.entries)} 条热点数据"
+                + (f"，{payload.rejected} 条格式不正确已丢弃" if payload.rejected else ""))
 
-    # 获取所有热点数据
-    all_hot_data = client.get_all_hot_lists()
+    # 保存每条热点数据，同时写入入库时计算好的分类内排名
+    board_started = datetime.now()
+    for entry, (rank, percentile) in zip(payload.entries, rank_board(payload.entries)):
+        save_hot_item_to_db(category_name, entry, rank, percentile)
 
-    # 处理每个类目的数据
-    for category_name, hot_data in all_hot_data.items():
-        logger.info(f"正在处理 {category_name} 的热点数据...")
+    # 已不在当前榜单上的数据清除排名，保证每个分类只有一份榜单的排名
+    try:
+        with session_scope() as session:
+            session.query(DailyHot).filter(
+                DailyHot.category == category_name,
+                DailyHot.category_rank.isnot(None),
+                DailyHot.collected_at < board_started,
+            ).update({DailyHot.category_rank: None, DailyHot.hot_percentile: None}, synchronize_session=False)
+    except Exception as e:
+        logger.error(f"清除 {category_name} 的过期排名时出错: {e}")
 
-        # 获取热点列表
-        hot_list = hot_data.get('data', [])
-        logger.info(f"{category_name} 共有 {len(hot_list)} 条热点数据")
 
-        # 保存每条热点数据
-        for item in hot_list:
-            save_hot_item_to_db(category_name, item)
+def collect_due_routes(tracker: Optional[RouteFrequencyTracker] = None, client: Optional[DailyHotClient] = None,
+                       stop_event: Optional[threading.Event] = None) -> int:
+    """
+    自适应采集：只采集已到期的路由，并根据榜单变化情况调整各路由的采集间隔
 
+    榜单无变化且当天已写过库时跳过写库；当天首次采集时即使无变化也写库，
+    以刷新 collected_at，保证当天的邮件能选到这些数据。写库后为本轮新收集的数据生成分析任务，
+    由分析重试轮询在摘要发送前处理。刷新类目列表（/all）同样计入请求预算。
 
-from typing import List
-from datetime import datetime
-from loguru import logger
-from sqlalchemy.orm import Session
+    :param tracker: 路由频率跟踪器，默认使用进程内共享实例
+    :param client: 复用的热点客户端，为 None 时新建
+    :param stop_event: 停止信号，设置后在当前路由处理完成后停止
+    :return: 本轮采集的路由数
+    """
+    tracker = tracker or get_tracker()
+    client = client or DailyHotClient()
+
+    if tracker.needs_route_refresh() and tracker.remaining_budget() > 0:
+        categories = client.get_all_categories()
+        tracker.record_request()
+        tracker.sync_routes(categories)
+
+    due = tracker.due_routes()
+    if not due:
+        return 0
+
+    tick_started = datetime.now()
+    today = tick_started.strftime('%Y-%m-%d')
+    collected = 0
+    saved = 0
+    for state in due:
+        if _should_stop(stop_event):
+            break
+        collected += 1
+        # 自适应采集本身决定了请求时机，跳过本地缓存
+        payload = client.get_route_payload(state.path, force_refresh=True)
+        changed = tracker.observe(state.path, payload)
+        if payload is None:
+            logger.warning(f"未能获取到 {state.name} 的热点数据")
+            continue
+
+        if changed or state.last_saved_day != today:
+            save_hot_list_to_db(state.name, payload)
+            tracker.mark_saved(state.path, today)
+            saved += 1
+        logger.info(f"{state.name} {'有' if changed else '无'}变化，下次采集间隔 {state.interval:.0f} 秒")
+
+    tracker.save()
+    if saved:
+        enqueue_collected_since(tick_started)
+    return collected
+
+
+def enqueue_collected_since(since: datetime, top_k_only: Optional[bool] = None) -> int:
+    """
+    为 since 之后收集的待分析数据生成分析任务（不影响其它已排队任务的优先级）
 
-from daily_hot_client import DailyHotClient
-from database import SessionLocal
-from models import DailyHot
+    :param since: 起始收集时间
+    :param top_k_only: 是否只为可能进入摘要的数据生成任务，默认 ANALYZE_TOP_K_ONLY
+    :return: 写入的任务数
+    """
+    try:
+        ensure_schema_once()
+        with session_scope() as session:
+            pending = prioritize_pending(session, top_k_only=top_k_only, collected_since=since)
+            enqueued = enqueue_tasks(session, pending, reset_dropped=False)
+    except Exception as e:
+        logger.warning(f"为新收集的数据生成分析任务失败，将在每日分析时补上: {e}")
+        return 0
+    if enqueued:
+        logger.info(f"为新收集的数据写入 {enqueued} 个分析任务")
+    return enqueued
 
 
-def analyze_daily_hot_data(batch_size: int = 100, max_fail: int = 2) -> None:
+def analyze_daily_hot_data(batch_size: int = 100, max_attempts: Optional[int] = None,
+                           top_k_only: Optional[bool] = None, enqueue: bool = True,
+                           client: Optional[DailyHotClient] = None,
+                           stop_event: Optional[threading.Event] = None, force: bool = False) -> int:
     """
     拉取"待分析"的热点数据，调用外部摘要器生成 {summary, tags}，并写回数据库。
 
     规则：
-    - 仅处理 last_summarized_at 为 NULL 且 url 非空的记录
-    - 分析成功：写入 ai_summary/ai_tags，设置 last_summarized_at=now，清理失败计数
-    - 分析失败：只增加 analysis_fail_count（不写 last_summarized_at），记录 last_error
-    - 当 analysis_fail_count >= max_fail 时跳过
-    - 每条记录独立提交，避免单条失败影响整批
+    - 仅处理 last_summarized_at 为 NULL 且 url 非空的记录，每条记录对应 analysis_task 中的一个任务
+    - 按对下一份摘要的预期价值排序（见 analysis_priority.prioritize_pending），
+      top_k_only 为 True 时不分析不在任何订阅者 Top-K 内的数据
+    - 分析成功：写入 ai_summary/ai_tags，设置 last_summarized_at=now，任务标记为 done
+    - 分析失败：不写 last_summarized_at，任务按指数退避重新排队（next_attempt_at），记录 last_error
+    - 尝试次数达到 max_attempts 的任务被隔离（quarantined），不再重试
+    - 每条记录独立提交，避免单条失败影响整批；多个进程可同时处理，任务不会重复领取
+    - 调用摘要器和等待期间不占用数据库连接
+    - enqueue 为 True 时（每日分析）记录断点：重启后不重新生成任务、立即归还上次进程领取未完成的任务，
+      计数跨重启累加；当天已完成时直接跳过
+
+    :param batch_size: 每处理多少条休息一次
+    :param max_attempts: 最大尝试次数，默认 ANALYSIS_MAX_ATTEMPTS
+    :param top_k_only: 是否只分析可能进入摘要的数据，默认 ANALYZE_TOP_K_ONLY
+    :param enqueue: 是否先为新数据创建任务；为 False 时只处理已到期的重试任务
+    :param client: 复用的热点客户端，为 None 时新建
+    :param stop_event: 停止信号，设置后处理完当前任务即停止，已领取未处理的任务归还队列
+    :param force: 当天已完成时是否重新执行每日分析
+    :return: 本次分析成功的条数
     """
-    session: Session = SessionLocal()
-    client = DailyHotClient()
+    client = client or DailyHotClient()
+    max_attempts = max_attempts or config.ANALYSIS_MAX_ATTEMPTS
+    if top_k_only is None:
+        top_k_only = config.ANALYZE_TOP_K_ONLY
 
     success_cnt = 0
     fail_cnt = 0
-    skip_no_url = 0
-    skip_maxfail = 0
-    skip_flagged = 0
+    retry_cnt = 0
+    quarantined_cnt = 0
     total_processed = 0
-    
+
+    run = None
     try:
-        # 先获取待处理数据的总数
-        total_count = (
-            session.query(DailyHot)
-            .filter(
-                DailyHot.last_summarized_at.is_(None),
-                DailyHot.url.isnot(None),
-                DailyHot.url != "",
-            )
-            .count()
-        )
-        
-        if total_count == 0:
-            logger.info("没有需要分析的热点数据")
-            return
-            
-        logger.info(f"总共找到 {total_count} 条需要分析的热点数据")
-        
-        # 计算总批次数
-        total_batches = (total_count + batch_size - 1) // batch_size
-        current_batch = 0
-        
-        # 分批处理所有数据
-        for offset in range(0, total_count, batch_size):
-            current_batch += 1
-            logger.info(f"开始处理第 {current_batch}/{total_batches} 批数据")
-            
-            # 获取当前批次的数据
-            hot_items: List[DailyHot] = (
-                session.query(DailyHot)
-                .filter(
-                    DailyHot.last_summarized_at.is_(None),
-                    DailyHot.url.isnot(None),
-                    DailyHot.url != "",
-                )
-                .order_by(DailyHot.collected_at.desc())
-                .offset(offset)
-                .limit(batch_size)
-                .all()
-            )
-
-            # 如果没有更多数据需要处理，则退出循环
-            if not hot_items:
+        ensure_schema_once()
+
+        if enqueue:
+            run = begin_stage("analyze", force=force)
+            if run is None:
+                return 0
+            if run.resumed and run.previous_owner == worker_id():
+                # 容器重启后领取者标识不变，上次进程领取未完成的任务可以立即归还，无需等租约过期
+                with session_scope() as session:
+                    released = release_owner_leases(session, run.previous_owner)
+                if released:
+                    logger.info(f"归还上次运行未完成的 {released} 个分析任务")
+
+        if run is not None and run.cursor.get("enqueued"):
+            logger.info("断点处任务已生成，跳过生成分析任务")
+        elif enqueue:
+            # 按对下一份摘要的预期价值排序，价值最高的先分析
+            with session_scope() as session:
+                pending = prioritize_pending(session, top_k_only=top_k_only)
+                enqueued = enqueue_tasks(session, pending)
+            logger.info(f"写入 {enqueued} 个分析任务")
+            run.cursor["enqueued"] = True
+            run.add(enqueued=enqueued)
+            run.save()
+
+        # top_k_only 模式下优先级为 0 的任务（不在任何订阅者 Top-K 内）不处理
+        min_priority = 0.0 if top_k_only else None
+
+        while not _should_stop(stop_event):
+            with session_scope() as session:
+                reclaim_expired_leases(session, max_attempts)
+                tasks = lease_tasks(session, config.ANALYSIS_LEASE_BATCH, min_priority=min_priority)
+
+            # 没有可执行的任务（其余任务在退避等待中），退出循环
+            if not tasks:
                 break
 
-            logger.info(f"第 {current_batch} 批: 找到 {len(hot_items)} 条需要分析的热点数据")
-
-            for item in hot_items:
+            for index, task in enumerate(tasks):
+                if _should_stop(stop_event):
+                    # 已领取但未处理的任务立即归还，不计入尝试次数
+                    with session_scope() as session:
+                        release_tasks(session, [t["task_id"] for t in tasks[index:]])
+                    logger.warning(f"收到停止信号，归还 {len(tasks) - index} 个未处理的分析任务")
+                    break
                 try:
-                    # extra 规范化
-                    if item.extra is None or not isinstance(item.extra, dict):
-                        item.extra = {}
+                    if not task["url"]:
+                        raise ValueError("missing_url")
 
-                    # 跳过"明确标记不分析"的
-                    if item.extra.get("skip") is True:
-                        skip_flagged += 1
-                        continue
-
-                    # 跳过无 URL 的（双保险，理论上上面的 filter 已经排除了）
-                    if not item.url:
-                        skip_no_url += 1
-                        # 记一次失败，防止反复进入队列
-                        item.extra["analysis_fail_count"] = item.extra.get("analysis_fail_count", 0) + 1
-                        item.extra["last_error"] = "missing_url"
-                        session.commit()
-                        continue
-
-                    # 失败次数上限
-                    if item.extra.get("analysis_fail_count", 0) >= max_fail:
-                        skip_maxfail += 1
-                        continue
-
-                    logger.info(f"分析中: {item.category} - {item.title}")
+                    logger.info(f"分析中: {task['category']} - {task['title']}（第 {task['attempts']} 次）")
                     # 调用外部分析器
-                    result = client.analyze_hot_item(item.url)
-                    logger.debug(f"分析结果: {result}", extra={"item_id": item.id})
+                    with span("summarize", category=task["category"], item_id=task["id"]):
+                        result = client.analyze_hot_item(task["url"])
+                    logger.debug(f"分析结果: {result}", extra={"item_id": task["id"]})
                     logger.debug(f"等待1秒...")
-                    sleep(1)
+                    _pause(1, stop_event)
                     if result and isinstance(result, dict) and "summary" in result and "tags" in result:
-                        item.ai_summary = result["summary"]
-                        item.ai_tags = result["tags"]
-                        item.last_summarized_at = datetime.now()
-
-                        # 清理失败痕迹
-                        item.extra.pop("analysis_fail_count", None)
-                        item.extra.pop("last_error", None)
-                        if not item.extra:
-                            item.extra = None
-
-                        session.commit()
+                        with session_scope() as session:
+                            complete_task(session, task["task_id"], task["id"], result)
                         success_cnt += 1
-                        logger.info(f"分析完成: {item.category} - {item.title}")
+                        logger.info(f"分析完成: {task['category']} - {task['title']}")
+                        continue
+                    error = "empty_result"
+                except Exception as e:
+                    logger.exception(f"分析失败（异常）: {task['category']} - {task['title']} | 错误: {e}")
+                    error = str(e)
+
+                # 失败分支：不写 last_summarized_at，按退避时间重新排队或隔离
+                fail_cnt += 1
+                try:
+                    with session_scope() as session:
+                        state = fail_task(session, task["task_id"], error, max_attempts)
+                    if state == QUARANTINED:
+                        quarantined_cnt += 1
+                        logger.error(f"分析失败已达上限，隔离: {task['category']} - {task['title']} | {error}")
                     else:
-                        # 失败分支：只累计失败，不写 last_summarized_at
-                        item.extra["analysis_fail_count"] = item.extra.get("analysis_fail_count", 0) + 1
-                        item.extra["last_error"] = "empty_result"
-                        session.commit()
-                        fail_cnt += 1
-                        logger.error(f"分析失败（空结果）: {item.category} - {item.title}")
+                        retry_cnt += 1
+                        logger.error(f"分析失败，稍后重试: {task['category']} - {task['title']} | {error}")
+                except Exception:
+                    logger.exception(f"记录分析失败信息时出错: {task['id']}")
 
-                except Exception as e:
-                    # 异常同样视为失败；不写 last_summarized_at
-                    try:
-                        if item.extra is None or not isinstance(item.extra, dict):
-                            item.extra = {}
-                        item.extra["analysis_fail_count"] = item.extra.get("analysis_fail_count", 0) + 1
-                        item.extra["last_error"] = str(e)
-                        session.commit()
-                    except Exception:
-                        session.rollback()
-                    fail_cnt += 1
-                    logger.exception(f"分析失败（异常）: {item.category} - {item.title} | 错误: {e}")
-                    
-            total_processed += len(hot_items)
-            logger.info(f"第 {current_batch} 批处理完成，已处理 {total_processed}/{total_count} 条数据")
-            logger.debug(f"等待5秒...")
-            sleep(5)
+            # 每批结束后增量更新标签索引，标签订阅无需扫描全部数据
+            try:
+                get_tag_index().refresh()
+            except Exception as e:
+                logger.warning(f"更新标签索引失败: {e}")
+
+            processed_before = total_processed
+            total_processed += len(tasks)
+            if run is not None:
+                run.record(processed=total_processed, success=success_cnt, failed=fail_cnt,
+                           retried=retry_cnt, quarantined=quarantined_cnt)
+                run.save()
+            if total_processed // batch_size > processed_before // batch_size:
+                logger.info(f"已处理 {total_processed} 条数据")
+                logger.debug(f"等待5秒...")
+                _pause(5, stop_event)
+
+        if enqueue:
+            # 只在每日分析时清理与统计，重试轮询只领取到期任务
+            with session_scope() as session:
+                pruned = prune_done_tasks(session)
+                stats = queue_stats(session)
+            logger.info(f"分析任务队列状态: {stats}" + (f"，清理 {pruned} 个已完成的任务" if pruned else ""))
+        if run is not None and not _should_stop(stop_event):
+            run.finish()
 
     except Exception as e:
         logger.exception(f"分析阶段顶层异常：{e}")
-    finally:
-        session.close()
 
+    if not enqueue and not total_processed:
+        # 重试轮询没有到期任务时不输出日志
+        return success_cnt
     logger.info(
         "分析完成汇总："
-        f"成功 {success_cnt} | 失败 {fail_cnt} | 跳过(无URL) {skip_no_url} | "
-        f"跳过(失败达上限≥{max_fail}) {skip_maxfail} | 跳过(标记skip) {skip_flagged} | "
+        f"成功 {success_cnt} | 失败 {fail_cnt}（待重试 {retry_cnt}，隔离 {quarantined_cnt}） | "
         f"总计处理 {total_processed}"
     )
+    logger.info(f"数据分析阶段连接池状态: {get_pool_stats()}")
+    return success_cnt
 
 
 def main():
@@ -1,34 +1,46 @@
+import functools
+import heapq
 import json
 import os
 import smtplib
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from email.header import Header
+from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Iterator, Tuple
 
 # 加载.env文件
 from jinja2 import Template
 from loguru import logger
-from sqlalchemy.orm import Session
 
 import config
-from database import SessionLocal
-from models import DailyHot
+from analysis_priority import items_per_category
+from database import session_scope
+from digest_budget import DigestBudget, UnitTimer, CACHED_SELECTION, NO_COVERS, NO_DESCRIPTIONS, LIGHT_TEMPLATE, \
+    NO_RETRY, RENDER_LADDER, SELECT_RESERVE, COVER_RESERVE, RENDER_RESERVE
+from models import DailyHot, HotItem
+from profiling import span
+from tag_index import get_tag_index
 
+# 流式读取时每次从数据库拉取的行数
+STREAM_BATCH_SIZE = 200
 
-def get_top_hot_items(categories: List[str] = None, today_only: bool = False) -> list:
+
+def iter_top_hot_items(categories: List[str] = None, today_only: bool = False,
+                       limit: Optional[int] = None) -> Iterator[HotItem]:
     """
-    获取已经总结过的、hot score分数最多的、最新的热点内容
+    按热度逐条产出已经总结过的热点内容，只查询展示需要的列
 
     :param categories: 筛选的分类列表，如果为None则不筛选
     :param today_only: 是否只获取今天收集的数据，默认为False
-    :return: 热点数据列表
+    :param limit: 最多返回的条数，为None时不限制
+    :return: HotItem 迭代器
     """
-    session: Session = SessionLocal()
-    try:
+    with session_scope() as session:
         # 构建查询
-        query = session.query(DailyHot).filter(
+        query = session.query(*HotItem.COLUMNS).filter(
             DailyHot.ai_summary.isnot(None),
             DailyHot.ai_tags.isnot(None),
             DailyHot.hot_score.isnot(None),
@@ -39,232 +51,306 @@ def get_top_hot_items(categories: List[str] = None, today_only: bool = False) ->
         if categories:
             query = query.filter(DailyHot.category.in_(categories))
 
-        # 如果设置了today_only=True，则只获取今天收集的数据
+        # 如果设置了today_only=True，则只获取今天收集、仍在当前榜单上的数据，
+        # 按入库时计算的分类内归一化热度排序，避免热度量级大的平台挤占其它分类
         if today_only:
             today = datetime.now().date()
-            query = query.filter(DailyHot.collected_at >= today)
-
-        # 查询已经总结过的热点数据（有ai_summary和ai_tags），按hot_score和publish_time排序
-        hot_items = query.order_by(
-            DailyHot.hot_score.desc(),  # 按hot_score降序排列
-            DailyHot.publish_time.desc()  # 按发布时间降序排列
-        ).all()
-
-        # 转换为字典列表以便处理
-        result = []
-        for item in hot_items:
-            result.append({
-                'id': item.id,
-                'category': item.category,
-                'title': item.title,
-                'description': item.description,
-                'cover': item.cover,
-                'hot_score': item.hot_score,
-                'url': item.url,
-                'mobile_url': item.mobile_url,
-                'publish_time': item.publish_time.strftime('%Y-%m-%d %H:%M:%S') if item.publish_time else None,
-                'ai_summary': item.ai_summary,
-                'ai_tags': item.ai_tags,
-                'collected_at': item.collected_at.strftime('%Y-%m-%d %H:%M:%S') if item.collected_at else None
-            })
+            query = query.filter(DailyHot.collected_at >= today, DailyHot.category_rank.isnot(None))
+            query = query.order_by(
+                DailyHot.hot_percentile.desc(),
+                DailyHot.category_rank,
+                DailyHot.publish_time.desc()
+            )
+        else:
+            # 查询已经总结过的热点数据（有ai_summary和ai_tags），按hot_score和publish_time排序
+            query = query.order_by(
+                DailyHot.hot_score.desc(),  # 按hot_score降序排列
+                DailyHot.publish_time.desc()  # 按发布时间降序排列
+            )
+        if limit is not None:
+            query = query.limit(limit)
+
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            yield HotItem.from_row(row)
+
 
+def get_top_hot_items(categories: List[str] = None, today_only: bool = False,
+                      limit: Optional[int] = None) -> List[HotItem]:
+    """
+    获取已经总结过的、hot score分数最多的、最新的热点内容
+
+    :param categories: 筛选的分类列表，如果为None则不筛选
+    :param today_only: 是否只获取今天收集的数据，默认为False
+    :param limit: 最多返回的条数，为None时不限制
+    :return: 热点数据列表
+    """
+    try:
+        result = list(iter_top_hot_items(categories, today_only, limit))
         logger.info(f"获取到 {len(result)} 条热点数据")
         return result
     except Exception as e:
         logger.error(f"获取热点数据时出错: {e}")
         return []
-    finally:
-        session.close()
 
 
-def generate_html_content(hot_items: list) -> str:
+def get_category_top_items(category: str, limit: int) -> List[HotItem]:
     """
-    生成HTML格式的邮件内容
+    按入库时预计算的排名获取单个分类今天的前 limit 条已总结热点
+    （走 (category, category_rank) 索引的范围扫描，结果已按排名排好序）
 
-    :param hot_items: 热点数据列表
-    :return: HTML内容
+    :param category: 分类
+    :param limit: 最多返回的条数
+    :return: 热点数据列表
     """
-    html_template = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>每日热点摘要</title>
-        <style>
-            body {
-                font-family: Arial, sans-serif;
-                margin: 0;
-                padding: 20px;
-                background-color: #f5f5f5;
-            }
-            .container {
-                max-width: 800px;
-                margin: 0 auto;
-                background-color: white;
-                border-radius: 8px;
-                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                padding: 30px;
-            }
-            .header {
-                text-align: center;
-                border-bottom: 2px solid #eee;
-                padding-bottom: 20px;
-                margin-bottom: 30px;
-            }
-            .header h1 {
-                color: #333;
-                margin: 0;
-            }
-            .header p {
-                color: #666;
-                margin: 5px 0 0 0;
-            }
-            .hot-item {
-                border-bottom: 1px solid #eee;
-                padding: 20px 0;
-            }
-            .hot-item:last-child {
-                border-bottom: none;
-            }
-            .item-header {
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                margin-bottom: 10px;
-            }
-            .item-title {
-                font-size: 18px;
-                font-weight: bold;
-                color: #333;
-                margin: 0;
-            }
-            .hot-score {
-                background-color: #ff6b35;
-                color: white;
-                padding: 3px 8px;
-                border-radius: 12px;
-                font-size: 14px;
-                font-weight: bold;
-            }
-            .item-category {
-                color: #ff6b35;
-                font-weight: bold;
-                font-size: 14px;
-                margin: 5px 0;
-            }
-            .item-description {
-                color: #666;
-                line-height: 1.5;
-                margin: 10px 0;
-            }
-            .item-summary {
-                background-color: #f8f9fa;
-                border-left: 4px solid #ff6b35;
-                padding: 15px;
-                margin: 15px 0;
-                border-radius: 0 4px 4px 0;
-            }
-            .item-summary p {
-                margin: 0;
-                color: #444;
-                line-height: 1.6;
-            }
-            .item-tags {
-                margin: 15px 0;
-            }
-            .tag {
-                display: inline-block;
-                background-color: #e9ecef;
-                color: #495057;
-                padding: 4px 10px;
-                border-radius: 15px;
-                font-size: 12px;
-                margin-right: 8px;
-                margin-bottom: 8px;
-            }
-            .item-link {
-                margin-top: 10px;
-            }
-            .item-link a {
-                color: #007bff;
-                text-decoration: none;
-                font-weight: bold;
-            }
-            .item-link a:hover {
-                text-decoration: underline;
-            }
-            .item-time {
-                color: #999;
-                font-size: 12px;
-                margin-top: 5px;
-            }
-            .footer {
-                text-align: center;
-                margin-top: 30px;
-                padding-top: 20px;
-                border-top: 1px solid #eee;
-                color: #999;
-                font-size: 12px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🔥 每日热点摘要</h1>
-                <p>为您精选的最新、最热内容</p>
-                <p>{{ date }}</p>
+    try:
+        with session_scope() as session:
+            rows = session.query(*HotItem.COLUMNS).filter(
+                DailyHot.category == category,
+                DailyHot.category_rank.isnot(None),
+                DailyHot.collected_at >= datetime.now().date(),
+                DailyHot.ai_summary.isnot(None),
+                DailyHot.ai_tags.isnot(None),
+            ).order_by(
+                DailyHot.category_rank,
+                DailyHot.publish_time.desc()
+            ).limit(limit).all()
+        return [HotItem.from_row(row) for row in rows]
+    except Exception as e:
+        logger.error(f"获取 {category} 的热点数据时出错: {e}")
+        return []
+
+
+HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>每日热点摘要</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }
+        .container {
+            max-width: 800px;
+            margin: 0 auto;
+            background-color: white;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            padding: 30px;
+        }
+        .header {
+            text-align: center;
+            border-bottom: 2px solid #eee;
+            padding-bottom: 20px;
+            margin-bottom: 30px;
+        }
+        .header h1 {
+            color: #333;
+            margin: 0;
+        }
+        .header p {
+            color: #666;
+            margin: 5px 0 0 0;
+        }
+        .hot-item {
+            border-bottom: 1px solid #eee;
+            padding: 20px 0;
+            overflow: hidden;
+        }
+        .item-cover {
+            float: right;
+            max-width: 120px;
+            max-height: 120px;
+            margin: 0 0 10px 15px;
+            border-radius: 4px;
+        }
+        .hot-item:last-child {
+            border-bottom: none;
+        }
+        .item-header {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            margin-bottom: 10px;
+        }
+        .item-title {
+            font-size: 18px;
+            font-weight: bold;
+            color: #333;
+            margin: 0;
+        }
+        .hot-score {
+            background-color: #ff6b35;
+            color: white;
+            padding: 3px 8px;
+            border-radius: 12px;
+            font-size: 14px;
+            font-weight: bold;
+        }
+        .item-category {
+            color: #ff6b35;
+            font-weight: bold;
+            font-size: 14px;
+            margin: 5px 0;
+        }
+        .item-description {
+            color: #666;
+            line-height: 1.5;
+            margin: 10px 0;
+        }
+        .item-summary {
+            background-color: #f8f9fa;
+            border-left: 4px solid #ff6b35;
+            padding: 15px;
+            margin: 15px 0;
+            border-radius: 0 4px 4px 0;
+        }
+        .item-summary p {
+            margin: 0;
+            color: #444;
+            line-height: 1.6;
+        }
+        .item-tags {
+            margin: 15px 0;
+        }
+        .tag {
+            display: inline-block;
+            background-color: #e9ecef;
+            color: #495057;
+            padding: 4px 10px;
+            border-radius: 15px;
+            font-size: 12px;
+            margin-right: 8px;
+            margin-bottom: 8px;
+        }
+        .item-link {
+            margin-top: 10px;
+        }
+        .item-link a {
+            color: #007bff;
+            text-decoration: none;
+            font-weight: bold;
+        }
+        .item-link a:hover {
+            text-decoration: underline;
+        }
+        .item-time {
+            color: #999;
+            font-size: 12px;
+            margin-top: 5px;
+        }
+        .footer {
+            text-align: center;
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #eee;
+            color: #999;
+            font-size: 12px;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🔥 每日热点摘要</h1>
+            <p>为您精选的最新、最热内容</p>
+            <p>{{ date }}</p>
+        </div>
+
+        {% for item in hot_items %}
+        <div class="hot-item">
+            <div class="item-header">
+                <h2 class="item-title">{{ item.title }}</h2>
+                <div class="hot-score">{{ item.hot_score }}</div>
+            </div>
+
+            {% if cover_src and item.cover_key %}
+            <img class="item-cover" src="{{ cover_src(item.cover_key) }}" alt="" width="120">
+            {% endif %}
+
+            <div class="item-category">{{ item.category }}</div>
+
+            {% if show_descriptions and item.description %}
+            <div class="item-description">{{ item.description }}</div>
+            {% endif %}
+
+            {% if show_descriptions and item.ai_summary %}
+            <div class="item-summary">
+                <p>{{ item.ai_summary }}</p>
+            </div>
+            {% endif %}
+
+            {% if item.ai_tags %}
+            <div class="item-tags">
+                {% for tag in item.ai_tags %}
+                <span class="tag">{{ tag }}</span>
+                {% endfor %}
             </div>
+            {% endif %}
 
-            {% for item in hot_items %}
-            <div class="hot-item">
-                <div class="item-header">
-                    <h2 class="item-title">{{ item.title }}</h2>
-                    <div class="hot-score">{{ item.hot_score }}</div>
-                </div>
-
-                <div class="item-category">{{ item.category }}</div>
-
-                {% if item.description %}
-                <div class="item-description">{{ item.description }}</div>
-                {% endif %}
-
-                {% if item.ai_summary %}
-                <div class="item-summary">
-                    <p>{{ item.ai_summary }}</p>
-                </div>
-                {% endif %}
-
-                {% if item.ai_tags %}
-                <div class="item-tags">
-                    {% for tag in item.ai_tags %}
-                    <span class="tag">{{ tag }}</span>
-                    {% endfor %}
-                </div>
-                {% endif %}
-
-                <div class="item-link">
-                    <a href="{{ item.url }}" target="_blank">查看全文 →</a>
-                </div>
-
-                <div class="item-time">
-                    发布时间: {{ item.publish_time }} | 收集时间: {{ item.collected_at }}
-                </div>
+            <div class="item-link">
+                <a href="{{ item.url }}" target="_blank">查看全文 →</a>
             </div>
-            {% endfor %}
 
-            <div class="footer">
-                <p>此邮件由 Alfred 系统自动生成</p>
-                <p>© {{ year }} Alfred - 个人AI数据处理系统</p>
+            <div class="item-time">
+                发布时间: {{ item.publish_time }} | 收集时间: {{ item.collected_at }}
             </div>
         </div>
-    </body>
-    </html>
+        {% endfor %}
+
+        <div class="footer">
+            <p>此邮件由 Alfred 系统自动生成</p>
+            <p>© {{ year }} Alfred - 个人AI数据处理系统</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+# 精简模板：只有标题与链接，用于时间预算紧张时（见 digest_budget）
+LIGHT_HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>每日热点摘要</title>
+</head>
+<body>
+    <h2>🔥 每日热点摘要 {{ date }}</h2>
+    <ol>
+        {% for item in hot_items %}
+        <li><a href="{{ item.url }}">{{ item.title }}</a>（{{ item.category }}）</li>
+        {% endfor %}
+    </ol>
+    <p style="color: #999; font-size: 12px;">此邮件由 Alfred 系统自动生成</p>
+</body>
+</html>
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_template(light: bool) -> Template:
+    return Template(LIGHT_HTML_TEMPLATE if light else HTML_TEMPLATE)
+
+
+def generate_html_content(hot_items: list, cover_src: Optional[Callable[[str], str]] = None,
+                          show_descriptions: bool = True, light: bool = False) -> str:
     """
+    生成HTML格式的邮件内容
 
-    template = Template(html_template)
-    html_content = template.render(
+    :param hot_items: 热点数据列表
+    :param cover_src: 由封面缓存 key 生成图片地址的函数（邮件中为 cid:，网页中为 /covers/），为 None 时不显示封面
+    :param show_descriptions: 是否显示描述与 AI 摘要
+    :param light: 是否使用精简模板（只有标题与链接）
+    :return: HTML内容
+    """
+    html_content = _compiled_template(light).render(
         hot_items=hot_items,
+        cover_src=cover_src,
+        show_descriptions=show_descriptions,
         date=datetime.now().strftime('%Y年%m月%d日'),
         year=datetime.now().year
     )
@@ -272,19 +358,95 @@ def generate_html_content(hot_items: list) -> str:
     return html_content
 
 
-def send_email(subject: str, html_content: str, recipients: list):
+class SmtpClient:
+    """
+    可复用的 SMTP 客户端：首次发送时建立连接，之后的邮件复用同一连接，
+    连接被服务器断开时自动重连一次。用完调用 close()（或使用 with 语句）。
+    """
+
+    def __init__(self, smtp_server: Optional[str] = None, smtp_port: Optional[int] = None,
+                 sender_email: Optional[str] = None, sender_password: Optional[str] = None):
+        # 从环境变量获取邮件配置
+        self.smtp_server = smtp_server or config.SMTP_SERVER
+        self.smtp_port = smtp_port or config.SMTP_PORT
+        self.sender_email = sender_email or config.SENDER_EMAIL
+        self.sender_password = sender_password or config.SENDER_PASSWORD
+        self._server: Optional[smtplib.SMTP] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+        server.starttls()
+        server.login(self.sender_email, self.sender_password)
+        return server
+
+    def sendmail(self, recipients: list, message: str) -> None:
+        with self._lock:
+            if self._server is None:
+                self._server = self._connect()
+            try:
+                self._server.sendmail(self.sender_email, recipients, message)
+            except smtplib.SMTPServerDisconnected:
+                self._server = self._connect()
+                self._server.sendmail(self.sender_email, recipients, message)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except Exception:
+                    pass
+                self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def build_message(subject: str, html_content: str, recipients: list, sender_email: str,
+                  images: Optional[Dict[str, bytes]] = None) -> MIMEMultipart:
+    """
+    构造摘要邮件（SMTP 发送与 mbox 文件输出共用）
+
+    :param subject: 邮件主题
+    :param html_content: HTML内容
+    :param recipients: 收件人列表
+    :param sender_email: 发件人
+    :param images: 内嵌图片 {Content-ID: 图片内容}，HTML 中以 cid:Content-ID 引用
+    :return: 邮件对象
+    """
+    message = MIMEMultipart('related') if images else MIMEMultipart()
+    message['From'] = Header(f"Alfred系统<{sender_email}>", 'utf-8')
+    message['To'] = Header(', '.join(recipients), 'utf-8')
+    message['Subject'] = Header(subject, 'utf-8')
+
+    # 添加HTML内容
+    message.attach(MIMEText(html_content, 'html', 'utf-8'))
+    for cid, data in (images or {}).items():
+        ext = cid.rsplit('.', 1)[-1]
+        image = MIMEImage(data, _subtype='jpeg' if ext == 'jpg' else ext)
+        image.add_header('Content-ID', f'<{cid}>')
+        image.add_header('Content-Disposition', 'inline', filename=cid)
+        message.attach(image)
+    return message
+
+
+def send_email(subject: str, html_content: str, recipients: list, smtp: Optional[SmtpClient] = None,
+               images: Optional[Dict[str, bytes]] = None):
     """
     发送邮件
 
     :param subject: 邮件主题
     :param html_content: HTML内容
     :param recipients: 收件人列表
+    :param smtp: 复用的 SMTP 客户端，为 None 时单独建立一次连接
+    :param images: 内嵌图片 {Content-ID: 图片内容}，HTML 中以 cid:Content-ID 引用
     """
-    # 从环境变量获取邮件配置
-    smtp_server = config.SMTP_SERVER
-    smtp_port = config.SMTP_PORT
-    sender_email = config.SENDER_EMAIL
-    sender_password = config.SENDER_PASSWORD
+    sender_email = smtp.sender_email if smtp else config.SENDER_EMAIL
+    sender_password = smtp.sender_password if smtp else config.SENDER_PASSWORD
 
     if not sender_email or not sender_password:
         logger.error("请在环境变量中设置SENDER_EMAIL和SENDER_PASSWORD")
@@ -292,20 +454,14 @@ def send_email(subject: str, html_content: str, recipients: list):
 
     try:
         # 创建邮件对象
-        message = MIMEMultipart()
-        message['From'] = Header(f"Alfred系统<{sender_email}>", 'utf-8')
-        message['To'] = Header(', '.join(recipients), 'utf-8')
-        message['Subject'] = Header(subject, 'utf-8')
-
-        # 添加HTML内容
-        message.attach(MIMEText(html_content, 'html', 'utf-8'))
+        message = build_message(subject, html_content, recipients, sender_email, images)
 
         # 连接SMTP服务器并发送邮件
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, recipients, message.as_string())
-        server.quit()
+        if smtp is not None:
+            smtp.sendmail(recipients, message.as_string())
+        else:
+            with SmtpClient() as client:
+                client.sendmail(recipients, message.as_string())
 
         logger.info(f"邮件发送成功，收件人: {recipients}")
         return True
@@ -314,12 +470,16 @@ def send_email(subject: str, html_content: str, recipients: list):
         return False
 
 
-def parse_recipient_subscriptions(config_path: str = "recipients.json") -> Dict[str, List[str]]:
+def parse_recipient_subscriptions(config_path: str = "recipients.json",
+                                  field: str = "categories") -> Dict[str, List[str]]:
     """
     从 JSON 文件解析收件人订阅配置
 
+    每个收件人的值可以是分类列表（原有格式），也可以是 {"categories": [...], "tags": [...]}
+
     :param config_path: JSON 配置文件路径
-    :return: {邮箱: [分类1, 分类2, ...]}
+    :param field: 解析的订阅类型，"categories" 或 "tags"
+    :return: {邮箱: [分类1, 分类2, ...]}（field 为 "tags" 时为标签列表）
     """
     if not os.path.exists(config_path):
         logger.error(f"收件人配置文件 {config_path} 不存在")
@@ -334,15 +494,20 @@ def parse_recipient_subscriptions(config_path: str = "recipients.json") -> Dict[
 
         # 清理数据
         subscriptions = {}
-        for email, categories in data.items():
-            if not isinstance(categories, list):
-                logger.warning(f"邮箱 {email} 的分类不是列表，已跳过")
+        for email, value in data.items():
+            if isinstance(value, dict):
+                values = value.get(field, [])
+            else:
+                # 原有格式只有分类
+                values = value if field == "categories" else []
+            if not isinstance(values, list):
+                logger.warning(f"邮箱 {email} 的 {field} 不是列表，已跳过")
                 continue
-            cleaned = [cat.strip() for cat in categories if isinstance(cat, str) and cat.strip()]
+            cleaned = [v.strip() for v in values if isinstance(v, str) and v.strip()]
             if cleaned:
                 subscriptions[email] = cleaned
 
-        logger.info(f"解析到 {len(subscriptions)} 个收件人订阅配置")
+        logger.info(f"解析到 {len(subscriptions)} 个收件人订阅配置（{field}）")
         return subscriptions
 
     except json.JSONDecodeError as e:
@@ -350,68 +515,278 @@ def parse_recipient_subscriptions(config_path: str = "recipients.json") -> Dict[
         return {}
 
 
-def get_user_hot_items(email: str, user_categories: List[str]) -> list:
+def get_user_hot_items(email: str, user_categories: List[str], user_tags: Optional[List[str]] = None) -> list:
     """
-    根据用户订阅的分类获取热点内容，确保热点在各分类间均匀分布
+    根据用户订阅的分类和标签获取热点内容，确保热点在各分类间均匀分布
     
     :param email: 用户邮箱
     :param user_categories: 用户订阅的分类列表
+    :param user_tags: 用户订阅的标签列表（从标签索引中匹配，需先调用 get_tag_index().refresh()）
     :return: 热点数据列表
     """
-    # 如果用户没有订阅任何分类，则获取所有分类的热点
-    if not user_categories:
+    max_items = config.MAX_ITEMS_PER_EMAIL
+
+    # 如果用户没有订阅任何分类和标签，则获取所有分类的热点
+    if not user_categories and not user_tags:
         logger.info(f"用户 {email} 未指定订阅分类，获取所有分类热点")
-        return get_top_hot_items(today_only=True)
+        return get_top_hot_items(today_only=True, limit=max_items)
+
+    category_lists = []
+    if user_categories:
+        logger.info(f"用户 {email} 订阅了 {len(user_categories)} 个分类: {user_categories}")
 
-    logger.info(f"用户 {email} 订阅了 {len(user_categories)} 个分类: {user_categories}")
+        # 获取每个分类的热门项目，每个分类最多items_per_category条（按预计算排名在数据库中截断）
+        per_category = items_per_category(len(user_categories))
+        category_lists = [get_category_top_items(category, per_category) for category in user_categories]
+    if user_tags:
+        tag_items = get_tag_index().match(user_tags, max_items)
+        logger.info(f"用户 {email} 订阅了 {len(user_tags)} 个标签，命中 {len(tag_items)} 条热点")
+        category_lists.append(tag_items)
+    return select_digest_items(category_lists, max_items)
 
-    # 获取每个分类的热门项目，每个分类最多3条
-    hot_items = []
-    items_per_category = max(3, config.MAX_ITEMS_PER_EMAIL // len(user_categories))
 
-    for category in user_categories:
-        category_items = get_top_hot_items(categories=[category], today_only=True)
-        if category_items:
-            # 取每个分类中最多items_per_category条热点
-            hot_items.extend(category_items[:items_per_category])
+def digest_sort_key(item) -> tuple:
+    """
+    摘要内的排序键（升序即展示顺序）：分类内归一化热度优先，同分时按原始热度
+    """
+    return -(item['hot_percentile'] or 0.0), -(item['hot_score'] or 0)
 
-    # 按热度排序
-    hot_items.sort(key=lambda x: x['hot_score'], reverse=True)
 
-    # 应用最大项目数限制
-    max_items = config.MAX_ITEMS_PER_EMAIL
-    return hot_items[:max_items]
+def select_digest_items(category_lists: List[list], max_items: int) -> list:
+    """
+    把各分类已截断、已排好序的热点列表 k 路归并，去重后取前 max_items 条（邮件与 Web 摘要共用）
 
+    :param category_lists: 每个订阅分类（及标签）的热点列表，须已按 digest_sort_key 排序，
+                           同一条热点可能出现在多个列表中
+    :param max_items: 最多返回的条数
+    :return: 热点数据列表
+    """
+    result, seen = [], set()
+    for item in heapq.merge(*category_lists, key=digest_sort_key):
+        if item['id'] in seen:
+            continue
+        seen.add(item['id'])
+        result.append(item)
+        if len(result) >= max_items:
+            break
+    return result
 
-def send_personalized_emails():
+
+def _today_snapshot(snapshot=None):
     """
-    为每个用户发送个性化邮件
+    今天的摘要快照：优先使用已有的（如摘要接口的缓存），否则一次性加载今天的热点
     """
-    subscriptions = parse_recipient_subscriptions()
-    if not subscriptions:
-        logger.warning("未找到任何用户订阅配置")
-        return
+    from digest_api import DigestSnapshot
+
+    if snapshot is not None and snapshot.all_items and snapshot.built_at.date() == datetime.now().date():
+        return snapshot
+    return DigestSnapshot(list(iter_top_hot_items(today_only=True)), config.DIGEST_API_TOP_N)
+
+
+def select_digests(recipients: List[str], subscriptions: Dict[str, List[str]],
+                   tag_subscriptions: Dict[str, List[str]], budget: DigestBudget, snapshot=None,
+                   stop_event: Optional[threading.Event] = None) -> Optional[List[Tuple[str, list]]]:
+    """
+    为每位收件人选取摘要内容
+
+    按实测耗时预计逐个查询数据库会占用为后续阶段预留的时间时，剩余收件人改为从内存快照中选取
+    （选取规则相同，只查询一次数据库）
 
-    for email, categories in subscriptions.items():
-        # 获取用户订阅分类的热点内容
-        hot_items = get_user_hot_items(email, categories)
+    :param recipients: 收件人列表
+    :param subscriptions: 分类订阅
+    :param tag_subscriptions: 标签订阅
+    :param budget: 时间预算
+    :param snapshot: 可复用的摘要快照，为 None 或不是今天的快照时在需要时加载
+    :param stop_event: 停止信号
+    :return: [(收件人, 热点列表)]，收到停止信号时为 None
+    """
+    timer = UnitTimer(budget.clock)
+    digests = []
+    for index, email in enumerate(recipients):
+        if stop_event is not None and stop_event.is_set():
+            return None
+
+        categories, tags = subscriptions.get(email, []), tag_subscriptions.get(email)
+        left = len(recipients) - index
+        if not budget.active(CACHED_SELECTION) and budget.would_overrun(timer.seconds, left, SELECT_RESERVE):
+            try:
+                snapshot = _today_snapshot(snapshot)
+                budget.fire(CACHED_SELECTION, f"逐个查询剩余 {left} 位收件人预计需要 {timer.seconds * left:.1f} 秒")
+            except Exception as e:
+                logger.error(f"加载摘要快照失败，继续逐个查询: {e}")
+
+        # 获取用户订阅分类/标签的热点内容
+        if budget.active(CACHED_SELECTION):
+            hot_items = snapshot.digest(categories, tags)
+        else:
+            hot_items = timer.measure(get_user_hot_items, email, categories, tags)
 
         if not hot_items:
             logger.warning(f"用户 {email} 订阅的分类没有获取到热点数据")
             continue
+        digests.append((email, hot_items))
+    return digests
 
-        # 生成个性化邮件内容
-        html_content = generate_html_content(hot_items)
 
-        # 发送邮件
-        subject = f"🔥 每日热点摘要 - {datetime.now().strftime('%Y年%m月%d日')}"
+def render_digest(hot_items: list, cover_src: Optional[Callable[[str], str]],
+                  budget: DigestBudget) -> Tuple[str, Optional[Dict[str, bytes]]]:
+    """
+    按当前已触发的降级渲染一份摘要
+
+    :return: (HTML, 内嵌图片)
+    """
+    light = budget.active(LIGHT_TEMPLATE)
+    if budget.active(NO_COVERS) or light:
+        cover_src = None
+    html_content = generate_html_content(hot_items, cover_src=cover_src,
+                                         show_descriptions=not budget.active(NO_DESCRIPTIONS), light=light)
+    images = None
+    if cover_src is not None:
+        from cover_images import cover_images
+
+        images = cover_images(hot_items)
+    return html_content, images
+
+
+def digest_time_reached(now: Optional[datetime] = None) -> bool:
+    """
+    今天的摘要发送时间（DIGEST_HOUR:DIGEST_MINUTE）是否已到；未到时启动验证的发送不应计为当天的摘要
+    """
+    now = now or datetime.now()
+    return now >= now.replace(hour=config.DIGEST_HOUR, minute=config.DIGEST_MINUTE, second=0, microsecond=0)
 
-        success = send_email(subject, html_content, [email])
 
-        if success:
-            logger.info(f"用户 {email} 的个性化热点摘要邮件发送成功")
+def send_personalized_emails(smtp: Optional[SmtpClient] = None, stop_event: Optional[threading.Event] = None,
+                             dispatcher=None, force: bool = False, deadline: Optional[datetime] = None,
+                             snapshot=None, checkpoint: bool = True,
+                             clock: Optional[Callable[[], float]] = None) -> Optional[DigestBudget]:
+    """
+    为每个用户生成个性化摘要，并通过投递渠道（SMTP/Webhook/mbox 文件）批量发送
+
+    当天已发送完成时直接跳过；每批投递后记录已投递的 (渠道, 收件人)，中途退出或有摘要未投递时
+    不标记完成，重启后只发送剩余部分
+
+    临近 deadline 时逐级降级（见 digest_budget）：改用内存快照选取内容、不显示封面、不显示描述与摘要、
+    使用精简模板、不再等待投递重试；触发的降级记录在日志与当天的运行记录中
+
+    :param smtp: SMTP 渠道复用的客户端，为 None 时由渠道内部创建并在结束后关闭
+    :param stop_event: 停止信号，设置后不再生成新的摘要、不再开始新的投递批次
+    :param dispatcher: 投递器，为 None 时按 DELIVERY_CHANNELS 及收件人的 channels 配置创建并在结束后关闭
+    :param force: 当天已发送时是否重新发送
+    :param deadline: 必须完成的时间，默认为开始后 DIGEST_TIME_BUDGET_SECONDS 秒（为 0 时不限时）
+    :param snapshot: 降级时可复用的摘要快照（如摘要接口的缓存）
+    :param checkpoint: 是否使用当天的断点；为 False 时（摘要时间之前的启动验证）照常发送，
+                       但既不跳过也不标记当天已发送
+    :param clock: 时间预算使用的单调时钟（默认 time.monotonic），传入的 dispatcher 应使用同一时钟
+    :return: 本次的时间预算（budget.fired 为触发的降级），当天已发送而跳过时为 None
+    """
+    from delivery import Dispatcher, DigestMessage, build_sinks, default_channels
+    from pipeline_runs import begin_stage
+
+    if deadline is None and config.DIGEST_TIME_BUDGET_SECONDS > 0:
+        deadline = datetime.now() + timedelta(seconds=config.DIGEST_TIME_BUDGET_SECONDS)
+    budget = DigestBudget(deadline, clock=clock) if clock is not None else DigestBudget(deadline)
+
+    run = begin_stage("email", force=force, checkpoint=checkpoint)
+    if run is None:
+        return
+    if not checkpoint:
+        logger.info("本次发送仅用于验证，不记录当天的发送进度")
+
+    subscriptions = parse_recipient_subscriptions()
+    tag_subscriptions = parse_recipient_subscriptions(field="tags")
+    channel_subscriptions = parse_recipient_subscriptions(field="channels")
+    recipients = list(dict.fromkeys([*subscriptions, *tag_subscriptions]))
+    if not recipients:
+        logger.warning("未找到任何用户订阅配置")
+        return budget
+    delivered = set(run.cursor.get("delivered", []))
+    if delivered:
+        recipients = [email for email in recipients if any(
+            f"{channel}:{email}" not in delivered for channel in channel_subscriptions.get(email) or default_channels())]
+        logger.info(f"断点处已投递 {len(delivered)} 份摘要，剩余 {len(recipients)} 位收件人")
+    if tag_subscriptions:
+        get_tag_index().refresh()
+
+    # 先为所有收件人选好内容，以便一次性并发预取全部入选热点的封面
+    digests = select_digests(recipients, subscriptions, tag_subscriptions, budget, snapshot, stop_event)
+    if digests is None:
+        logger.warning("收到停止信号，停止发送剩余邮件")
+        return budget
+
+    cover_src = None
+    if config.COVER_ENABLED:
+        if budget.would_overrun(config.COVER_TIMEOUT, 1, COVER_RESERVE):
+            budget.fire(NO_COVERS, "剩余时间不足以预取封面")
+        else:
+            from cover_images import prefetch_covers
+
+            try:
+                prefetch_covers(item for _, hot_items in digests for item in hot_items)
+                cover_src = "cid:{}".format
+            except Exception as e:
+                logger.warning(f"预取封面失败，本次邮件不显示封面: {e}")
+
+    own_dispatcher = dispatcher is None
+    if own_dispatcher:
+        channels = set(default_channels())
+        for email_channels in channel_subscriptions.values():
+            channels.update(email_channels)
+        dispatcher = Dispatcher(build_sinks(sorted(channels), smtp=smtp), clock=budget.clock)
+    try:
+        subject = f"🔥 每日热点摘要 - {datetime.now().strftime('%Y年%m月%d日')}"
+        messages = []
+        timer = UnitTimer(budget.clock)
+        # 没有封面时跳过"不显示封面"这一级
+        ladder = RENDER_LADDER if cover_src is not None else tuple(n for n in RENDER_LADDER if n != NO_COVERS)
+        for index, (email, hot_items) in enumerate(digests):
+            if stop_event is not None and stop_event.is_set():
+                logger.warning("收到停止信号，停止生成剩余摘要")
+                break
+
+            left = len(digests) - index
+            if budget.would_overrun(timer.seconds, left, RENDER_RESERVE):
+                budget.escalate(ladder, f"渲染剩余 {left} 份摘要预计需要 {timer.seconds * left:.1f} 秒")
+
+            # 生成个性化邮件内容（各渠道共用）
+            with span("render", category=email):
+                html_content, images = timer.measure(render_digest, hot_items, cover_src, budget)
+
+            for channel in channel_subscriptions.get(email) or default_channels():
+                if f"{channel}:{email}" not in delivered:
+                    message = DigestMessage(channel, email, subject, html_content, hot_items, images)
+                    messages.append(message)
+                    dispatcher.submit(message)
+
+        save_lock = threading.Lock()
+
+        def _record_delivered(sent):
+            # 每批投递后立即写回断点，中途退出时已投递的收件人不会在重启后重复发送
+            with save_lock:
+                delivered.update(f"{m.channel}:{m.recipient}" for m in sent)
+                run.cursor["delivered"] = sorted(delivered)
+                run.add(sent=len(sent))
+                run.save()
+
+        dispatcher.flush(stop_event, deadline=budget.deadline, on_batch=_record_delivered)
+        if dispatcher.retries_dropped:
+            budget.fire(NO_RETRY, f"{dispatcher.retries_dropped} 份摘要的重试会超出期限")
+        run.cursor["degradations"] = budget.fired
+        undelivered = sum(1 for m in messages if not m.delivered)
+        run.add(failed=undelivered)
+        if budget.fired:
+            logger.warning(f"本次摘要触发的降级: {budget.summary()}，剩余时间 {budget.remaining():.1f} 秒")
+        if undelivered or (stop_event is not None and stop_event.is_set()):
+            # 仍有未投递的摘要时不标记完成，重启后只发送给 cursor["delivered"] 之外的收件人
+            if undelivered:
+                logger.warning(f"{undelivered} 份摘要未投递，当天发送保持未完成，重启后补发")
+            run.save()
         else:
-            logger.error(f"用户 {email} 的个性化热点摘要邮件发送失败")
+            run.finish()
+    finally:
+        if own_dispatcher:
+            dispatcher.close()
+    return budget
 
 
 def main():
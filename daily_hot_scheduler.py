@@ -1,39 +1,56 @@
 # scheduler_main.py
+# 入口只导入轻量模块；收集/分析/发送及 apscheduler 等依赖在对应子命令中按需导入，
+# 这样 health 探针和一次性命令无需加载 SQLAlchemy、Jinja2、requests 等。
+import time
+
+_STARTED_AT = time.perf_counter()
+
+import argparse
 import os
-import signal
+import sys
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 from zoneinfo import ZoneInfo
 
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.cron import CronTrigger
 from loguru import logger
 
-from daily_hot_collector import collect_daily_hot_data, analyze_daily_hot_data
-from daily_hot_reminder import send_personalized_emails
-
-# ==== 日志 ====
 LOG_DIR = os.getenv("LOG_DIR", "./logs")
-os.makedirs(LOG_DIR, exist_ok=True)
-logger.remove()
-logger.add(
-    sink=lambda msg: print(msg, end=""),  # 控制台
-    level="INFO",
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | {message}",
-)
-logger.add(
-    f"{LOG_DIR}/scheduler.log",
-    level="DEBUG",
-    rotation="10 MB",
-    retention="7 days",
-    enqueue=True,
-    encoding="utf-8",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
-)
-
 TZ = ZoneInfo("Asia/Shanghai")
 
 
+# ==== 日志 ====
+def setup_logging(file_sink: bool = True) -> None:
+    """
+    配置日志输出
+
+    :param file_sink: 是否同时写入日志文件（health 探针不需要）
+    """
+    logger.remove()
+    logger.add(
+        sink=lambda msg: print(msg, end=""),  # 控制台
+        level="INFO",
+        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | {message}",
+    )
+    if file_sink:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        logger.add(
+            f"{LOG_DIR}/scheduler.log",
+            level="DEBUG",
+            rotation="10 MB",
+            retention="7 days",
+            enqueue=True,
+            encoding="utf-8",
+            format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
+        )
+
+
+def startup_elapsed_ms() -> float:
+    """
+    从入口模块开始加载到现在的耗时（毫秒）
+    """
+    return (time.perf_counter() - _STARTED_AT) * 1000
+
+
 def get_next_time(job) -> Optional[datetime]:
     # v3: next_run_time；v4: next_fire_time
     nrt = getattr(job, "next_run_time", None) or getattr(job, "next_fire_time", None)
@@ -60,104 +77,177 @@ def get_next_time(job) -> Optional[datetime]:
     return nft.astimezone(TZ) if nft else None
 
 
-def collect_job():
+def collect_job(force: bool = False):
     try:
+        from daily_hot_collector import collect_daily_hot_data
+        from profiling import profile_stage
+
         logger.info("开始执行【数据收集】")
-        collect_daily_hot_data()
+        with profile_stage("数据收集"):
+            collect_daily_hot_data(force=force)
         logger.info("完成【数据收集】")
     except Exception as e:
         logger.exception(f"【数据收集】出错: {e}")
 
 
-def analyze_job():
+def analyze_job(force: bool = False):
     try:
+        from daily_hot_collector import analyze_daily_hot_data
+        from profiling import profile_stage
+
         logger.info("开始执行【数据分析】")
-        analyze_daily_hot_data()
+        with profile_stage("数据分析"):
+            analyze_daily_hot_data(force=force)
         logger.info("完成【数据分析】")
     except Exception as e:
         logger.exception(f"【数据分析】出错: {e}")
 
 
-def email_job():
+def email_job(force: bool = False, checkpoint: bool = True):
     try:
+        from daily_hot_reminder import send_personalized_emails
+        from profiling import profile_stage
+
         logger.info("开始执行【邮件发送】")
-        send_personalized_emails()
+        with profile_stage("邮件发送"):
+            send_personalized_emails(force=force, checkpoint=checkpoint)
         logger.info("完成【邮件发送】")
     except Exception as e:
         logger.exception(f"【邮件发送】出错: {e}")
 
 
-def start_scheduler():
-    scheduler = BlockingScheduler(
-        timezone=TZ,
-        job_defaults={
-            "coalesce": True,  # 堆积时只跑一次
-            "max_instances": 1,  # 防止并发重入
-            "misfire_grace_time": 300,  # 错过触发点5分钟内仍执行
-        },
-    )
+def run_on_start():
+    """
+    启动后立即执行一次 收集/分析/发送（用于验证）
 
-    # === 根据你的注释：8:00 / 8:05 / 9:00 ===
-    scheduler.add_job(
-        collect_job,
-        CronTrigger(hour=1, minute=0),
-        id="daily_hot_collector",
-        name="每日热点收集",
-        replace_existing=True,
-    )
-    scheduler.add_job(
-        analyze_job,
-        CronTrigger(hour=1, minute=5),
-        id="daily_hot_analyzer",
-        name="每日热点分析",
-        replace_existing=True,
-    )
-    scheduler.add_job(
-        email_job,
-        CronTrigger(hour=10, minute=0),
-        id="daily_hot_reminder",
-        name="每日热点提醒",
-        replace_existing=True,
-    )
+    摘要时间之前的这次发送不记录断点，不影响当天定时发送的摘要
+    """
+    logger.info("RUN_ON_START=true：立即执行一次 收集/分析/发送 用于验证")
+    try:
+        from daily_hot_reminder import digest_time_reached
+
+        collect_job()
+        analyze_job()
+        email_job(checkpoint=digest_time_reached())
+    except Exception:
+        logger.exception("RUN_ON_START 执行失败")
 
+
+def log_next_runs(scheduler) -> None:
     logger.info("定时任务已启动：")
     for job in scheduler.get_jobs():
         nrt = get_next_time(job)
         logger.info(
             f"  - {job.name} | 下次运行：{nrt:%Y-%m-%d %H:%M:%S %Z}" if nrt else f"  - {job.name} | 下次运行：未知")
 
-    # 优雅退出
-    def _graceful_shutdown(signum, frame):
-        logger.warning(f"收到信号 {signum}，准备停止调度器...")
-        scheduler.shutdown(wait=True)
-        logger.info("调度器已停止")
 
-    signal.signal(signal.SIGINT, _graceful_shutdown)
-    signal.signal(signal.SIGTERM, _graceful_shutdown)
+def run_scheduler():
+    from async_runtime import AsyncRuntime
 
-    try:
-        scheduler.start()
-        logger.info("立即执行一次收集/分析/发送任务用于验证")
-        collect_job()
-        analyze_job()
-        email_job()
-    except Exception as e:
-        logger.exception(f"调度器异常退出：{e}")
+    runtime = AsyncRuntime(TZ)
+    runtime.run(run_on_start=os.getenv("RUN_ON_START", "").lower() == "true", on_started=log_next_runs)
 
 
-if __name__ == "__main__":
-    # 启动后立即执行一次（用于验证）
-    if os.getenv("RUN_ON_START", "").lower() == "true":
-        logger.info("RUN_ON_START=true：立即执行一次 收集/分析/发送 用于验证")
+def health(check_db: bool = False) -> int:
+    """
+    健康检查：默认只检查进程环境，--db 时额外检查数据库连通性
+
+    :param check_db: 是否检查数据库
+    :return: 进程退出码，0 表示健康
+    """
+    ok = True
+    if os.path.exists(LOG_DIR) and not os.access(LOG_DIR, os.W_OK):
+        logger.error(f"日志目录不可写: {LOG_DIR}")
+        ok = False
+
+    if check_db:
         try:
-            collect_job()
-            analyze_job()
-            email_job()
-        except Exception:
-            logger.exception("RUN_ON_START 执行失败")
+            from sqlalchemy import text
+
+            from database import session_scope
 
-    if os.getenv("RUN_AS_SCHEDULER", "").lower() == "true":
-        logger.info(f"以定时任务模式启动（当前时间 {datetime.now(TZ):%Y-%m-%d %H:%M:%S %Z}）")
-        start_scheduler()
+            with session_scope() as session:
+                session.execute(text("SELECT 1"))
+        except Exception as e:
+            logger.error(f"数据库连接失败: {e}")
+            ok = False
+
+    logger.info(f"健康检查{'通过' if ok else '失败'}，耗时 {startup_elapsed_ms():.0f} ms")
+    return 0 if ok else 1
+
+
+def profile_diff(base: Optional[str], head: Optional[str], stage: Optional[str], threshold: float) -> int:
+    """
+    对比两次剖析记录，默认取同一阶段最近的两次运行
+
+    :return: 进程退出码，存在退化时为 1
+    """
+    from profiling import diff_runs, latest_pair, load_run, print_diff
+
+    try:
+        if base is None or head is None:
+            base, head = latest_pair(stage)
+        base_run, head_run = load_run(base), load_run(head)
+    except (OSError, ValueError) as e:
+        logger.error(f"读取剖析记录失败: {e}")
+        return 2
+    regressions = print_diff(base_run, head_run, diff_runs(base_run, head_run, threshold=threshold))
+    return 1 if regressions else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="每日热点 收集/分析/发送 入口")
+    subparsers = parser.add_subparsers(dest="command")
+    for name, help_text in (("collect", "执行一次数据收集"), ("analyze", "执行一次数据分析"), ("email", "执行一次邮件发送")):
+        stage_parser = subparsers.add_parser(name, help=help_text)
+        stage_parser.add_argument("--force", action="store_true", help="今天已完成时也重新执行")
+    subparsers.add_parser("run-scheduler", help="以定时任务模式运行")
+    subparsers.add_parser("serve", help="独立运行 Web 摘要 / JSON 接口")
+    health_parser = subparsers.add_parser("health", help="健康检查")
+    health_parser.add_argument("--db", action="store_true", help="同时检查数据库连通性")
+    diff_parser = subparsers.add_parser("profile-diff", help="对比两次剖析记录（需开启 PROFILE_JOBS）")
+    diff_parser.add_argument("base", nargs="?", help="基准运行的 run_id 或文件路径")
+    diff_parser.add_argument("head", nargs="?", help="对比运行的 run_id 或文件路径")
+    diff_parser.add_argument("--stage", help="未指定运行时，取该阶段最近的两次运行")
+    diff_parser.add_argument("--threshold", type=float, default=0.2, help="平均耗时增长超过该比例视为退化")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "health":
+        setup_logging(file_sink=False)
+        return health(check_db=args.db)
+    if args.command == "profile-diff":
+        setup_logging(file_sink=False)
+        return profile_diff(args.base, args.head, args.stage, args.threshold)
+
+    setup_logging()
+    logger.info(f"启动耗时 {startup_elapsed_ms():.0f} ms（命令: {args.command or '环境变量模式'}）")
+
+    if args.command == "collect":
+        collect_job(force=args.force)
+    elif args.command == "analyze":
+        analyze_job(force=args.force)
+    elif args.command == "email":
+        email_job(force=args.force)
+    elif args.command == "run-scheduler":
+        run_scheduler()
+    elif args.command == "serve":
+        from digest_api import serve
+
+        serve()
+    elif os.getenv("RUN_AS_SCHEDULER", "").lower() == "true":
+        # 兼容旧的环境变量启动方式
+        run_scheduler()
     else:
-        logger.info("请设置环境变量 RUN_AS_SCHEDULER=true 后运行本程序")
+        # 启动后立即执行一次（用于验证）
+        if os.getenv("RUN_ON_START", "").lower() == "true":
+            run_on_start()
+        logger.info("请设置环境变量 RUN_AS_SCHEDULER=true 或使用 run-scheduler 子命令运行本程序")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,186 @@
 # db/database.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 
 import config
 
-engine = create_engine(config.SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+_schema_ready = False
+_schema_lock = threading.Lock()
 
 Base = declarative_base()
+
+
+class PoolStats:
+    """
+    连接池使用统计：借出等待时间、借出/归还次数、峰值占用
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def on_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def on_checkin(self) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.in_use = max(0, self.in_use - 1)
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "peak_in_use": self.peak_in_use,
+                "wait_avg_ms": round(self.wait_total / self.waits * 1000, 2) if self.waits else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+                "timeouts": self.timeouts,
+            }
+
+
+pool_stats = PoolStats()
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_stats.on_checkout()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    pool_stats.on_checkin()
+
+
+def get_engine() -> Engine:
+    """
+    获取数据库引擎，首次调用时才创建连接池，避免导入模块即连接数据库
+
+    :return: SQLAlchemy 引擎
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    config.SQLALCHEMY_DATABASE_URL,
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_MAX_OVERFLOW,
+                    pool_timeout=config.DB_POOL_TIMEOUT,
+                    pool_recycle=config.DB_POOL_RECYCLE,
+                    pool_pre_ping=config.DB_POOL_PRE_PING,
+                )
+                event.listen(engine, "checkout", _on_checkout)
+                event.listen(engine, "checkin", _on_checkin)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def ensure_schema_once() -> None:
+    """
+    每个进程只执行一次 models.ensure_schema（建表、索引及增量结构变更），
+    避免频繁调用的阶段（如分析重试轮询）反复执行 DDL
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            from models import ensure_schema
+
+            ensure_schema(get_engine())
+            _schema_ready = True
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    以一个工作单元为范围使用会话：正常结束时提交，异常时回滚，最后归还连接
+
+    用法：
+        with session_scope() as session:
+            session.query(...)
+    """
+    get_engine()
+    session: Session = SessionLocal()
+    start = time.perf_counter()
+    try:
+        # 立即借出连接，以便统计连接池等待时间
+        session.connection()
+    except Exception:
+        pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+        session.close()
+        raise
+    pool_stats.record_wait(time.perf_counter() - start)
+
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    获取连接池当前状态与累计统计
+
+    :return: 包含连接池大小、占用、溢出、利用率及借出等待统计的字典
+    """
+    stats: Dict[str, Any] = {"engine_created": _engine is not None}
+    stats.update(pool_stats.snapshot())
+    if _engine is None:
+        return stats
+
+    pool = _engine.pool
+    capacity = config.DB_POOL_SIZE + max(config.DB_MAX_OVERFLOW, 0)
+    checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+    stats.update({
+        "pool_size": pool.size() if hasattr(pool, "size") else None,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        "utilization": round(checked_out / capacity, 3) if capacity else None,
+    })
+    return stats
+
+
+def dispose_engine() -> None:
+    """
+    关闭连接池中的所有连接，进程退出前调用
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
@@ -0,0 +1,357 @@
+import mailbox
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+from loguru import logger
+
+import config
+from profiling import bind_run, current_run, span
+
+
+class DigestMessage:
+    """
+    一份待投递的摘要
+    """
+    __slots__ = ('channel', 'recipient', 'subject', 'html', 'items', 'images', 'attempts', 'last_error', 'delivered')
+
+    def __init__(self, channel: str, recipient: str, subject: str, html: str, items: list,
+                 images: Optional[Dict[str, bytes]] = None):
+        self.channel = channel
+        self.recipient = recipient
+        self.subject = subject
+        self.html = html
+        self.items = items
+        self.images = images
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.delivered = False
+
+    def __repr__(self):
+        return f"DigestMessage(channel={self.channel!r}, recipient={self.recipient!r})"
+
+
+class Sink:
+    """
+    投递渠道的基类
+
+    - batch_size：Dispatcher 每次交给 send_batch 的消息数
+    - concurrency：同一渠道同时执行的批次数
+    - send_batch 返回与消息一一对应的错误信息，成功为 None
+    """
+
+    name = "sink"
+    batch_size = 1
+    concurrency = 1
+
+    def send_batch(self, messages: List[DigestMessage]) -> List[Optional[str]]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SmtpSink(Sink):
+    """
+    SMTP 渠道：每个并发线程持有一条 SMTP 连接，同一批次的邮件复用该连接
+    """
+
+    name = "smtp"
+
+    def __init__(self, smtp=None, concurrency: Optional[int] = None, batch_size: int = 20):
+        """
+        :param smtp: 复用的 SmtpClient；传入时只使用这一条连接（并发为 1）
+        :param concurrency: 并发连接数，默认 DELIVERY_SMTP_CONCURRENCY
+        :param batch_size: 每批邮件数
+        """
+        self._shared = smtp
+        self.concurrency = 1 if smtp is not None else (concurrency or config.DELIVERY_SMTP_CONCURRENCY)
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def _client(self):
+        if self._shared is not None:
+            return self._shared
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from daily_hot_reminder import SmtpClient
+
+            client = self._local.client = SmtpClient()
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def send_batch(self, messages: List[DigestMessage]) -> List[Optional[str]]:
+        from daily_hot_reminder import send_email
+
+        client = self._client()
+        return [
+            None if send_email(m.subject, m.html, [m.recipient], smtp=client, images=m.images) else "smtp_failed"
+            for m in messages
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients.clear()
+
+
+class WebhookSink(Sink):
+    """
+    Webhook 渠道：一批摘要合并为一次 POST（JSON 数组），使用 keep-alive 连接
+    """
+
+    name = "webhook"
+
+    def __init__(self, url: Optional[str] = None, batch_size: Optional[int] = None,
+                 concurrency: Optional[int] = None, timeout: int = 30):
+        """
+        :param url: 接收地址，默认 DELIVERY_WEBHOOK_URL
+        :param batch_size: 每次 POST 的摘要数
+        :param concurrency: 并发请求数
+        """
+        self.url = url or config.DELIVERY_WEBHOOK_URL
+        self.batch_size = batch_size or config.DELIVERY_WEBHOOK_BATCH
+        self.concurrency = concurrency or config.DELIVERY_WEBHOOK_CONCURRENCY
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send_batch(self, messages: List[DigestMessage]) -> List[Optional[str]]:
+        payload = [
+            {
+                "recipient": m.recipient,
+                "subject": m.subject,
+                "items": [item.to_dict() if hasattr(item, "to_dict") else item for item in m.items],
+            }
+            for m in messages
+        ]
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            return [str(e)] * len(messages)
+        return [None] * len(messages)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class FileSink(Sink):
+    """
+    文件渠道：把邮件追加写入 mbox 文件，可用于离线测试吞吐与检查邮件内容
+    """
+
+    name = "file"
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = 100):
+        """
+        :param path: mbox 文件路径，默认 DELIVERY_MBOX_PATH
+        :param batch_size: 每批写入的邮件数（一批只加锁、刷盘一次）
+        """
+        self.path = path or config.DELIVERY_MBOX_PATH
+        self.batch_size = batch_size
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._mbox = mailbox.mbox(self.path)
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages: List[DigestMessage]) -> List[Optional[str]]:
+        from daily_hot_reminder import build_message
+
+        built = [build_message(m.subject, m.html, [m.recipient], config.SENDER_EMAIL, m.images) for m in messages]
+        with self._lock:
+            self._mbox.lock()
+            try:
+                for message in built:
+                    self._mbox.add(message)
+                self._mbox.flush()
+            finally:
+                self._mbox.unlock()
+        return [None] * len(messages)
+
+    def close(self) -> None:
+        with self._lock:
+            self._mbox.close()
+
+
+class Dispatcher:
+    """
+    按渠道批量投递摘要
+
+    - submit() 只入队；flush() 把每个渠道的消息按 batch_size 分批，并以该渠道的 concurrency 并发执行
+    - 失败的消息进入重试队列，按指数退避（DELIVERY_RETRY_SECONDS × 2^n）重试，最多 max_attempts 次
+    - 收到停止信号后不再开始新的批次，未投递的消息计为失败
+    - 指定 deadline 时，等待重试会超出期限的消息不再重试，计为失败（retries_dropped）
+    """
+
+    def __init__(self, sinks: Dict[str, Sink], max_attempts: Optional[int] = None,
+                 retry_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        :param sinks: {渠道名: 渠道}
+        :param max_attempts: 每条消息最多投递次数
+        :param retry_seconds: 第一次重试前的等待秒数
+        :param clock: flush 的 deadline 所用的单调时钟
+        """
+        self.sinks = sinks
+        self.clock = clock
+        self.max_attempts = max_attempts or config.DELIVERY_MAX_ATTEMPTS
+        self.retry_seconds = config.DELIVERY_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self._queue: List[DigestMessage] = []
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"sent": 0, "failed": 0, "retried": 0})
+        self.retries_dropped = 0
+
+    def submit(self, message: DigestMessage) -> None:
+        if message.channel not in self.sinks:
+            logger.error(f"未配置的投递渠道: {message.channel}（{message.recipient}）")
+            self.stats[message.channel]["failed"] += 1
+            return
+        self._queue.append(message)
+
+    def _run_channel(self, name: str, messages: List[DigestMessage], stop_event: Optional[threading.Event] = None,
+                     on_batch: Optional[Callable[[List[DigestMessage]], None]] = None) -> List[DigestMessage]:
+        """
+        投递一个渠道的消息，返回需要重试的消息
+
+        收到停止信号后尚未开始的批次不再投递，其中的消息直接计为失败（不重试）；
+        每批投递完成后以该批投递成功的消息调用 on_batch（不同渠道的回调可能并发）
+        """
+        sink = self.sinks[name]
+        batches = [messages[i:i + sink.batch_size] for i in range(0, len(messages), sink.batch_size)]
+        run = current_run()
+
+        def _send(batch):
+            if stop_event is not None and stop_event.is_set():
+                return None
+            # 投递线程加入调用方的剖析记录，send span 才能被记录
+            with bind_run(run), span("send", category=name):
+                try:
+                    return sink.send_batch(batch)
+                except Exception as e:
+                    logger.exception(f"渠道 {name} 投递出错: {e}")
+                    return [str(e)] * len(batch)
+
+        failed, skipped = [], 0
+        with ThreadPoolExecutor(max_workers=sink.concurrency, thread_name_prefix=f"deliver-{name}") as pool:
+            for batch, errors in zip(batches, pool.map(_send, batches)):
+                if errors is None:
+                    for message in batch:
+                        message.last_error = "收到停止信号，未投递"
+                    self.stats[name]["failed"] += len(batch)
+                    skipped += len(batch)
+                    continue
+                for message, error in zip(batch, errors):
+                    message.attempts += 1
+                    if error is None:
+                        message.delivered = True
+                        self.stats[name]["sent"] += 1
+                    else:
+                        message.last_error = error
+                        failed.append(message)
+                if on_batch is not None:
+                    sent = [message for message in batch if message.delivered]
+                    if sent:
+                        on_batch(sent)
+        if skipped:
+            logger.warning(f"收到停止信号，渠道 {name} 放弃 {skipped} 条未投递的摘要")
+        return failed
+
+    def flush(self, stop_event: Optional[threading.Event] = None, deadline: Optional[float] = None,
+              on_batch: Optional[Callable[[List[DigestMessage]], None]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        投递队列中的全部消息（含重试）
+
+        :param stop_event: 停止信号
+        :param deadline: 期限（clock() 时间点，默认为 time.monotonic()），超出期限不再等待重试
+        :param on_batch: 每批投递完成后的回调，参数为该批投递成功的消息（用于逐批记录断点）
+        :return: 各渠道的 {sent, failed, retried}
+        """
+        pending, self._queue = self._queue, []
+        retry = 0
+        while pending:
+            by_channel: Dict[str, List[DigestMessage]] = defaultdict(list)
+            for message in pending:
+                by_channel[message.channel].append(message)
+
+            # 不同渠道互不阻塞
+            run = current_run()
+
+            def _channel(item):
+                with bind_run(run):
+                    return self._run_channel(*item, stop_event=stop_event, on_batch=on_batch)
+
+            with ThreadPoolExecutor(max_workers=len(by_channel), thread_name_prefix="deliver") as pool:
+                results = list(pool.map(_channel, by_channel.items()))
+
+            pending = []
+            for failed in results:
+                for message in failed:
+                    if message.attempts >= self.max_attempts:
+                        self.stats[message.channel]["failed"] += 1
+                        logger.error(f"投递失败（已尝试 {message.attempts} 次）: {message.channel} -> "
+                                     f"{message.recipient}，错误: {message.last_error}")
+                    else:
+                        self.stats[message.channel]["retried"] += 1
+                        pending.append(message)
+
+            if pending:
+                delay = self.retry_seconds * (2 ** retry)
+                retry += 1
+                if deadline is not None and self.clock() + delay > deadline:
+                    for message in pending:
+                        self.stats[message.channel]["failed"] += 1
+                    self.retries_dropped += len(pending)
+                    logger.warning(f"{len(pending)} 条摘要投递失败，重试会超出期限，不再重试")
+                    break
+                logger.warning(f"{len(pending)} 条摘要投递失败，{delay:.0f} 秒后重试")
+                stopped = stop_event.wait(delay) if stop_event is not None else time.sleep(delay)
+                if stopped:
+                    for message in pending:
+                        self.stats[message.channel]["failed"] += 1
+                    logger.warning(f"收到停止信号，放弃 {len(pending)} 条待重试的摘要")
+                    break
+
+        logger.info(f"摘要投递完成: {dict(self.stats)}")
+        return dict(self.stats)
+
+    def close(self) -> None:
+        for sink in self.sinks.values():
+            sink.close()
+
+
+def build_sinks(channels: Optional[List[str]] = None, smtp=None) -> Dict[str, Sink]:
+    """
+    按渠道名创建投递渠道
+
+    :param channels: 渠道名列表，默认 DELIVERY_CHANNELS
+    :param smtp: SMTP 渠道复用的 SmtpClient
+    """
+    factories = {
+        "smtp": lambda: SmtpSink(smtp=smtp),
+        "webhook": WebhookSink,
+        "file": FileSink,
+    }
+    sinks = {}
+    for name in channels or default_channels():
+        if name not in factories:
+            logger.warning(f"未知的投递渠道，已忽略: {name}")
+            continue
+        if name == "webhook" and not config.DELIVERY_WEBHOOK_URL:
+            logger.warning("未设置 DELIVERY_WEBHOOK_URL，已忽略 webhook 渠道")
+            continue
+        sinks[name] = factories[name]()
+    return sinks
+
+
+def default_channels() -> List[str]:
+    return [c.strip() for c in config.DELIVERY_CHANNELS.split(",") if c.strip()]
@@ -0,0 +1,289 @@
+import hashlib
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+
+import config
+from analysis_priority import items_per_category
+from daily_hot_reminder import iter_top_hot_items, generate_html_content, parse_recipient_subscriptions, \
+    select_digest_items
+from models import HotItem
+from tag_index import TagIndex
+
+# 每个快照最多缓存的响应数，超过后清空重新生成
+MAX_CACHED_RESPONSES = 1024
+
+
+class DigestSnapshot:
+    """
+    某一时刻的摘要数据快照（只读）
+
+    - 今天已总结的热点按分类保存前 top_n 条，顺序与 get_top_hot_items 一致
+    - 响应体按请求缓存，同一快照内相同请求只序列化一次，ETag 取响应体哈希
+    """
+
+    def __init__(self, items: List[HotItem], top_n: int, built_at: Optional[datetime] = None):
+        """
+        :param items: 按热度排好序的热点数据
+        :param top_n: 每个分类保留的条数
+        """
+        self.built_at = built_at or datetime.now()
+        self.by_category: Dict[str, List[HotItem]] = {}
+        self.all_items: List[HotItem] = []
+        for item in items:
+            bucket = self.by_category.setdefault(item.category, [])
+            if len(bucket) < top_n:
+                bucket.append(item)
+                self.all_items.append(item)
+        self.by_id: Dict[int, HotItem] = {item.id: item for item in self.all_items}
+        self.tags = TagIndex.from_items(self.all_items)
+        self._responses: Dict[Tuple, Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def top(self, category: Optional[str], limit: int) -> List[HotItem]:
+        if category:
+            return self.by_category.get(category, [])[:limit]
+        return self.all_items[:limit]
+
+    def digest(self, categories: List[str], tags: Optional[List[str]] = None,
+               max_items: Optional[int] = None) -> List[HotItem]:
+        """
+        与 get_user_hot_items 相同的选取规则，但完全基于内存数据
+        """
+        max_items = max_items or config.MAX_ITEMS_PER_EMAIL
+        if not categories and not tags:
+            return self.all_items[:max_items]
+        lists = []
+        if categories:
+            k = items_per_category(len(categories))
+            lists = [self.by_category.get(c, [])[:k] for c in categories]
+        if tags:
+            lists.append(self.tags.match(tags, max_items))
+        return select_digest_items(lists, max_items)
+
+    def response(self, key: Tuple, build) -> Tuple[bytes, str]:
+        """
+        取缓存的响应，未命中时调用 build() 生成
+
+        :param key: 请求标识
+        :param build: 生成响应体（bytes）的函数
+        :return: (响应体, ETag)
+        """
+        cached = self._responses.get(key)
+        if cached is not None:
+            return cached
+        body = build()
+        cached = (body, f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"')
+        with self._lock:
+            if len(self._responses) >= MAX_CACHED_RESPONSES:
+                self._responses.clear()
+            self._responses[key] = cached
+        return cached
+
+
+class DigestCache:
+    """
+    持有当前快照，分析结束后调用 refresh() 重新加载；请求只读取快照，不访问数据库
+    """
+
+    def __init__(self, top_n: Optional[int] = None):
+        self.top_n = top_n or config.DIGEST_API_TOP_N
+        self.snapshot = DigestSnapshot([], self.top_n)
+        self.subscriptions: Dict[str, List[str]] = {}
+        self.tag_subscriptions: Dict[str, List[str]] = {}
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def _prefetch_covers(items: List[HotItem]) -> None:
+        from cover_images import prefetch_covers
+
+        try:
+            prefetch_covers(items)
+        except Exception as e:
+            logger.warning(f"预取封面失败: {e}")
+
+    def refresh(self) -> None:
+        """
+        从数据库加载今天已总结的热点并原子替换快照，同时预生成各订阅者的摘要
+        """
+        with self._refresh_lock:
+            try:
+                snapshot = DigestSnapshot(list(iter_top_hot_items(today_only=True)), self.top_n)
+                subscriptions = parse_recipient_subscriptions()
+                tag_subscriptions = parse_recipient_subscriptions(field="tags")
+            except Exception as e:
+                logger.error(f"刷新摘要缓存失败，继续使用旧数据: {e}")
+                return
+            default_limit = min(config.MAX_ITEMS_PER_EMAIL, len(snapshot.all_items))
+            emails = {*subscriptions, *tag_subscriptions}
+            if config.COVER_ENABLED:
+                # 只为订阅者摘要中的热点预取封面，其它请求沿用已缓存的封面
+                self._prefetch_covers([item for email in emails for item in snapshot.digest(
+                    subscriptions.get(email, []), tag_subscriptions.get(email, []))])
+            for email in emails:
+                categories, tags = subscriptions.get(email, []), tag_subscriptions.get(email, [])
+                snapshot.response(("digest", tuple(categories), tuple(tags)),
+                                  lambda c=categories, t=tags: _json_body(snapshot.digest(c, t)))
+            for category in [None, *snapshot.by_category]:
+                snapshot.response(("top", category, default_limit),
+                                  lambda c=category: _json_body(snapshot.top(c, default_limit)))
+            self.snapshot = snapshot
+            self.subscriptions = subscriptions
+            self.tag_subscriptions = tag_subscriptions
+        logger.info(f"摘要缓存已刷新：{len(snapshot.by_category)} 个分类，{len(snapshot.all_items)} 条热点")
+
+
+def _cover_src(key: str) -> str:
+    return f"/covers/{key}"
+
+
+def _json_body(payload) -> bytes:
+    if isinstance(payload, list):
+        payload = {"items": [item.to_dict() for item in payload]}
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+class DigestRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /api/top?category=&limit=        今天的热点（可按分类）
+    GET /api/digest?email= | categories=&tags= 订阅摘要（按收件人或分类/标签列表）
+    GET /api/items/<id>                  热点详情
+    GET /digest?email= | categories=&tags= 摘要的 HTML 页面（复用邮件模板）
+    GET /covers/<key>                    封面缩略图（开启 COVER_ENABLED 时）
+    """
+
+    server_version = "DailyHotDigest"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, status: int, body: bytes, content_type: str, etag: Optional[str] = None) -> None:
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, _json_body({"error": message}), "application/json; charset=utf-8")
+
+    def _subscription(self, query: Dict[str, List[str]]) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        请求对应的 (分类列表, 标签列表)，未知收件人返回 None
+        """
+        cache: DigestCache = self.server.digest_cache
+        if "email" in query:
+            email = query["email"][0]
+            if email not in cache.subscriptions and email not in cache.tag_subscriptions:
+                return None
+            return cache.subscriptions.get(email, []), cache.tag_subscriptions.get(email, [])
+
+        def _split(name):
+            return [v for v in query.get(name, [""])[0].split(",") if v]
+
+        return _split("categories"), _split("tags")
+
+    def do_GET(self):
+        snapshot = self.server.digest_cache.snapshot
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        path = parts.path.rstrip("/")
+
+        if path == "/api/top":
+            category = query.get("category", [None])[0]
+            try:
+                # 限制在快照条数内，避免不同 limit 产生过多缓存项
+                limit = max(0, min(int(query.get("limit", [config.MAX_ITEMS_PER_EMAIL])[0]), len(snapshot.all_items)))
+            except ValueError:
+                return self._error(400, "invalid limit")
+            body, etag = snapshot.response(("top", category, limit),
+                                           lambda: _json_body(snapshot.top(category, limit)))
+            return self._send(200, body, "application/json; charset=utf-8", etag)
+
+        if path in ("/api/digest", "/digest"):
+            subscription = self._subscription(query)
+            if subscription is None:
+                return self._error(404, "unknown subscriber")
+            categories, tags = subscription
+            if path == "/digest":
+                cover_src = _cover_src if config.COVER_ENABLED else None
+                body, etag = snapshot.response(("html", tuple(categories), tuple(tags)), lambda: generate_html_content(
+                    snapshot.digest(categories, tags), cover_src=cover_src).encode("utf-8"))
+                return self._send(200, body, "text/html; charset=utf-8", etag)
+            body, etag = snapshot.response(("digest", tuple(categories), tuple(tags)),
+                                           lambda: _json_body(snapshot.digest(categories, tags)))
+            return self._send(200, body, "application/json; charset=utf-8", etag)
+
+        if path.startswith("/covers/") and config.COVER_ENABLED:
+            from cover_images import MIME_TYPES, get_cover_store
+
+            key = path.rsplit("/", 1)[-1]
+            data = get_cover_store().read(key) if "." in key and ".." not in key else None
+            if data is None:
+                return self._error(404, "cover not found")
+            self.send_response(200)
+            self.send_header("Content-Type", MIME_TYPES.get(key.rsplit(".", 1)[-1], "application/octet-stream"))
+            self.send_header("Content-Length", str(len(data)))
+            # 按内容哈希命名，内容不会变化
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+            self.end_headers()
+            self.wfile.write(data)
+            return None
+
+        if path.startswith("/api/items/"):
+            try:
+                item = snapshot.by_id.get(int(path.rsplit("/", 1)[-1]))
+            except ValueError:
+                item = None
+            if item is None:
+                return self._error(404, "item not found")
+            body, etag = snapshot.response(("item", item.id), lambda: _json_body(item.to_dict()))
+            return self._send(200, body, "application/json; charset=utf-8", etag)
+
+        return self._error(404, "not found")
+
+
+def start_server(cache: DigestCache, host: Optional[str] = None, port: Optional[int] = None) -> ThreadingHTTPServer:
+    """
+    在后台线程启动 HTTP 服务
+
+    :return: 服务对象，调用 shutdown() 停止
+    """
+    server = ThreadingHTTPServer((host or config.DIGEST_API_HOST, port or config.DIGEST_API_PORT),
+                                 DigestRequestHandler)
+    server.daemon_threads = True
+    server.digest_cache = cache
+    threading.Thread(target=server.serve_forever, name="digest-api", daemon=True).start()
+    logger.info(f"摘要接口已启动: http://{server.server_address[0]}:{server.server_address[1]}")
+    return server
+
+
+def serve(stop_event: Optional[threading.Event] = None) -> None:
+    """
+    独立运行摘要接口，按 DIGEST_API_REFRESH_SECONDS 定期刷新快照
+    """
+    stop_event = stop_event or threading.Event()
+    cache = DigestCache()
+    cache.refresh()
+    server = start_server(cache)
+    try:
+        while not stop_event.wait(config.DIGEST_API_REFRESH_SECONDS):
+            cache.refresh()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        logger.info("摘要接口已停止")
@@ -0,0 +1,113 @@
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+# 降级项，按代价从小到大排列
+CACHED_SELECTION = "cached_selection"  # 改用内存快照选取内容，不再逐个收件人查询数据库
+NO_COVERS = "no_covers"  # 不显示封面
+NO_DESCRIPTIONS = "no_descriptions"  # 不显示描述与 AI 摘要
+LIGHT_TEMPLATE = "light_template"  # 使用只有标题与链接的精简模板
+NO_RETRY = "no_retry"  # 投递失败不再等待重试
+
+# 渲染阶段依次尝试的降级
+RENDER_LADDER = (NO_COVERS, NO_DESCRIPTIONS, LIGHT_TEMPLATE)
+
+# 各阶段结束时至少要为后续阶段留出的总预算比例
+SELECT_RESERVE = 0.5  # 选取内容之后：预取封面、渲染、投递
+COVER_RESERVE = 0.4  # 预取封面之后：渲染、投递
+RENDER_RESERVE = 0.25  # 渲染之后：投递
+
+# 单位耗时的指数平滑系数，降级后能较快反映新的耗时
+EWMA_ALPHA = 0.5
+
+
+class UnitTimer:
+    """
+    按指数平滑估计单个收件人的处理耗时
+    """
+    __slots__ = ('seconds', '_clock')
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.seconds: Optional[float] = None
+        self._clock = clock
+
+    def measure(self, fn: Callable, *args, **kwargs):
+        start = self._clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = self._clock() - start
+            self.seconds = elapsed if self.seconds is None else \
+                EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.seconds
+
+
+class DigestBudget:
+    """
+    摘要生成与投递的时间预算
+
+    - 各阶段按已测得的单位耗时预计剩余工作量，预计会挤占后续阶段的预留时间时触发降级
+    - 降级只会累积不会撤销；fired 记录触发顺序及触发时剩余的秒数
+    - deadline 为 None 时不限时，任何降级都不会触发
+    """
+
+    def __init__(self, deadline: Optional[datetime] = None, clock: Callable[[], float] = time.monotonic,
+                 now: Optional[datetime] = None):
+        """
+        :param deadline: 必须完成的时间点
+        :param clock: 单调时钟，预算与各阶段的单位耗时都按它计时，便于测试
+        :param now: 当前时间，用于换算 deadline，默认 datetime.now()
+        """
+        self.clock = clock
+        self.total: Optional[float] = None
+        self.deadline: Optional[float] = None
+        if deadline is not None:
+            self.total = max((deadline - (now or datetime.now())).total_seconds(), 0.0)
+            self.deadline = clock() + self.total
+        self.fired: List[Dict[str, object]] = []
+
+    def remaining(self) -> float:
+        if self.deadline is None:
+            return float("inf")
+        return self.deadline - self.clock()
+
+    def active(self, name: str) -> bool:
+        return any(entry["name"] == name for entry in self.fired)
+
+    def fire(self, name: str, reason: str) -> None:
+        """
+        触发一项降级（重复触发忽略）
+        """
+        if self.active(name):
+            return
+        remaining = round(self.remaining(), 3)
+        self.fired.append({"name": name, "remaining": remaining, "reason": reason})
+        logger.warning(f"摘要时间预算不足，降级 {name}（剩余 {remaining:.1f} 秒）：{reason}")
+
+    def would_overrun(self, unit_seconds: Optional[float], units: int, reserve: float) -> bool:
+        """
+        按单位耗时预计完成剩余 units 份工作后，是否会占用为后续阶段预留的时间
+
+        :param unit_seconds: 单位耗时，尚未测得时为 None（不判断）
+        :param units: 剩余工作量
+        :param reserve: 需要为后续阶段预留的总预算比例
+        """
+        if self.deadline is None or unit_seconds is None:
+            return False
+        return unit_seconds * units > self.remaining() - reserve * self.total
+
+    def escalate(self, ladder, reason: str) -> Optional[str]:
+        """
+        触发 ladder 中下一项尚未触发的降级
+
+        :return: 触发的降级，全部已触发时为 None
+        """
+        for name in ladder:
+            if not self.active(name):
+                self.fire(name, reason)
+                return name
+        return None
+
+    def summary(self) -> List[str]:
+        return [entry["name"] for entry in self.fired]
@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+import config
+
+
+def parse_route_ttls(value: str) -> Dict[str, int]:
+    """
+    解析按路由配置的缓存时间，格式: "/all=3600,/weibo=120"
+
+    :param value: 配置字符串
+    :return: {路由: 秒数}
+    """
+    ttls = {}
+    for part in (value or "").split(","):
+        if "=" not in part:
+            continue
+        route, seconds = part.split("=", 1)
+        route = route.strip()
+        if not route.startswith("/"):
+            route = "/" + route
+        try:
+            ttls[route] = int(seconds)
+        except ValueError:
+            logger.warning(f"忽略无效的缓存时间配置: {part}")
+    return ttls
+
+
+class ResponseCache:
+    """
+    热点接口的本地读穿缓存（内存 + SQLite）
+
+    - 以路由为键保存原始响应体，每个路由可单独配置有效期（TTL）
+    - 同一进程内重复读取直接命中内存；重启后从 SQLite 读取，减少对上游的请求
+    - 过期但仍在 stale_seconds 窗口内的数据可以先返回，由调用方在后台刷新（stale-while-revalidate）
+    - 总大小超过 max_bytes 时按最近访问时间淘汰；读取时只在内存中记录访问时间，
+      在下次写入（淘汰之前）或关闭时批量写回 SQLite
+    """
+
+    FRESH = "fresh"
+    STALE = "stale"
+
+    def __init__(self, path: str, default_ttl: int = 600, route_ttls: Optional[Dict[str, int]] = None,
+                 stale_seconds: int = 600, max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param path: SQLite 文件路径
+        :param default_ttl: 默认有效期（秒）
+        :param route_ttls: 按路由覆盖的有效期
+        :param stale_seconds: 过期后仍可返回旧数据的时间窗口（秒）
+        :param max_bytes: 缓存总大小上限
+        """
+        self.default_ttl = default_ttl
+        self.route_ttls = route_ttls or {}
+        self.stale_seconds = stale_seconds
+        self.max_bytes = max_bytes
+        self._memory: Dict[str, Tuple[bytes, float]] = {}
+        self._accessed: Dict[str, float] = {}  # 尚未写回的最近访问时间
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "route TEXT PRIMARY KEY, body BLOB NOT NULL, fetched_at REAL NOT NULL, "
+            "last_access REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def ttl_for(self, route: str) -> int:
+        return self.route_ttls.get(route, self.default_ttl)
+
+    def get(self, route: str, now: Optional[float] = None) -> Optional[Tuple[bytes, str]]:
+        """
+        读取缓存
+
+        :param route: 路由路径
+        :param now: 当前时间（epoch 秒）
+        :return: (响应体, "fresh"/"stale")，未命中或已超出旧数据窗口时返回 None
+        """
+        now = now or time.time()
+        with self._lock:
+            entry = self._memory.get(route)
+            if entry is None:
+                row = self._conn.execute(
+                    "SELECT body, fetched_at FROM responses WHERE route = ?", (route,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = (bytes(row[0]), row[1])
+                self._memory[route] = entry
+            self._accessed[route] = now
+
+        body, fetched_at = entry
+        age = now - fetched_at
+        ttl = self.ttl_for(route)
+        if age <= ttl:
+            return body, self.FRESH
+        if age <= ttl + self.stale_seconds:
+            return body, self.STALE
+        return None
+
+    def put(self, route: str, body: bytes, now: Optional[float] = None) -> None:
+        """
+        写入缓存并在超出大小上限时淘汰
+        """
+        now = now or time.time()
+        with self._lock:
+            self._memory[route] = (body, now)
+            self._accessed.pop(route, None)
+            self._flush_access()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (route, body, fetched_at, last_access, size) VALUES (?, ?, ?, ?, ?)",
+                (route, sqlite3.Binary(body), now, now, len(body)),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _flush_access(self) -> None:
+        """
+        把内存中记录的访问时间写回 SQLite（调用方持有锁并负责提交）
+        """
+        if not self._accessed:
+            return
+        self._conn.executemany(
+            "UPDATE responses SET last_access = MAX(last_access, ?) WHERE route = ?",
+            [(accessed, route) for route, accessed in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT route, size FROM responses ORDER BY last_access").fetchall()
+        for route, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE route = ?", (route,))
+            self._memory.pop(route, None)
+            total -= size
+            logger.debug(f"缓存超出上限，淘汰: {route}")
+
+    def invalidate(self, route: str) -> None:
+        with self._lock:
+            self._memory.pop(route, None)
+            self._accessed.pop(route, None)
+            self._conn.execute("DELETE FROM responses WHERE route = ?", (route,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._flush_access()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写回缓存访问时间失败: {e}")
+            self._conn.close()
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    获取全局响应缓存，未开启 HTTP_CACHE_ENABLED 时返回 None
+    """
+    global _default_cache
+    if not config.HTTP_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        try:
+            _default_cache = ResponseCache(
+                config.HTTP_CACHE_PATH,
+                default_ttl=config.HTTP_CACHE_TTL,
+                route_ttls=parse_route_ttls(config.HTTP_CACHE_ROUTE_TTLS),
+                stale_seconds=config.HTTP_CACHE_STALE_SECONDS,
+                max_bytes=config.HTTP_CACHE_MAX_MB * 1024 * 1024,
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"初始化响应缓存失败，将直接请求上游: {e}")
+            return None
+    return _default_cache
@@ -1,5 +1,6 @@
 # db/models.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, Numeric, JSON, TIMESTAMP, ARRAY
+from sqlalchemy import Column, Integer, String, Text, DateTime, Numeric, JSON, TIMESTAMP, ARRAY, Float, ForeignKey, \
+    Index, text, Date, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -21,3 +22,202 @@ class DailyHot(Base):
     extra = Column(JSON)
     last_summarized_at = Column(TIMESTAMP)  # 最后一次AI处理时间
     last_embedded_at = Column(TIMESTAMP)  # 最后一次向量化时间
+    category_rank = Column(Integer)  # 在所属分类当前榜单中的热度排名（入库时计算，不在当前榜单时为空）
+    hot_percentile = Column(Float)  # 分类内的归一化热度 (0, 1]，排名第一为 1，用于跨分类比较
+
+
+class AnalysisTask(Base):
+    """
+    AI 分析任务队列
+
+    每条 daily_hot 记录最多对应一个任务。状态流转：
+    pending -(领取)-> leased -(成功)-> done
+                            -(失败)-> pending（按指数退避设置 next_attempt_at）
+                            -(失败次数达上限)-> quarantined
+    租约过期（进程崩溃等）的 leased 任务会被重新放回 pending。
+    """
+    __tablename__ = "analysis_task"
+    id = Column(Integer, primary_key=True)
+    hot_id = Column(Integer, ForeignKey("daily_hot.id", ondelete="CASCADE"), nullable=False, unique=True)
+    state = Column(String(16), nullable=False, default="pending")  # pending / leased / done / quarantined
+    priority = Column(Float, nullable=False, default=0.0)  # 对下一份摘要的预期价值，越大越先处理
+    attempts = Column(Integer, nullable=False, default=0)  # 已领取（尝试）次数
+    next_attempt_at = Column(TIMESTAMP, nullable=False)  # 最早可再次领取的时间
+    lease_expires_at = Column(TIMESTAMP)  # 租约到期时间
+    lease_owner = Column(Text)  # 领取者标识（主机名:进程号）
+    last_error = Column(Text)
+    created_at = Column(TIMESTAMP, nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (
+        # 轮询可执行任务：只索引 pending，按优先级有序扫描，INCLUDE id/hot_id 以便仅索引扫描
+        Index(
+            "ix_analysis_task_ready", priority.desc(), next_attempt_at,
+            postgresql_where=text("state = 'pending'"),
+            postgresql_include=["id", "hot_id"],
+        ),
+        # 回收过期租约
+        Index(
+            "ix_analysis_task_lease", lease_expires_at,
+            postgresql_where=text("state = 'leased'"),
+        ),
+    )
+
+
+class PipelineRun(Base):
+    """
+    每天各阶段（collect / analyze / email）的运行记录，用作断点
+
+    进程中途重启后按 cursor 从断点继续、累加 counters；当天已完成（done）的阶段不再重复执行。
+    """
+    __tablename__ = "pipeline_run"
+    id = Column(Integer, primary_key=True)
+    run_day = Column(Date, nullable=False)  # 运行所属日期
+    stage = Column(String(32), nullable=False)  # 阶段名
+    state = Column(String(16), nullable=False, default="running")  # running / done
+    cursor = Column(JSON)  # 阶段自己的断点信息，如已完成的类目
+    counters = Column(JSON)  # 累计计数（跨重启累加）
+    resumes = Column(Integer, nullable=False, default=0)  # 从断点恢复的次数
+    owner = Column(Text)  # 最近一次执行者标识（主机名:进程号）
+    started_at = Column(TIMESTAMP, nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False)
+    finished_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        UniqueConstraint("run_day", "stage", name="uq_pipeline_run_day_stage"),
+    )
+
+
+# 对已有表的增量结构变更，须保证可重复执行
+SCHEMA_MIGRATIONS = [
+    # 待分析数据（用于生成分析任务）
+    "CREATE INDEX IF NOT EXISTS ix_daily_hot_pending ON daily_hot (collected_at) "
+    "WHERE last_summarized_at IS NULL",
+    # 按标签查询（ai_tags && ARRAY[...]）
+    "CREATE INDEX IF NOT EXISTS ix_daily_hot_ai_tags ON daily_hot USING GIN (ai_tags)",
+    # 入库时预计算的分类内排名与归一化热度
+    "ALTER TABLE daily_hot ADD COLUMN IF NOT EXISTS category_rank INTEGER",
+    "ALTER TABLE daily_hot ADD COLUMN IF NOT EXISTS hot_percentile DOUBLE PRECISION",
+    # 摘要按分类取前 K 名（category = ? ORDER BY category_rank LIMIT K）
+    "CREATE INDEX IF NOT EXISTS ix_daily_hot_category_rank ON daily_hot (category, category_rank) "
+    "WHERE category_rank IS NOT NULL",
+    # 清理过期的已完成任务、统计隔离任务数，均不扫描整张任务表
+    "CREATE INDEX IF NOT EXISTS ix_analysis_task_done ON analysis_task (updated_at) WHERE state = 'done'",
+    "CREATE INDEX IF NOT EXISTS ix_analysis_task_quarantined ON analysis_task (id) WHERE state = 'quarantined'",
+]
+
+
+# 升级后为今天已收集、尚无排名的分类补算一次，之后由每次入库维护
+RANK_BACKFILL_PENDING = (
+    "SELECT 1 FROM daily_hot WHERE collected_at >= current_date AND category_rank IS NULL "
+    "AND hot_score IS NOT NULL AND publish_time IS NOT NULL LIMIT 1"
+)
+RANK_BACKFILL = (
+    "UPDATE daily_hot d SET category_rank = r.category_rank, "
+    "hot_percentile = (r.board_size - r.category_rank + 1)::float / r.board_size "
+    "FROM (SELECT id, rank() OVER (PARTITION BY category ORDER BY hot_score DESC) AS category_rank, "
+    "count(*) OVER (PARTITION BY category) AS board_size FROM daily_hot "
+    "WHERE collected_at >= current_date AND hot_score IS NOT NULL AND publish_time IS NOT NULL) r "
+    "WHERE d.id = r.id AND NOT EXISTS (SELECT 1 FROM daily_hot x "
+    "WHERE x.category = d.category AND x.category_rank IS NOT NULL)"
+)
+
+
+def ensure_schema(engine) -> None:
+    """
+    创建新增的表、索引并执行增量结构变更（可重复执行），今天有尚无排名的数据时补算排名
+
+    :param engine: 数据库引擎
+    """
+    Base.metadata.create_all(engine, tables=[AnalysisTask.__table__, PipelineRun.__table__])
+    with engine.begin() as conn:
+        for ddl in SCHEMA_MIGRATIONS:
+            conn.execute(text(ddl))
+        if conn.execute(text(RANK_BACKFILL_PENDING)).first() is not None:
+            conn.execute(text(RANK_BACKFILL))
+
+
+class HotItem:
+    """
+    精简的热点数据项，用于邮件/展示等只读场景
+
+    只保存展示需要的字段（__slots__，无 ORM 状态），时间字段在访问时才格式化。
+    同时支持 item.title 与 item['title'] 两种访问方式，兼容原有的字典用法。
+    """
+    __slots__ = (
+        'id', 'category', 'title', 'description', 'cover', 'hot_score', 'url', 'mobile_url',
+        'ai_summary', 'ai_tags', 'publish_at', 'collected_time', 'category_rank', 'hot_percentile', 'cover_key',
+    )
+
+    # 加载 HotItem 需要查询的列，顺序与 __init__ 参数一致
+    COLUMNS = (
+        DailyHot.id, DailyHot.category, DailyHot.title, DailyHot.description, DailyHot.cover,
+        DailyHot.hot_score, DailyHot.url, DailyHot.mobile_url, DailyHot.ai_summary, DailyHot.ai_tags,
+        DailyHot.publish_time, DailyHot.collected_at, DailyHot.category_rank, DailyHot.hot_percentile,
+    )
+
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, id, category, title, description, cover, hot_score, url, mobile_url,
+                 ai_summary, ai_tags, publish_at, collected_time, category_rank=None, hot_percentile=None,
+                 cover_key=None):
+        self.id = id
+        self.category = category
+        self.title = title
+        self.description = description
+        self.cover = cover
+        self.hot_score = hot_score
+        self.url = url
+        self.mobile_url = mobile_url
+        self.ai_summary = ai_summary
+        self.ai_tags = ai_tags
+        self.publish_at = publish_at  # datetime，原始值
+        self.collected_time = collected_time  # datetime，原始值
+        self.category_rank = category_rank  # 分类内排名
+        self.hot_percentile = hot_percentile  # 分类内归一化热度
+        self.cover_key = cover_key  # 本地封面缓存的 key，见 cover_images
+
+    @classmethod
+    def from_row(cls, row) -> "HotItem":
+        """
+        由按 COLUMNS 顺序查询得到的行构造
+        """
+        return cls(*row)
+
+    @property
+    def publish_time(self):
+        return self.publish_at.strftime(self.TIME_FORMAT) if self.publish_at else None
+
+    @property
+    def collected_at(self):
+        return self.collected_time.strftime(self.TIME_FORMAT) if self.collected_time else None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'category': self.category,
+            'title': self.title,
+            'description': self.description,
+            'cover': self.cover,
+            'hot_score': self.hot_score,
+            'url': self.url,
+            'mobile_url': self.mobile_url,
+            'publish_time': self.publish_time,
+            'ai_summary': self.ai_summary,
+            'ai_tags': self.ai_tags,
+            'collected_at': self.collected_at,
+            'category_rank': self.category_rank,
+            'hot_percentile': self.hot_percentile,
+        }
+
+    def __repr__(self):
+        return f"HotItem(id={self.id}, category={self.category!r}, title={self.title!r})"
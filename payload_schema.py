@@ -0,0 +1,278 @@
+import json
+import math
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# 优先使用更快的 JSON 解码器：orjson > msgspec > 标准库
+try:
+    import orjson
+
+    JSON_DECODER = "orjson"
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import msgspec
+
+        JSON_DECODER = "msgspec"
+        _loads = msgspec.json.Decoder().decode
+    except ImportError:
+        JSON_DECODER = "json"
+        _loads = json.loads
+
+# 合理的发布时间范围（秒）：1970-01-01 到 2100-12-31
+MAX_TIMESTAMP_SECONDS = 4102444800
+# 大于该值的时间戳按毫秒处理
+MILLISECONDS_THRESHOLD = 1000000000000
+# daily_hot.hot_score 为 Integer（32 位）
+HOT_SCORE_MIN = -2 ** 31
+HOT_SCORE_MAX = 2 ** 31 - 1
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class PayloadError(ValueError):
+    """
+    上游响应的整体结构不符合约定
+    """
+
+
+def loads(data) -> Any:
+    """
+    解析 JSON（bytes 或 str）
+    """
+    return _loads(data)
+
+
+def _count(key: str, n: int = 1) -> None:
+    if n:
+        with _stats_lock:
+            _stats[key] += n
+
+
+def get_parse_stats() -> Dict[str, int]:
+    """
+    进程启动以来的解析计数：accepted、rejected:<原因>、bad_timestamp、bad_payload 等
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+class HotEntry:
+    """
+    校验并规范化后的单条热点（对应 daily_hot 的一行）
+    """
+    __slots__ = ('title', 'description', 'cover', 'hot_score', 'url', 'mobile_url', 'publish_time', 'source_id')
+
+    def __init__(self, title: str, description: Optional[str], cover: Optional[str], hot_score: Optional[int],
+                 url: Optional[str], mobile_url: Optional[str], publish_time: Optional[datetime], source_id=None):
+        self.title = title
+        self.description = description
+        self.cover = cover
+        self.hot_score = hot_score
+        self.url = url
+        self.mobile_url = mobile_url
+        self.publish_time = publish_time
+        self.source_id = source_id  # 上游返回的条目 id，仅用于日志
+
+    def __repr__(self):
+        return f"HotEntry(title={self.title!r}, hot_score={self.hot_score})"
+
+
+class RoutePayload:
+    """
+    单个路由的响应：榜单元信息 + 已校验的条目
+    """
+    __slots__ = ('route', 'name', 'title', 'update_time', 'entries', 'rejected')
+
+    def __init__(self, route: str, name: Optional[str], title: Optional[str], update_time: Optional[str],
+                 entries: List[HotEntry], rejected: int = 0):
+        self.route = route
+        self.name = name
+        self.title = title
+        self.update_time = update_time  # 上游的 updateTime，用于判断榜单是否更新
+        self.entries = entries
+        self.rejected = rejected  # 被丢弃的条目数
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _optional_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = value if isinstance(value, str) else str(value)
+    return value or None
+
+
+def _clamp_hot_score(value: float) -> int:
+    if not math.isfinite(value):
+        raise ValueError(f"热度值不是有限数: {value}")
+    return int(min(max(value, HOT_SCORE_MIN), HOT_SCORE_MAX))
+
+
+def parse_hot_score(value) -> Optional[int]:
+    """
+    热度值统一为整数，兼容数字字符串及 "12.3万"、"1.2亿" 这类写法，无法识别时为 None；
+    超出 daily_hot.hot_score（Integer）范围的截断到边界
+
+    :raises ValueError: 热度值为 inf/nan（整条数据应丢弃）
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return min(max(value, HOT_SCORE_MIN), HOT_SCORE_MAX)
+    if isinstance(value, float):
+        return _clamp_hot_score(value)
+    if isinstance(value, str):
+        text = value.strip().replace(",", "")
+        scale = 1
+        if text.endswith("万"):
+            text, scale = text[:-1], 10000
+        elif text.endswith("亿"):
+            text, scale = text[:-1], 100000000
+        try:
+            number = float(text) * scale
+        except ValueError:
+            return None
+        return _clamp_hot_score(number)
+    return None
+
+
+def normalize_timestamps(values: List[Any]) -> List[Optional[datetime]]:
+    """
+    批量规范化一批条目的时间戳：自动区分毫秒/秒，超出合理范围或无法解析的为 None
+
+    :param values: 原始 timestamp 列表（int / 数字字符串 / None）
+    :return: 与输入一一对应的 datetime 列表
+    """
+    seconds = []
+    bad = 0
+    for value in values:
+        if value is None or value == "" or isinstance(value, bool):
+            seconds.append(None)
+            continue
+        try:
+            ts = int(value)
+        except (TypeError, ValueError):
+            bad += 1
+            seconds.append(None)
+            continue
+        if ts > MILLISECONDS_THRESHOLD:
+            ts /= 1000
+        if 0 <= ts <= MAX_TIMESTAMP_SECONDS:
+            seconds.append(ts)
+        else:
+            bad += 1
+            seconds.append(None)
+
+    result = []
+    for ts in seconds:
+        if ts is None:
+            result.append(None)
+            continue
+        try:
+            result.append(datetime.fromtimestamp(ts))
+        except (OSError, OverflowError, ValueError):
+            bad += 1
+            result.append(None)
+    _count("bad_timestamp", bad)
+    return result
+
+
+def parse_entries(items: List[Any]) -> Tuple[List[HotEntry], int]:
+    """
+    校验一批原始条目
+
+    :param items: 上游 data 数组
+    :return: (有效条目, 丢弃条数)
+    """
+    valid, scores = [], []
+    reasons = Counter()
+    for item in items:
+        if not isinstance(item, dict):
+            reasons["not_object"] += 1
+            continue
+        title = item.get("title")
+        if title is None or (isinstance(title, str) and not title.strip()):
+            reasons["missing_title"] += 1
+            continue
+        try:
+            score = parse_hot_score(item.get("hot"))
+        except (ValueError, OverflowError):
+            reasons["bad_hot"] += 1
+            continue
+        valid.append(item)
+        scores.append(score)
+
+    times = normalize_timestamps([item.get("timestamp") for item in valid])
+    entries = [
+        HotEntry(
+            title=item["title"] if isinstance(item["title"], str) else str(item["title"]),
+            description=_optional_str(item.get("desc")),
+            cover=_optional_str(item.get("cover")),
+            hot_score=hot_score,
+            url=_optional_str(item.get("url")),
+            mobile_url=_optional_str(item.get("mobileUrl")),
+            publish_time=publish_time,
+            source_id=item.get("id"),
+        )
+        for item, hot_score, publish_time in zip(valid, scores, times)
+    ]
+
+    _count("accepted", len(entries))
+    for reason, n in reasons.items():
+        _count(f"rejected:{reason}", n)
+    return entries, sum(reasons.values())
+
+
+def parse_route_payload(data: Any, route: str) -> RoutePayload:
+    """
+    校验单个路由的响应（get_hot_list 的返回值）
+
+    :param data: 解析后的 JSON
+    :param route: 路由路径
+    :raises PayloadError: 整体结构不符合约定
+    """
+    if not isinstance(data, dict):
+        _count("bad_payload")
+        raise PayloadError(f"{route}: 响应不是对象")
+    items = data.get("data")
+    if items is None:
+        items = []
+    if not isinstance(items, list):
+        _count("bad_payload")
+        raise PayloadError(f"{route}: data 不是数组")
+
+    entries, rejected = parse_entries(items)
+    if rejected:
+        logger.warning(f"{route} 有 {rejected} 条数据不符合格式，已丢弃")
+    update_time = data.get("updateTime")
+    return RoutePayload(route, _optional_str(data.get("name")), _optional_str(data.get("title")),
+                        str(update_time) if update_time is not None else None, entries, rejected)
+
+
+def parse_categories(data: Any) -> List[Dict[str, str]]:
+    """
+    校验 /all 的响应，返回 [{"name": ..., "path": ...}]，缺少 name/path 的路由被丢弃
+
+    :raises PayloadError: 整体结构不符合约定
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("routes", []), list):
+        _count("bad_payload")
+        raise PayloadError("/all: 响应结构不正确")
+
+    routes = []
+    rejected = 0
+    for route in data.get("routes", []):
+        if isinstance(route, dict) and isinstance(route.get("name"), str) and isinstance(route.get("path"), str):
+            path = route["path"] if route["path"].startswith("/") else f"/{route['path']}"
+            routes.append({"name": route["name"], "path": path})
+        else:
+            rejected += 1
+    _count("rejected:route", rejected)
+    return routes
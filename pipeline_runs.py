@@ -0,0 +1,135 @@
+import threading
+from datetime import datetime, date
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from sqlalchemy.dialects.postgresql import insert
+
+import config
+from analysis_queue import worker_id
+from models import PipelineRun
+
+RUNNING = "running"
+DONE = "done"
+
+# 本进程已开始过的 (日期, 阶段)，用于区分"进程重启后的恢复"与"同一进程内的再次执行"
+_begun = set()
+_begun_lock = threading.Lock()
+
+
+class StageRun:
+    """
+    一个阶段当天的运行记录
+
+    - cursor 由阶段自己维护（例如已完成的类目），save() 时整体写回
+    - counters 跨重启累加：add() 累加增量，record() 记录本进程内的累计值（与断点处的计数相加），
+      两者都只修改内存，save() 时写回
+    - resumed 为 True 表示上一次运行中途退出（进程重启），本次从断点继续
+    - 关闭 PIPELINE_CHECKPOINT_ENABLED 时 id 为 None，save()/finish() 不访问数据库
+    """
+    __slots__ = ('id', 'stage', 'run_day', 'cursor', 'counters', 'resumed', 'previous_owner', '_base')
+
+    def __init__(self, id: Optional[int], stage: str, run_day: date, cursor: Optional[Dict[str, Any]] = None,
+                 counters: Optional[Dict[str, int]] = None, resumed: bool = False,
+                 previous_owner: Optional[str] = None):
+        self.id = id
+        self.stage = stage
+        self.run_day = run_day
+        self.cursor = dict(cursor or {})
+        self.counters = dict(counters or {})
+        self.resumed = resumed
+        self.previous_owner = previous_owner  # 中断的那次运行的执行者
+        self._base = dict(self.counters)
+
+    def add(self, **deltas: int) -> None:
+        for key, n in deltas.items():
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def record(self, **totals: int) -> None:
+        for key, n in totals.items():
+            self.counters[key] = self._base.get(key, 0) + n
+
+    def _write(self, **values) -> None:
+        if self.id is None:
+            return
+        from database import session_scope
+
+        values.update(cursor=dict(self.cursor), counters=dict(self.counters), updated_at=datetime.now())
+        with session_scope() as session:
+            session.query(PipelineRun).filter(PipelineRun.id == self.id).update(values, synchronize_session=False)
+
+    def save(self) -> None:
+        """
+        写回断点与计数
+        """
+        try:
+            self._write()
+        except Exception as e:
+            # 断点写入失败不影响阶段本身，最多在重启后多做一些工作
+            logger.warning(f"保存【{self.stage}】断点失败: {e}")
+
+    def finish(self) -> None:
+        """
+        标记当天该阶段已完成
+        """
+        try:
+            self._write(state=DONE, finished_at=datetime.now())
+        except Exception as e:
+            logger.warning(f"标记【{self.stage}】完成失败: {e}")
+        logger.info(f"【{self.stage}】当天累计: {self.counters}")
+
+
+def begin_stage(stage: str, force: bool = False, now: Optional[datetime] = None,
+                checkpoint: bool = True) -> Optional[StageRun]:
+    """
+    开始（或从断点继续）某阶段当天的运行
+
+    :param stage: 阶段名
+    :param force: 当天已完成时是否重新执行（断点与计数清零）
+    :param now: 当前时间
+    :param checkpoint: 为 False 时不读写当天的运行记录（如启动验证），相当于关闭 PIPELINE_CHECKPOINT_ENABLED
+    :return: 运行记录；当天已完成且未指定 force 时返回 None，调用方应跳过该阶段
+    """
+    now = now or datetime.now()
+    day = now.date()
+    if not checkpoint or not config.PIPELINE_CHECKPOINT_ENABLED:
+        return StageRun(None, stage, day)
+
+    from database import ensure_schema_once, session_scope
+
+    ensure_schema_once()
+    owner = worker_id()
+    with _begun_lock:
+        first_in_process = (day, stage) not in _begun
+        _begun.add((day, stage))
+
+    with session_scope() as session:
+        inserted = session.execute(insert(PipelineRun).values(
+            run_day=day, stage=stage, state=RUNNING, cursor={}, counters={}, resumes=0,
+            owner=owner, started_at=now, updated_at=now,
+        ).on_conflict_do_nothing(constraint="uq_pipeline_run_day_stage").returning(PipelineRun.id)).first() is not None
+        row = session.query(PipelineRun).filter(
+            PipelineRun.run_day == day, PipelineRun.stage == stage
+        ).with_for_update().one()
+
+        if row.state == DONE and not force:
+            logger.info(f"【{stage}】今天已于 {row.finished_at:%H:%M:%S} 完成，跳过（累计: {row.counters}）")
+            return None
+
+        previous_owner = row.owner
+        fresh = inserted or row.state == DONE
+        # 记录为 running、且不是本进程开始的：上一次运行中途退出，从断点继续
+        resumed = not fresh and first_in_process
+        if fresh:
+            row.cursor, row.counters, row.resumes = {}, {}, 0
+            row.started_at, row.finished_at = now, None
+        elif resumed:
+            row.resumes += 1
+        row.state = RUNNING
+        row.owner = owner
+        row.updated_at = now
+        run = StageRun(row.id, stage, day, row.cursor, row.counters, resumed, previous_owner)
+
+    if resumed:
+        logger.warning(f"【{stage}】上次运行（{previous_owner}）未完成，从断点继续，已累计: {run.counters}")
+    return run
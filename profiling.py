@@ -0,0 +1,413 @@
+import cProfile
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from loguru import logger
+
+import config
+
+_local = threading.local()
+_cprofile_lock = threading.Lock()
+
+
+def profile_mode() -> Optional[str]:
+    """
+    当前的性能剖析模式：None（关闭）、"sample"（采样）或 "cprofile"（cProfile + 采样）
+    """
+    mode = (config.PROFILE_JOBS or "").strip().lower()
+    if mode in ("", "false", "0", "off", "none"):
+        return None
+    if mode in ("cprofile", "profile"):
+        return "cprofile"
+    return "sample"
+
+
+class StackSampler:
+    """
+    定时采样指定线程的调用栈，汇总为 collapsed stack（可直接交给 flamegraph.pl / speedscope）
+
+    阶段在线程池中执行的部分（见 bind_run）运行期间也会加入采样
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        """
+        :param thread_id: 被采样线程的 ident
+        :param interval: 采样间隔（秒）
+        """
+        self.thread_id = thread_id
+        self.thread_ids = {thread_id}
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sampler-{thread_id}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def add_thread(self, thread_id: int) -> None:
+        self.thread_ids = self.thread_ids | {thread_id}
+
+    def remove_thread(self, thread_id: int) -> None:
+        if thread_id != self.thread_id:
+            self.thread_ids = self.thread_ids - {thread_id}
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileRun:
+    """
+    单次阶段运行的剖析记录：span 耗时、采样调用栈，以及可选的 cProfile 数据
+    """
+
+    def __init__(self, stage: str, mode: str, output_dir: Optional[str] = None):
+        """
+        :param stage: 阶段名称
+        :param mode: "sample" 或 "cprofile"
+        :param output_dir: 输出目录，默认 PROFILE_DIR
+        """
+        self.stage = stage
+        self.mode = mode
+        self.output_dir = output_dir or config.PROFILE_DIR
+        self.started_at = datetime.now()
+        self.run_id = f"{self.started_at:%Y%m%d-%H%M%S}-{stage}-{os.getpid()}"
+        self.spans: List[Dict[str, Any]] = []
+        self.duration = 0.0
+        self._start = 0.0
+        self._sampler: Optional[StackSampler] = None
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def record(self, name: str, duration: float, category: Optional[str], item_id: Any) -> None:
+        self.spans.append({
+            "name": name,
+            "category": category,
+            "item_id": item_id,
+            "start": round(time.perf_counter() - self._start - duration, 6),
+            "duration": round(duration, 6),
+        })
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        self._sampler = StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        self._sampler.start()
+        if self.mode == "cprofile":
+            # 同一时刻只能有一个 cProfile 生效，并发的阶段只做采样
+            if _cprofile_lock.acquire(blocking=False):
+                self._profiler = cProfile.Profile()
+                try:
+                    self._profiler.enable()
+                except ValueError:
+                    self._profiler = None
+                    _cprofile_lock.release()
+            if self._profiler is None:
+                logger.warning(f"【{self.stage}】已有 cProfile 在运行，本次只做采样")
+
+    def stop(self) -> None:
+        if self._profiler is not None:
+            self._profiler.disable()
+            _cprofile_lock.release()
+        self._sampler.stop()
+        self.duration = time.perf_counter() - self._start
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        按 span 名称、以及 span 名称 + 分类汇总耗时
+        """
+        by_name: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+        by_category: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+        for span in self.spans:
+            keys = [(by_name, span["name"])]
+            if span["category"]:
+                keys.append((by_category, f"{span['name']}|{span['category']}"))
+            for table, key in keys:
+                entry = table[key]
+                entry["count"] += 1
+                entry["total"] += span["duration"]
+                entry["max"] = max(entry["max"], span["duration"])
+        return {"by_name": dict(by_name), "by_category": dict(by_category)}
+
+    def save(self) -> str:
+        """
+        写出 {run_id}.json（span 记录）、{run_id}.collapsed（采样调用栈）以及 cProfile 模式下的 {run_id}.prof
+
+        :return: span 记录文件路径
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.run_id)
+        self._sampler.write_collapsed(f"{base}.collapsed")
+        if self._profiler is not None:
+            self._profiler.dump_stats(f"{base}.prof")
+
+        data = {
+            "run_id": self.run_id,
+            "stage": self.stage,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(),
+            "duration": round(self.duration, 6),
+            "samples": self._sampler.samples,
+            "summary": self.summary(),
+            "spans": self.spans,
+        }
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        return f"{base}.json"
+
+
+class span:
+    """
+    记录一段耗时，仅在当前线程处于剖析中的阶段时生效，否则几乎没有开销
+
+    用法: with span("fetch", category="/weibo"): ...
+    """
+    __slots__ = ("name", "category", "item_id", "_run", "_start")
+
+    def __init__(self, name: str, category: Optional[str] = None, item_id: Any = None):
+        self.name = name
+        self.category = category
+        self.item_id = item_id
+
+    def __enter__(self):
+        self._run = getattr(_local, "run", None)
+        if self._run is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._run is not None:
+            self._run.record(self.name, time.perf_counter() - self._start, self.category, self.item_id)
+        return False
+
+
+def current_run() -> Optional[ProfileRun]:
+    """
+    当前线程所属的剖析记录（未在剖析中时为 None），用于传给阶段内部创建的工作线程
+    """
+    return getattr(_local, "run", None)
+
+
+class bind_run:
+    """
+    让工作线程加入调用方的剖析记录：span 记录到该次运行，线程调用栈一并采样
+
+    用法: run = current_run(); pool.submit(lambda: ... with bind_run(run): ...)
+    """
+    __slots__ = ("run", "_bound")
+
+    def __init__(self, run: Optional[ProfileRun]):
+        self.run = run
+        self._bound = False
+
+    def __enter__(self):
+        if self.run is not None and getattr(_local, "run", None) is None:
+            _local.run = self.run
+            if self.run._sampler is not None:
+                self.run._sampler.add_thread(threading.get_ident())
+            self._bound = True
+        return self.run
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._bound:
+            _local.run = None
+            if self.run._sampler is not None:
+                self.run._sampler.remove_thread(threading.get_ident())
+            self._bound = False
+        return False
+
+
+class profile_stage:
+    """
+    在开启 PROFILE_JOBS 时对一次阶段运行做剖析，结束后写出剖析文件；未开启时不做任何事
+
+    用法: with profile_stage("数据收集"): collect_daily_hot_data()
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.run: Optional[ProfileRun] = None
+
+    def __enter__(self):
+        mode = profile_mode()
+        if mode is None or getattr(_local, "run", None) is not None:
+            return None
+        self.run = ProfileRun(self.stage, mode)
+        self.run.start()
+        _local.run = self.run
+        return self.run
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.run is None:
+            return False
+        _local.run = None
+        self.run.stop()
+        try:
+            path = self.run.save()
+            logger.info(f"【{self.stage}】剖析数据已写入: {path}（耗时 {self.run.duration:.2f}s，"
+                        f"{len(self.run.spans)} 个 span）")
+        except OSError as e:
+            logger.warning(f"写入剖析数据失败: {e}")
+        return False
+
+
+def list_runs(output_dir: Optional[str] = None, stage: Optional[str] = None) -> List[str]:
+    """
+    按时间顺序列出剖析记录文件
+
+    :param output_dir: 剖析输出目录
+    :param stage: 只列出指定阶段
+    """
+    output_dir = output_dir or config.PROFILE_DIR
+    paths = sorted(glob.glob(os.path.join(output_dir, "*.json")))
+    if stage:
+        paths = [p for p in paths if os.path.basename(p).split("-", 2)[-1].rsplit("-", 1)[0] == stage]
+    return paths
+
+
+def load_run(path_or_id: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    读取剖析记录，参数可以是文件路径或 run_id
+    """
+    path = path_or_id
+    if not os.path.exists(path):
+        path = os.path.join(output_dir or config.PROFILE_DIR, f"{path_or_id}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["path"] = path
+    return data
+
+
+def _leaf_shares(run: Dict[str, Any]) -> Dict[str, float]:
+    """
+    各函数作为栈顶（自身耗时）的采样占比
+    """
+    path = f"{os.path.splitext(run['path'])[0]}.collapsed"
+    leaves: Counter = Counter()
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            leaves[stack.rsplit(";", 1)[-1]] += int(count)
+    total = sum(leaves.values()) or 1
+    return {name: count / total for name, count in leaves.items()}
+
+
+def diff_runs(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.2,
+              min_seconds: float = 0.01) -> List[Dict[str, Any]]:
+    """
+    比较两次运行的 span 耗时，找出变慢的部分
+
+    :param base: 基准运行（load_run 的结果）
+    :param head: 对比运行
+    :param threshold: 平均耗时增长超过该比例视为退化
+    :param min_seconds: 总耗时变化小于该值的忽略
+    :return: 各 span（及 span|分类）的对比结果，按总耗时变化从大到小排列
+    """
+    rows = []
+    for table in ("by_name", "by_category"):
+        old, new = base["summary"][table], head["summary"][table]
+        for key in set(old) | set(new):
+            a = old.get(key, {"count": 0, "total": 0.0})
+            b = new.get(key, {"count": 0, "total": 0.0})
+            mean_a = a["total"] / a["count"] if a["count"] else 0.0
+            mean_b = b["total"] / b["count"] if b["count"] else 0.0
+            delta = b["total"] - a["total"]
+            change = (mean_b - mean_a) / mean_a if mean_a else None
+            rows.append({
+                "key": key,
+                "count": (a["count"], b["count"]),
+                "total": (a["total"], b["total"]),
+                "mean": (mean_a, mean_b),
+                "delta": delta,
+                "change": change,
+                "regression": abs(delta) >= min_seconds and delta > 0 and (change is None or change > threshold),
+            })
+
+    old_leaves, new_leaves = _leaf_shares(base), _leaf_shares(head)
+    for name in set(old_leaves) | set(new_leaves):
+        a, b = old_leaves.get(name, 0.0), new_leaves.get(name, 0.0)
+        # 自身耗时占比 × 总耗时，近似该函数的自身耗时
+        seconds_a, seconds_b = a * base["duration"], b * head["duration"]
+        delta = seconds_b - seconds_a
+        if abs(delta) < min_seconds:
+            continue
+        rows.append({
+            "key": f"self|{name}",
+            "count": (None, None),
+            "total": (seconds_a, seconds_b),
+            "mean": (seconds_a, seconds_b),
+            "delta": delta,
+            "change": (seconds_b - seconds_a) / seconds_a if seconds_a else None,
+            "regression": delta > 0 and (not seconds_a or delta / seconds_a > threshold),
+        })
+
+    rows.sort(key=lambda r: r["delta"], reverse=True)
+    return rows
+
+
+def print_diff(base: Dict[str, Any], head: Dict[str, Any], rows: List[Dict[str, Any]], limit: int = 30) -> int:
+    """
+    输出对比结果
+
+    :return: 退化项数量
+    """
+    logger.info(f"基准: {base['run_id']}（{base['duration']:.2f}s） 对比: {head['run_id']}（{head['duration']:.2f}s）")
+    regressions = [r for r in rows if r["regression"]]
+    for row in (regressions or rows)[:limit]:
+        change = f"{row['change'] * 100:+.0f}%" if row["change"] is not None else "新增"
+        flag = "退化" if row["regression"] else "    "
+        logger.info(f"{flag} {row['key']}: 总耗时 {row['total'][0]:.3f}s -> {row['total'][1]:.3f}s "
+                    f"（{row['delta']:+.3f}s），平均 {change}")
+    logger.info(f"共 {len(regressions)} 项退化")
+    return len(regressions)
+
+
+def latest_pair(stage: Optional[str] = None, output_dir: Optional[str] = None) -> Tuple[str, str]:
+    """
+    取同一阶段最近的两次运行；未指定阶段时使用最新一次运行所属的阶段
+    """
+    paths = list_runs(output_dir)
+    if not paths:
+        raise FileNotFoundError("没有找到剖析记录")
+    if stage is None:
+        stage = load_run(paths[-1])["stage"]
+    paths = list_runs(output_dir, stage)
+    if len(paths) < 2:
+        raise FileNotFoundError(f"阶段【{stage}】的剖析记录不足两次")
+    return paths[-2], paths[-1]
+
+
+def profiled(stage: str, fn, *args, **kwargs):
+    """
+    在 profile_stage 中调用 fn（供线程池执行阶段函数使用）
+    """
+    with profile_stage(stage):
+        return fn(*args, **kwargs)
@@ -0,0 +1,263 @@
+import gzip
+import json
+import mmap
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+
+from loguru import logger
+
+import config
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖，缺失时退回 gzip
+    zstandard = None
+
+
+class RawCaptureStore:
+    """
+    原始响应采集存储
+
+    将每次路由请求的原始响应体压缩后追加写入分段文件（segment），
+    并为每条记录在同名 .idx 文件中追加一行偏移索引。
+
+    - 每条记录独立压缩为一个 gzip member / zstd frame，整个分段文件仍可直接用 zcat/zstdcat 解压
+    - 读取单条记录时通过 mmap 定位偏移，只解压该条记录，不需要解压整天的数据
+    - 分段按天切分，单个分段超过 max_segment_bytes 时滚动到下一个分段
+    """
+
+    def __init__(self, base_dir: str, max_segment_bytes: int = 64 * 1024 * 1024,
+                 codec: Optional[str] = None, level: Optional[int] = None):
+        """
+        初始化采集存储
+
+        :param base_dir: 分段文件存放目录
+        :param max_segment_bytes: 单个分段文件的最大字节数
+        :param codec: 压缩算法，"zstd" 或 "gzip"，默认优先使用 zstd
+        :param level: 压缩级别，默认使用偏向速度的级别
+        """
+        if codec is None:
+            codec = "zstd" if zstandard is not None else "gzip"
+        if codec == "zstd" and zstandard is None:
+            logger.warning("未安装 zstandard，原始响应采集改用 gzip 压缩")
+            codec = "gzip"
+        if codec not in ("zstd", "gzip"):
+            raise ValueError(f"不支持的压缩算法: {codec}")
+
+        self.base_dir = base_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.codec = codec
+        self.level = level if level is not None else (3 if codec == "zstd" else 1)
+        self._compressor = zstandard.ZstdCompressor(level=self.level) if codec == "zstd" else None
+        self._lock = threading.Lock()
+        self._segment_path: Optional[str] = None
+        self._segment_file = None
+        self._index_file = None
+        self._segment_day: Optional[str] = None
+        os.makedirs(base_dir, exist_ok=True)
+
+    @property
+    def _suffix(self) -> str:
+        return ".zst" if self.codec == "zstd" else ".gz"
+
+    def _compress(self, data: bytes) -> bytes:
+        if self._compressor is not None:
+            return self._compressor.compress(data)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("读取 zstd 分段需要安装 zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def _open_segment(self, day: str) -> None:
+        """
+        打开当天可写入的分段文件，已存在且未写满的分段会继续追加
+        """
+        self._close_segment()
+        seq = 0
+        while True:
+            path = os.path.join(self.base_dir, f"{day}-{seq:04d}{self._suffix}")
+            if not os.path.exists(path) or os.path.getsize(path) < self.max_segment_bytes:
+                break
+            seq += 1
+
+        self._segment_path = path
+        self._segment_file = open(path, "ab")
+        self._index_file = open(os.path.splitext(path)[0] + ".idx", "a", encoding="utf-8")
+        self._segment_day = day
+
+    def _close_segment(self) -> None:
+        for f in (self._segment_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._segment_file = None
+        self._index_file = None
+        self._segment_path = None
+        self._segment_day = None
+
+    def append(self, route: str, payload: bytes, fetch_time: Optional[datetime] = None,
+               status: Optional[int] = None) -> Dict[str, Any]:
+        """
+        追加一条原始响应
+
+        :param route: 路由路径（例如: "/36kr"）
+        :param payload: 原始响应体
+        :param fetch_time: 抓取时间，默认为当前时间
+        :param status: HTTP 状态码
+        :return: 该条记录的索引项
+        """
+        fetch_time = fetch_time or datetime.now()
+        day = fetch_time.strftime("%Y%m%d")
+        compressed = self._compress(payload)
+
+        with self._lock:
+            if (self._segment_file is None or self._segment_day != day
+                    or self._segment_file.tell() >= self.max_segment_bytes):
+                self._open_segment(day)
+
+            offset = self._segment_file.tell()
+            self._segment_file.write(compressed)
+            self._segment_file.flush()
+
+            entry = {
+                "route": route,
+                "fetch_time": fetch_time.isoformat(),
+                "segment": os.path.basename(self._segment_path),
+                "offset": offset,
+                "length": len(compressed),
+                "raw_length": len(payload),
+                "codec": self.codec,
+                "status": status,
+            }
+            self._index_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index_file.flush()
+
+        return entry
+
+    def close(self) -> None:
+        """
+        关闭当前打开的分段文件
+        """
+        with self._lock:
+            self._close_segment()
+
+    def iter_index(self, day: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        遍历索引项
+
+        :param day: 只遍历某一天的索引（格式: YYYYMMDD），为 None 时遍历全部
+        :return: 索引项迭代器
+        """
+        for name in sorted(os.listdir(self.base_dir)):
+            if not name.endswith(".idx"):
+                continue
+            if day and not name.startswith(day):
+                continue
+            with open(os.path.join(self.base_dir, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程异常退出时最后一行可能不完整
+                        logger.warning(f"跳过损坏的索引行: {name}")
+
+    def find(self, route: str, day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        查找某个路由的全部采集记录
+
+        :param route: 路由路径
+        :param day: 限定日期（格式: YYYYMMDD）
+        :return: 按抓取时间排序的索引项列表
+        """
+        return [entry for entry in self.iter_index(day) if entry["route"] == route]
+
+    def read(self, entry: Dict[str, Any]) -> bytes:
+        """
+        根据索引项读取并解压单条原始响应
+
+        :param entry: iter_index/find/append 返回的索引项
+        :return: 原始响应体
+        """
+        path = os.path.join(self.base_dir, entry["segment"])
+        offset, length = entry["offset"], entry["length"]
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if offset + length > len(mm):
+                    raise ValueError(f"索引超出分段范围: {entry['segment']}@{offset}")
+                compressed = mm[offset:offset + length]
+        return self._decompress(compressed, entry.get("codec", self.codec))
+
+    def read_at(self, route: str, fetch_time: str) -> Optional[bytes]:
+        """
+        按 (route, fetch_time) 读取单条原始响应
+
+        :param route: 路由路径
+        :param fetch_time: 抓取时间（ISO 格式，与索引中的值一致）
+        :return: 原始响应体，不存在时返回 None
+        """
+        day = fetch_time[:10].replace("-", "")
+        for entry in self.iter_index(day):
+            if entry["route"] == route and entry["fetch_time"] == fetch_time:
+                return self.read(entry)
+        return None
+
+
+_default_store: Optional[RawCaptureStore] = None
+
+
+def get_capture_store() -> Optional[RawCaptureStore]:
+    """
+    获取全局采集存储，未开启 RAW_CAPTURE_ENABLED 时返回 None
+    """
+    global _default_store
+
+    if not config.RAW_CAPTURE_ENABLED:
+        return None
+    if _default_store is None:
+        _default_store = RawCaptureStore(
+            config.RAW_CAPTURE_DIR,
+            max_segment_bytes=config.RAW_CAPTURE_SEGMENT_MB * 1024 * 1024,
+            codec=config.RAW_CAPTURE_CODEC or None,
+        )
+    return _default_store
+
+
+def main():
+    """
+    主函数，用于查看和导出采集到的原始响应
+    """
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="查看原始响应采集记录")
+    parser.add_argument("route", nargs="?", help="路由路径，例如 /36kr")
+    parser.add_argument("--day", help="日期，格式 YYYYMMDD")
+    parser.add_argument("--fetch-time", help="输出指定抓取时间的原始响应")
+    args = parser.parse_args()
+
+    store = RawCaptureStore(config.RAW_CAPTURE_DIR)
+    if args.route and args.fetch_time:
+        payload = store.read_at(args.route, args.fetch_time)
+        if payload is None:
+            print("未找到对应记录")
+            return
+        sys.stdout.buffer.write(payload)
+        return
+
+    for entry in store.iter_index(args.day):
+        if args.route and entry["route"] != args.route:
+            continue
+        print(f"{entry['fetch_time']}  {entry['route']}  {entry['raw_length']}B -> {entry['length']}B")
+
+
+if __name__ == "__main__":
+    main()
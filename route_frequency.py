@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from loguru import logger
+
+import config
+from payload_schema import RoutePayload
+
+
+class RouteState:
+    """
+    单个路由的采集状态
+    """
+    __slots__ = ('name', 'path', 'interval', 'next_due', 'last_hash', 'last_update_time',
+                 'last_fetched_at', 'last_saved_day', 'checks', 'changes', 'change_rate')
+
+    def __init__(self, name: str, path: str, interval: float, next_due: float = 0.0,
+                 last_hash: Optional[str] = None, last_update_time: Optional[str] = None,
+                 last_fetched_at: Optional[float] = None, last_saved_day: Optional[str] = None,
+                 checks: int = 0, changes: int = 0, change_rate: float = 0.5):
+        self.name = name
+        self.path = path
+        self.interval = interval  # 当前采集间隔（秒）
+        self.next_due = next_due  # 下次应采集的时间（epoch 秒）
+        self.last_hash = last_hash  # 上次榜单内容的哈希
+        self.last_update_time = last_update_time  # 上次响应中的 updateTime
+        self.last_fetched_at = last_fetched_at
+        self.last_saved_day = last_saved_day  # 最近一次写库的日期（YYYY-MM-DD）
+        self.checks = checks
+        self.changes = changes
+        self.change_rate = change_rate  # 榜单变化率的指数滑动平均
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RouteState":
+        return cls(**{k: v for k, v in data.items() if k in cls.__slots__})
+
+
+def payload_fingerprint(payload: RoutePayload) -> str:
+    """
+    计算榜单内容指纹，只考虑条目的标题/链接及其顺序，忽略每次请求都会变化的字段
+
+    :param payload: get_route_payload 返回的数据
+    :return: 十六进制哈希
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for entry in payload.entries:
+        digest.update(entry.title.encode('utf-8'))
+        digest.update(b'\x1f')
+        digest.update((entry.url or '').encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+class RouteFrequencyTracker:
+    """
+    按路由自适应调整采集频率
+
+    - 每次采集后比较 updateTime 与榜单内容哈希判断是否发生变化
+    - 有变化则缩短间隔（减半），无变化则拉长间隔（×1.5），限制在 [min_interval, max_interval]
+    - 全局请求预算：滚动一小时内最多发起 request_budget 次请求，超出预算的路由顺延到下一轮，
+      同一轮内优先采集逾期比例最高的路由
+    - 状态持久化到 JSON 文件，重启后沿用已学习到的间隔
+    """
+
+    ALPHA = 0.3  # 变化率滑动平均系数
+    SPEED_UP = 0.5
+    SLOW_DOWN = 1.5
+    ROUTES_REFRESH_SECONDS = 24 * 3600
+
+    def __init__(self, state_path: Optional[str] = None, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, initial_interval: Optional[float] = None,
+                 request_budget: Optional[int] = None):
+        """
+        :param state_path: 状态文件路径
+        :param min_interval: 最短采集间隔（秒）
+        :param max_interval: 最长采集间隔（秒）
+        :param initial_interval: 新路由的初始采集间隔（秒）
+        :param request_budget: 每小时最多请求次数
+        """
+        self.state_path = state_path or config.ADAPTIVE_STATE_PATH
+        self.min_interval = min_interval or config.ADAPTIVE_MIN_INTERVAL
+        self.max_interval = max_interval or config.ADAPTIVE_MAX_INTERVAL
+        self.initial_interval = initial_interval or config.ADAPTIVE_INITIAL_INTERVAL
+        self.request_budget = request_budget or config.ADAPTIVE_REQUEST_BUDGET
+        self.routes: Dict[str, RouteState] = {}
+        self.routes_synced_at = 0.0
+        self._requests = deque()
+        self._lock = threading.Lock()
+        self.load()
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def load(self) -> None:
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.routes = {path: RouteState.from_dict(item) for path, item in data.get("routes", {}).items()}
+            self.routes_synced_at = data.get("routes_synced_at", 0.0)
+            now = time.time()
+            self._requests = deque(t for t in data.get("requests", []) if now - t < 3600)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"读取路由采集状态失败，将重新学习: {e}")
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                "routes": {path: state.to_dict() for path, state in self.routes.items()},
+                "routes_synced_at": self.routes_synced_at,
+                "requests": list(self._requests),
+            }
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def needs_route_refresh(self, now: Optional[float] = None) -> bool:
+        now = now or time.time()
+        return not self.routes or now - self.routes_synced_at >= self.ROUTES_REFRESH_SECONDS
+
+    def sync_routes(self, categories: List[Dict[str, str]], now: Optional[float] = None) -> None:
+        """
+        同步类目列表：新增的路由立即到期，已下线的路由移除
+
+        :param categories: get_all_categories 返回的类目列表
+        """
+        now = now or time.time()
+        if not categories:
+            return
+        with self._lock:
+            seen = set()
+            for category in categories:
+                path, name = category.get('path'), category.get('name')
+                if not path or not name:
+                    continue
+                seen.add(path)
+                if path not in self.routes:
+                    self.routes[path] = RouteState(name, path, self._clamp(self.initial_interval), next_due=now)
+                else:
+                    self.routes[path].name = name
+            for path in list(self.routes):
+                if path not in seen:
+                    del self.routes[path]
+            self.routes_synced_at = now
+
+    def remaining_budget(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        while self._requests and now - self._requests[0] >= 3600:
+            self._requests.popleft()
+        return max(0, self.request_budget - len(self._requests))
+
+    def record_request(self, now: Optional[float] = None) -> None:
+        """
+        记录一次不属于具体路由的请求（如刷新类目列表的 /all），同样计入请求预算
+        """
+        with self._lock:
+            self._requests.append(now or time.time())
+
+    def due_routes(self, now: Optional[float] = None) -> List[RouteState]:
+        """
+        返回本轮应采集的路由，按逾期比例从高到低排列，并受剩余请求预算限制
+        """
+        now = now or time.time()
+        with self._lock:
+            due = [state for state in self.routes.values() if state.next_due <= now]
+            due.sort(key=lambda s: (now - s.next_due) / s.interval, reverse=True)
+            budget = self.remaining_budget(now)
+        if len(due) > budget:
+            logger.info(f"请求预算不足：{len(due)} 个路由到期，本轮只采集 {budget} 个")
+        return due[:budget]
+
+    def observe(self, path: str, payload: Optional[RoutePayload], now: Optional[float] = None) -> bool:
+        """
+        记录一次采集结果并调整该路由的采集间隔
+
+        :param path: 路由路径
+        :param payload: 采集到的数据，失败时为 None
+        :return: 榜单是否发生变化
+        """
+        now = now or time.time()
+        with self._lock:
+            self._requests.append(now)
+            state = self.routes.get(path)
+            if state is None:
+                return payload is not None
+            state.last_fetched_at = now
+
+            if payload is None:
+                # 请求失败不调整间隔，稍后按当前间隔重试
+                state.next_due = now + state.interval
+                return False
+
+            update_time = payload.update_time
+            if update_time is not None and update_time == state.last_update_time:
+                changed = False
+            else:
+                fingerprint = payload_fingerprint(payload)
+                changed = fingerprint != state.last_hash
+                state.last_hash = fingerprint
+            state.last_update_time = update_time
+
+            state.checks += 1
+            if changed:
+                state.changes += 1
+            state.change_rate = (1 - self.ALPHA) * state.change_rate + self.ALPHA * (1.0 if changed else 0.0)
+            state.interval = self._clamp(state.interval * (self.SPEED_UP if changed else self.SLOW_DOWN))
+            state.next_due = now + state.interval
+            return changed
+
+    def mark_saved(self, path: str, day: str) -> None:
+        with self._lock:
+            state = self.routes.get(path)
+            if state is not None:
+                state.last_saved_day = day
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        各路由当前间隔与变化率，按间隔从短到长排列
+        """
+        with self._lock:
+            states = sorted(self.routes.values(), key=lambda s: s.interval)
+            return [
+                {"name": s.name, "interval": round(s.interval), "change_rate": round(s.change_rate, 3),
+                 "checks": s.checks, "changes": s.changes}
+                for s in states
+            ]
+
+
+_default_tracker: Optional[RouteFrequencyTracker] = None
+
+
+def get_tracker() -> RouteFrequencyTracker:
+    """
+    获取进程内共享的路由频率跟踪器
+    """
+    global _default_tracker
+    if _default_tracker is None:
+        _default_tracker = RouteFrequencyTracker()
+    return _default_tracker
@@ -0,0 +1,188 @@
+import heapq
+import re
+import threading
+import unicodedata
+from datetime import datetime, date, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import or_
+
+from models import DailyHot, HotItem
+
+_SPACES = re.compile(r"\s+")
+# 标签两端常见的修饰符号，如 "#AI#"、"【新能源】"
+_STRIP_CHARS = " #＃【】[]「」\"'“”‘’"
+# 增量刷新时从水位往前多读的时间：时间戳在提交前生成，晚提交的事务可能带着早于水位的时间
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+
+def clean_tag(tag: str) -> str:
+    """
+    清理标签的写法（全角转半角、去除两端符号、合并空白），保留大小写用于展示
+    """
+    tag = unicodedata.normalize("NFKC", tag)
+    return _SPACES.sub(" ", tag).strip(_STRIP_CHARS)
+
+
+def normalize_tag(tag: str) -> str:
+    """
+    标签的规范化键：在 clean_tag 的基础上忽略大小写，"ＡＩ"、"#ai"、"AI" 视为同一标签
+    """
+    return clean_tag(tag).casefold()
+
+
+def clean_tags(tags: Optional[Iterable[str]]) -> List[str]:
+    """
+    清理一组标签并按规范化键去重，保留首次出现的写法与顺序（写入 ai_tags 前调用）
+    """
+    result, seen = [], set()
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        cleaned = clean_tag(tag)
+        key = cleaned.casefold()
+        if key and key not in seen:
+            seen.add(key)
+            result.append(cleaned)
+    return result
+
+
+class TagIndex:
+    """
+    当天已总结热点的标签倒排索引（规范化标签 -> 热点 id 集合）
+
+    - 订阅者的标签集合与索引词表做交集，再合并对应的 id 集合，不扫描热点数据
+    - refresh() 只加载上次刷新后新总结或重新收集的数据（按水位增量更新），跨天时重建
+    - 与 iter_top_hot_items 的筛选条件一致，命中的数据都可以进入摘要
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = {}
+        self.items: Dict[int, HotItem] = {}
+        self._item_tags: Dict[int, FrozenSet[str]] = {}
+        # refresh() 加载时各热点的 (总结时间, 收集时间)，重叠窗口内未变化的行不重复加入
+        self._versions: Dict[int, Tuple[Optional[datetime], Optional[datetime]]] = {}
+        self._day: Optional[date] = None
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_items(cls, items: Iterable[HotItem]) -> "TagIndex":
+        """
+        由已加载的热点数据构建索引（不访问数据库）
+        """
+        index = cls()
+        for item in items:
+            index.add(item)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item: HotItem) -> None:
+        """
+        加入或更新一条热点数据
+        """
+        with self._lock:
+            self._remove(item.id)
+            tags = frozenset(filter(None, (normalize_tag(t) for t in item.ai_tags or [] if isinstance(t, str))))
+            self.items[item.id] = item
+            self._item_tags[item.id] = tags
+            for tag in tags:
+                self.postings.setdefault(tag, set()).add(item.id)
+
+    def _remove(self, item_id: int) -> None:
+        for tag in self._item_tags.pop(item_id, ()):
+            ids = self.postings.get(tag)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self.postings[tag]
+        self.items.pop(item_id, None)
+
+    def match_ids(self, tags: Iterable[str]) -> Set[int]:
+        """
+        命中任一标签的热点 id
+        """
+        wanted = {normalize_tag(t) for t in tags}
+        with self._lock:
+            wanted &= self.postings.keys()
+            return set().union(*(self.postings[tag] for tag in wanted)) if wanted else set()
+
+    def match(self, tags: Iterable[str], limit: int) -> List[HotItem]:
+        """
+        命中任一标签的热点，按分类内归一化热度（同分按原始热度、发布时间）取前 limit 条，
+        顺序与 select_digest_items 的归并顺序一致
+        """
+        ids = self.match_ids(tags)
+        with self._lock:
+            items = [self.items[i] for i in ids if i in self.items]
+        return heapq.nlargest(limit, items, key=lambda x: (x.hot_percentile or 0.0, x.hot_score or 0,
+                                                           x.publish_at or datetime.min))
+
+    def refresh(self, now: Optional[datetime] = None) -> int:
+        """
+        从数据库增量加载新总结的热点
+
+        :return: 本次加入或更新的条数
+        """
+        from database import session_scope
+
+        now = now or datetime.now()
+        if self._day != now.date():
+            with self._lock:
+                self.postings.clear()
+                self.items.clear()
+                self._item_tags.clear()
+                self._versions.clear()
+                self._day = now.date()
+                self._watermark = None
+
+        with session_scope() as session:
+            query = session.query(*HotItem.COLUMNS, DailyHot.last_summarized_at).filter(
+                DailyHot.ai_summary.isnot(None),
+                DailyHot.ai_tags.isnot(None),
+                DailyHot.hot_score.isnot(None),
+                DailyHot.publish_time.isnot(None),
+                DailyHot.collected_at >= self._day,
+                DailyHot.category_rank.isnot(None),
+            )
+            if self._watermark is not None:
+                # 之前总结过、今天重新收集的数据也会进入当天摘要，因此两个时间都要看；
+                # 从水位往前重叠 WATERMARK_OVERLAP 读取，避免漏掉晚提交的数据，重叠部分按 id 去重
+                since = self._watermark - WATERMARK_OVERLAP
+                query = query.filter(or_(
+                    DailyHot.last_summarized_at >= since,
+                    DailyHot.collected_at >= since,
+                ))
+
+            added = 0
+            for row in query.yield_per(500):
+                item = HotItem.from_row(row[:-1])
+                version = (row[-1], item.collected_time)
+                if self._versions.get(item.id) == version:
+                    continue
+                self._versions[item.id] = version
+                self.add(item)
+                for ts in version:
+                    if ts is not None and (self._watermark is None or ts > self._watermark):
+                        self._watermark = ts
+                added += 1
+
+        if added:
+            logger.info(f"标签索引已更新 {added} 条，共 {len(self.items)} 条热点、{len(self.postings)} 个标签")
+        return added
+
+
+_default_index: Optional[TagIndex] = None
+
+
+def get_tag_index() -> TagIndex:
+    """
+    获取进程内共享的标签索引
+    """
+    global _default_index
+    if _default_index is None:
+        _default_index = TagIndex()
+    return _default_index
@@ -0,0 +1,246 @@
+import email
+import json
+import smtplib
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import cover_images
+import daily_hot_reminder
+from digest_api import DigestSnapshot
+from digest_budget import DigestBudget, UnitTimer, CACHED_SELECTION, NO_COVERS, NO_DESCRIPTIONS, LIGHT_TEMPLATE, \
+    RENDER_LADDER
+from models import HotItem
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        with self._lock:
+            self.now += seconds
+
+
+START = datetime(2026, 1, 1, 9, 0)
+
+
+def make_budget(seconds: float, clock: FakeClock) -> DigestBudget:
+    return DigestBudget(START + timedelta(seconds=seconds), clock=clock, now=START)
+
+
+def test_no_deadline_never_overruns():
+    budget = DigestBudget(None)
+    assert budget.remaining() == float("inf")
+    assert not budget.would_overrun(1000.0, 1000, 0.5)
+
+
+def test_would_overrun_reserves_share_of_total():
+    clock = FakeClock()
+    budget = make_budget(100, clock)
+
+    assert budget.total == 100
+    assert not budget.would_overrun(None, 1000, 0.5)  # 尚未测得单位耗时
+    assert not budget.would_overrun(1.0, 50, 0.5)  # 50 秒 <= 100 - 50
+    assert budget.would_overrun(1.0, 51, 0.5)
+
+    clock.now = 30
+    assert not budget.would_overrun(1.0, 20, 0.5)  # 20 秒 <= 70 - 50
+    assert budget.would_overrun(1.0, 21, 0.5)
+    assert not budget.would_overrun(1.0, 45, 0.25)  # 45 秒 <= 70 - 25
+
+
+def test_escalate_walks_ladder_once():
+    clock = FakeClock()
+    budget = make_budget(100, clock)
+
+    clock.now = 40
+    assert budget.escalate(RENDER_LADDER, "test") == NO_COVERS
+    clock.now = 70
+    assert budget.escalate(RENDER_LADDER, "test") == NO_DESCRIPTIONS
+    budget.fire(NO_DESCRIPTIONS, "重复触发")
+    assert budget.escalate(RENDER_LADDER, "test") == LIGHT_TEMPLATE
+    assert budget.escalate(RENDER_LADDER, "test") is None
+
+    assert budget.summary() == [NO_COVERS, NO_DESCRIPTIONS, LIGHT_TEMPLATE]
+    assert [entry["remaining"] for entry in budget.fired] == [60, 30, 30]
+    assert budget.active(NO_DESCRIPTIONS) and not budget.active(CACHED_SELECTION)
+
+
+def test_unit_timer_smooths_measurements():
+    clock = FakeClock()
+    timer = UnitTimer(clock=clock)
+
+    def work(seconds):
+        clock.advance(seconds)
+        return seconds
+
+    assert timer.seconds is None
+    assert timer.measure(work, 2.0) == 2.0
+    assert timer.seconds == 2.0
+    timer.measure(work, 4.0)
+    assert timer.seconds == 3.0
+
+
+class StubSmtpServer(socketserver.ThreadingTCPServer):
+    """
+    本地 SMTP 桩：记录每封邮件的收件人与内容，每封邮件按 send_delay 推进测试时钟
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, clock: FakeClock, send_delay: float):
+        super().__init__(("127.0.0.1", 0), StubSmtpHandler)
+        self.clock = clock
+        self.send_delay = send_delay
+        self.messages = []
+
+
+class StubSmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 stub")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 stub")
+            elif command == "RCPT":
+                recipients.append(line.split(":", 1)[1].strip().strip("<>"))
+                self.reply("250 ok")
+            elif command == "DATA":
+                self.reply("354 go")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b""):
+                        break
+                    data += chunk
+                self.server.clock.advance(self.server.send_delay)
+                self.server.messages.append((recipients, email.message_from_bytes(data)))
+                recipients = []
+                self.reply("250 ok")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class StubSmtpClient(daily_hot_reminder.SmtpClient):
+    def _connect(self) -> smtplib.SMTP:
+        return smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=10)
+
+
+RECIPIENTS = 40
+SELECT_DELAY = 0.05
+RENDER_DELAY = 0.08
+SEND_DELAY = 0.01
+COVER = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+class FakeCoverStore:
+    def read(self, key):
+        return COVER
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def smtp_server(clock):
+    server = StubSmtpServer(clock, SEND_DELAY)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def digest_env(tmp_path, monkeypatch, clock, smtp_server):
+    """
+    40 位收件人、5 个分类，经 SMTP 桩投递；选取、渲染、投递的耗时都按测试时钟计，
+    不限时需要约 40 × (0.05 + 0.08 + 0.01) = 5.6 秒
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "PIPELINE_CHECKPOINT_ENABLED", False)
+    monkeypatch.setattr(config, "COVER_ENABLED", True)
+    monkeypatch.setattr(config, "DELIVERY_CHANNELS", "smtp")
+
+    now = datetime.now()
+    items = [
+        HotItem(i, f"c{i % 5}", f"t{i}", "d" * 200, None, 1000 - i, "http://example.com", None, "s" * 300,
+                ["a"], now, now, i // 5 + 1, 1 - (i // 5) / 20, cover_key=f"{i}.jpg")
+        for i in range(100)
+    ]
+    snapshot = DigestSnapshot(items, 20, built_at=now)
+    with open("recipients.json", "w", encoding="utf-8") as f:
+        json.dump({f"u{i}@example.com": [f"c{i % 5}"] for i in range(RECIPIENTS)}, f)
+
+    def slow_select(email_address, categories, tags=None):
+        clock.advance(SELECT_DELAY)
+        return snapshot.digest(categories, tags)
+
+    render = daily_hot_reminder.generate_html_content
+
+    def slow_render(hot_items, cover_src=None, show_descriptions=True, light=False):
+        clock.advance(RENDER_DELAY * (0.2 if light else 1 if show_descriptions else 0.5))
+        return render(hot_items, cover_src, show_descriptions, light)
+
+    monkeypatch.setattr(daily_hot_reminder, "get_user_hot_items", slow_select)
+    monkeypatch.setattr(daily_hot_reminder, "generate_html_content", slow_render)
+    monkeypatch.setattr(cover_images, "prefetch_covers", lambda covers: len(list(covers)))
+    monkeypatch.setattr(cover_images, "get_cover_store", lambda: FakeCoverStore())
+
+    smtp = StubSmtpClient("127.0.0.1", smtp_server.server_address[1], "digest@example.com", "secret")
+    yield smtp, snapshot
+    smtp.close()
+
+
+def send(clock, smtp, snapshot, seconds: float) -> DigestBudget:
+    return daily_hot_reminder.send_personalized_emails(
+        smtp=smtp, deadline=datetime.now() + timedelta(seconds=seconds), snapshot=snapshot, clock=clock)
+
+
+def test_digest_degrades_to_meet_deadline(clock, smtp_server, digest_env):
+    smtp, snapshot = digest_env
+
+    budget = send(clock, smtp, snapshot, 3)
+
+    delivered = {recipient for recipients, _ in smtp_server.messages for recipient in recipients}
+    assert len(smtp_server.messages) == RECIPIENTS
+    assert delivered == {f"u{i}@example.com" for i in range(RECIPIENTS)}
+    assert budget.remaining() > 0  # 按测试时钟，全部投递完成时仍未到期限
+    # 逐个查询预计超时 -> 改用快照；剩余时间不足以预取封面；渲染依次降级
+    assert budget.summary() == [CACHED_SELECTION, NO_COVERS, NO_DESCRIPTIONS, LIGHT_TEMPLATE]
+    assert all(not message.is_multipart() or message.get_content_subtype() != "related"
+               for _, message in smtp_server.messages)
+
+
+def test_digest_without_pressure_embeds_covers(clock, smtp_server, digest_env):
+    smtp, snapshot = digest_env
+
+    budget = send(clock, smtp, snapshot, 60)
+
+    assert budget.fired == []
+    assert len(smtp_server.messages) == RECIPIENTS
+    for _, message in smtp_server.messages:
+        assert message.get_content_subtype() == "related"
+        html = message.get_payload(0).get_payload(decode=True).decode("utf-8")
+        content_ids = [part["Content-ID"] for part in message.get_payload()[1:]]
+        assert content_ids and all(f"cid:{cid.strip('<>')}" in html for cid in content_ids)